@@ -1,7 +1,101 @@
-from django.contrib import admin
+import io
+import time
+
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseRedirect
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+
+from .conflicts import find_conflicts
+from .importer import CatalogImportError, detect_format, import_catalog
 from .models import *
 
-admin.site.register(Course)
-admin.site.register(Module)
-admin.site.register(Instructor)
-admin.site.register(Enrollment)
\ No newline at end of file
+
+class CatalogImportMixin:
+    """An "Import" page on the changelist taking a CSV or JSONL file (see ``accounts.importer``)."""
+    import_kind = None
+
+    def get_urls(self):
+        opts = self.model._meta
+        return [
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_view),
+                name=f"{opts.app_label}_{opts.model_name}_import",
+            ),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not self.has_add_permission(request) or not self.has_change_permission(request):
+            raise PermissionDenied
+        errors = []
+        if request.method == "POST" and "file" in request.FILES:
+            upload = request.FILES["file"]
+            try:
+                # Uploads over FILE_UPLOAD_MAX_MEMORY_SIZE are spooled to disk
+                lines = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+                stats = import_catalog({self.import_kind: (lines, detect_format(upload.name))})
+            except CatalogImportError as e:
+                errors = e.errors
+            except UnicodeDecodeError:
+                errors = ["The file is not UTF-8 text."]
+            else:
+                counts = stats[self.import_kind]
+                self.message_user(
+                    request,
+                    f"Imported {upload.name}: {counts['created']} created, {counts['updated']} updated "
+                    f"in {stats['seconds']}s.",
+                    messages.SUCCESS,
+                )
+                opts = self.model._meta
+                return HttpResponseRedirect(reverse(f"admin:{opts.app_label}_{opts.model_name}_changelist"))
+
+        return TemplateResponse(request, "admin/accounts/import.html", {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": f"Import {self.model._meta.verbose_name_plural}",
+            "errors": errors,
+        })
+
+
+class InstructorAdmin(CatalogImportMixin, admin.ModelAdmin):
+    import_kind = "instructors"
+    change_list_template = "admin/accounts/import_change_list.html"
+
+
+class CourseAdmin(CatalogImportMixin, admin.ModelAdmin):
+    import_kind = "courses"
+    change_list_template = "admin/accounts/import_change_list.html"
+
+
+class ModuleAdmin(CatalogImportMixin, admin.ModelAdmin):
+    import_kind = "modules"
+    # Module.clean rejects unreadable schedules and double bookings on save
+
+    def get_urls(self):
+        return [
+            path(
+                "conflicts/",
+                self.admin_site.admin_view(self.conflicts_view),
+                name="accounts_module_conflicts",
+            ),
+        ] + super().get_urls()
+
+    def conflicts_view(self, request):
+        started = time.perf_counter()
+        conflicts = find_conflicts()
+        return TemplateResponse(request, "admin/accounts/module/conflicts.html", {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Schedule conflicts",
+            "conflicts": conflicts,
+            "seconds": round(time.perf_counter() - started, 2),
+        })
+
+
+admin.site.register(Course, CourseAdmin)
+admin.site.register(Module, ModuleAdmin)
+admin.site.register(Instructor, InstructorAdmin)
+admin.site.register(Enrollment)
+admin.site.register(WaitlistEntry)
@@ -0,0 +1,68 @@
+"""Async versions of the read-only catalog endpoints.
+
+Served under ``/api/async/...``.  Under an ASGI server these run on the
+event loop and use the async ORM, so a worker is not tied up by a slow
+client the way a sync view running in the thread pool is.  Responses
+are identical to the sync views and share their cache entries.
+"""
+from django.http import Http404
+from django.views.decorators.http import require_GET
+
+from .cache import acached_json_response
+from .catalog import (
+    COURSE_FIELDS,
+    INSTRUCTOR_FIELDS,
+    CatalogQueryError,
+    afetch_courses_page,
+    afetch_instructors_page,
+    aget_course,
+    aget_module,
+    alist_courses,
+    alist_instructors,
+    is_page_request,
+    parse_page_request,
+)
+from .renderers import FastJsonResponse
+
+
+async def _listing(request, name, allowed_fields, list_all, fetch_page):
+    if not is_page_request(request):
+        return await acached_json_response(name, list_all)
+
+    try:
+        page = parse_page_request(request.GET, allowed_fields)
+    except CatalogQueryError as e:
+        return FastJsonResponse({"error": str(e)}, status=400)
+    return await acached_json_response(name, lambda: fetch_page(page), page)
+
+
+@require_GET
+async def get_courses(request):
+    return await _listing(request, "courses", COURSE_FIELDS, alist_courses, afetch_courses_page)
+
+
+@require_GET
+async def get_instructors(request):
+    return await _listing(request, "instructors", INSTRUCTOR_FIELDS, alist_instructors, afetch_instructors_page)
+
+
+@require_GET
+async def get_course_details(request, course_id):
+    try:
+        course_data = await aget_course(int(course_id))
+    except ValueError:
+        course_data = None
+    if course_data is None:
+        raise Http404("No Course matches the given query.")
+    return FastJsonResponse(course_data)
+
+
+@require_GET
+async def get_module_details(request, module_id):
+    try:
+        module_data = await aget_module(int(module_id))
+    except ValueError:
+        module_data = None
+    if module_data is None:
+        raise Http404("No Module matches the given query.")
+    return FastJsonResponse(module_data)
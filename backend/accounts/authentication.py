@@ -0,0 +1,30 @@
+"""JWT authentication that serves profile reads without a database query.
+
+Tokens from ``get_tokens_for_user`` carry the profile fields as claims
+(``PROFILE_CLAIMS``).  ``ProfileTokenAuthentication`` turns such a token
+into a simplejwt ``TokenUser`` whose attributes read those claims, so
+``user-details/`` never touches ``auth_user``.  Tokens issued before the
+claims existed fall back to loading the user, like ``JWTAuthentication``.
+
+Claims are a snapshot: ``update_user_details`` returns fresh tokens, and
+any other token keeps the old values until it expires.
+"""
+from rest_framework_simplejwt.authentication import (
+    JWTAuthentication,
+    JWTStatelessUserAuthentication,
+)
+
+PROFILE_CLAIMS = ("username", "email", "first_name", "last_name")
+
+
+def add_profile_claims(token, user):
+    for claim in PROFILE_CLAIMS:
+        token[claim] = getattr(user, claim)
+    return token
+
+
+class ProfileTokenAuthentication(JWTStatelessUserAuthentication):
+    def get_user(self, validated_token):
+        if all(claim in validated_token for claim in PROFILE_CLAIMS):
+            return super().get_user(validated_token)
+        return JWTAuthentication.get_user(self, validated_token)
@@ -0,0 +1,37 @@
+"""Log users in by email address.
+
+``auth_user.email`` is matched case-insensitively through
+``LOWER(email)``, which is what the ``accounts_user_email_lower`` index
+from migration 0019 covers, so a login costs one indexed lookup plus the
+password hash.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models import Value
+from django.db.models.functions import Lower
+
+
+def users_with_email(email):
+    """Users whose email matches ``email`` ignoring case, via the index."""
+    return (
+        get_user_model()._default_manager.annotate(email_lower=Lower("email"))
+        .filter(email_lower=Lower(Value(email)))
+    )
+
+
+class EmailBackend(ModelBackend):
+    def get_by_email(self, email):
+        return users_with_email(email).order_by("id").first()
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if not email or password is None:
+            return None
+        user = self.get_by_email(email)
+        if user is None:
+            # Run the hasher anyway so unknown addresses take as long as
+            # wrong passwords (same as ModelBackend).
+            get_user_model()().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
@@ -0,0 +1,278 @@
+"""Helpers shared by the ``bench_*`` management commands.
+
+Benchmarks never touch the configured database: they run inside a
+throwaway database created the same way the test runner creates one.
+SQLite benchmarks use a temporary file instead of the test runner's
+in-memory database so locking behaves like it does in production.
+"""
+import itertools
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+from .catalog import enrolled_modules, get_module
+from .enrollment import EnrollmentError, reconcile_enrollment_counts, release_seat, reserve_seat
+from .models import Course, Enrollment, Instructor, Module, room_key
+from .search import is_available as search_available, rebuild_index
+from .timetable import rebuild_time_slots
+
+SEED_PASSWORD = "password"
+SEED_SCHEDULES = (
+    "Mon/Wed 9:00-10:30", "Mon/Wed 11:00-12:30", "Tue/Thu 9:00-10:30", "Tue/Thu 13:00-14:30",
+    "Mon, Wed, Fri 14:00-15:00", "Fri 10:00-12:00", "Tue 15:00-17:00", "Thu 16:00-18:00",
+)
+SEED_WORDS = (
+    "introduction", "advanced", "data", "systems", "theory", "applied", "methods", "analysis",
+    "networks", "algebra", "physics", "chemistry", "biology", "statistics", "design", "learning",
+)
+
+
+@contextmanager
+def isolated_database(alias=DEFAULT_DB_ALIAS):
+    """Create a scratch copy of the schema for ``alias`` and drop it afterwards."""
+    connection = connections[alias]
+    tmpdir = None
+    if connection.vendor == "sqlite":
+        tmpdir = tempfile.mkdtemp(prefix="bench-")
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tmpdir, "bench.sqlite3")
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        if tmpdir:
+            # Also takes any -wal/-shm files a WAL database leaves behind
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def percentiles(samples):
+    """p50/p95/p99 of ``samples`` (seconds), reported in milliseconds."""
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None}
+    ordered = sorted(samples)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "mean": round(statistics.fmean(ordered) * 1000, 3)}
+
+
+def run_threads(worker, items, threads):
+    """Split ``items`` round-robin over ``threads`` threads running ``worker(chunk)``.
+
+    Each thread closes its own database connections when it finishes.
+    Returns the wall-clock time taken.
+    """
+    chunks = [items[i::threads] for i in range(threads)]
+    barrier = threading.Barrier(len(chunks))
+
+    def target(chunk):
+        try:
+            barrier.wait()
+            worker(chunk)
+        finally:
+            connections.close_all()
+
+    pool = [threading.Thread(target=target, args=(chunk,)) for chunk in chunks]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def registration_stress(module_id, user_ids, threads=8, max_retries=50):
+    """Register every user in ``user_ids`` for one module from ``threads`` threads.
+
+    Retries a registration when the database reports a lock, as a client
+    would, but only when the registration was not committed: a retry
+    after the commit would be counted as a rejected duplicate.  Returns
+    counts of each outcome plus the throughput reached.
+    """
+    results = {"enrolled": 0, "rejected": 0, "lock_retries": 0, "gave_up": 0}
+    lock = threading.Lock()
+
+    def worker(chunk):
+        for user_id in chunk:
+            for attempt in range(max_retries):
+                try:
+                    # A lock error raised by the commit itself may come
+                    # after the rows were written
+                    if not attempt or not Enrollment.objects.filter(user_id=user_id, module_id=module_id).exists():
+                        reserve_seat(user_id, module_id)
+                    outcome = "enrolled"
+                except EnrollmentError:
+                    outcome = "rejected"
+                except OperationalError:
+                    with lock:
+                        results["lock_retries"] += 1
+                    time.sleep(0.001)
+                    continue
+                break
+            else:
+                outcome = "gave_up"
+            with lock:
+                results[outcome] += 1
+
+    elapsed = run_threads(worker, list(user_ids), threads)
+    results["seconds"] = round(elapsed, 3)
+    results["registrations_per_second"] = round(len(user_ids) / elapsed, 1) if elapsed else None
+    return results
+
+
+def mixed_workload(user_ids, module_ids, operations, threads=8, read_ratio=0.8, seed=0):
+    """Run a mix of catalog reads and registrations from ``threads`` threads.
+
+    A read fetches a module's details and a student's enrolled modules;
+    a write registers a student for a module and, if that worked,
+    unregisters them again, so the data ends up as it started.  Every
+    operation is attempted once: a "database is locked" error counts as
+    a failure, not a retry, since that is what a user would have seen.
+    Returns throughput, per-kind latency percentiles and the errors.
+    """
+    rng = random.Random(seed)
+    ops = [
+        ("read" if rng.random() < read_ratio else "write", rng.choice(user_ids), rng.choice(module_ids))
+        for _ in range(operations)
+    ]
+    latencies = {"read": [], "write": []}
+    results = {"locked": 0, "rejected": 0}
+    lock = threading.Lock()
+
+    def worker(chunk):
+        timings, locked, rejected = {"read": [], "write": []}, 0, 0
+        for kind, user_id, module_id in chunk:
+            started = time.perf_counter()
+            try:
+                if kind == "read":
+                    get_module(module_id)
+                    list(enrolled_modules(user_id).values_list("id", flat=True))
+                else:
+                    reserve_seat(user_id, module_id)
+                    release_seat(user_id, module_id)
+            except EnrollmentError:
+                rejected += 1  # full, clashing or already taken: still a completed request
+            except OperationalError:
+                locked += 1
+                continue
+            timings[kind].append(time.perf_counter() - started)
+        with lock:
+            for kind, samples in timings.items():
+                latencies[kind].extend(samples)
+            results["locked"] += locked
+            results["rejected"] += rejected
+
+    elapsed = run_threads(worker, ops, threads)
+    completed = operations - results["locked"]
+    results.update({
+        "operations": operations,
+        "seconds": round(elapsed, 3),
+        "operations_per_second": round(completed / elapsed, 1) if elapsed else None,
+        "read_latency_ms": percentiles(latencies["read"]),
+        "write_latency_ms": percentiles(latencies["write"]),
+    })
+    return results
+
+
+def _insert(model, objs, batch_size):
+    """``bulk_create`` from a generator without materialising all of it."""
+    objs = iter(objs)
+    while batch := list(itertools.islice(objs, batch_size)):
+        model.objects.bulk_create(batch)
+
+
+def seed_catalog(courses=50, modules=500, instructors=40, users=200, enrollments=800,
+                 batch_size=5000, seed=0):
+    """Fill an empty database with a deterministic synthetic catalog.
+
+    The same arguments always produce the same rows.  Modules are spread
+    evenly over the courses and cycle through ``SEED_SCHEDULES``, which
+    never overlap, and each student enrolls in modules with different
+    schedules, so the seeded timetables have no clashes; a student takes
+    at most ``len(SEED_SCHEDULES)`` modules.  Rows are generated lazily
+    and written with ``bulk_create`` in ``batch_size`` batches, so memory
+    does not grow with the scale.  The data signals normally maintain
+    (seat counters, time slots, search index) is rebuilt at the end.
+
+    Every student's password is ``SEED_PASSWORD`` and their email is
+    ``student<n>@example.com``.  Returns the row counts.
+    """
+    rng = random.Random(seed)
+    departments = [key for key, _ in Course.DEPARTMENTS]
+    courses = max(1, min(courses, modules))
+
+    def words(count):
+        return " ".join(rng.choice(SEED_WORDS) for _ in range(count))
+
+    with transaction.atomic():
+        _insert(Instructor, (
+            Instructor(first_name=f"Instructor{i}", last_name=words(1).title(), about=words(8),
+                       department=rng.choice(departments))
+            for i in range(instructors)
+        ), batch_size)
+        instructor_ids = list(Instructor.objects.order_by("id").values_list("id", flat=True))
+
+        _insert(Course, (
+            Course(code=f"S{i:05d}", title=words(3).title()[:35], description=words(20)[:255],
+                   department=rng.choice(departments), credits=rng.choice((5, 10, 15)),
+                   module_count=modules // courses + (i < modules % courses))
+            for i in range(courses)
+        ), batch_size)
+        course_ids = list(Course.objects.order_by("id").values_list("id", flat=True))
+
+        term_start = date(2025, 9, 1)
+        _insert(Module, (
+            Module(course_id=course_ids[i % courses], code=f"S{i % courses:05d}-{i // courses}",
+                   title=words(4).title(), description=words(40), instructor_id=rng.choice(instructor_ids),
+                   start_date=term_start, end_date=term_start + timedelta(days=110),
+                   capacity=rng.choice((30, 60, 120)), schedule=SEED_SCHEDULES[i % len(SEED_SCHEDULES)],
+                   location=(location := f"Building {rng.randint(1, 20)}, Room {rng.randint(100, 499)}"),
+                   room_key=room_key(location))
+            for i in range(modules)
+        ), batch_size)
+        module_ids = list(Module.objects.order_by("id").values_list("id", flat=True))
+
+        password = make_password(SEED_PASSWORD)
+        _insert(User, (
+            User(username=f"student{i}", email=f"student{i}@example.com", password=password,
+                 first_name="Student", last_name=str(i))
+            for i in range(users)
+        ), batch_size)
+        user_ids = list(User.objects.filter(username__startswith="student").order_by("id").values_list("id", flat=True))
+
+        # Module index i has schedule i % len(SEED_SCHEDULES)
+        slots = len(SEED_SCHEDULES)
+        groups = [s for s in range(slots) if s < modules]
+
+        def student_enrollments():
+            for n, user_id in enumerate(user_ids):
+                count = min(enrollments // len(user_ids) + (n < enrollments % len(user_ids)), len(groups))
+                for s in rng.sample(groups, count):
+                    index = rng.randrange((modules - s + slots - 1) // slots) * slots + s
+                    yield Enrollment(user_id=user_id, module_id=module_ids[index])
+
+        if user_ids:
+            _insert(Enrollment, student_enrollments(), batch_size)
+
+    reconcile_enrollment_counts()
+    rebuild_time_slots()
+    if search_available():
+        rebuild_index()
+    return {
+        "instructors": len(instructor_ids),
+        "courses": len(course_ids),
+        "modules": len(module_ids),
+        "users": len(user_ids),
+        "enrollments": Enrollment.objects.count(),
+    }
@@ -0,0 +1,306 @@
+"""Versioned response cache for the read-mostly catalog endpoints.
+
+Every cached body is stored under the current catalog version, so a
+structural change (a course, module or instructor being saved or
+deleted) only has to bump the version for all old entries to be
+ignored.  Entries are keyed on the validated listing parameters, not the
+raw query string, so reordered or unknown parameters share an entry.
+
+Seat counts change far more often than the catalog itself, so they are
+not trusted from the cached body.  ``Module.enrolled`` values are kept in
+small per-bucket entries (``SEAT_BUCKET_SIZE`` consecutive module ids
+each) and laid over the body when it is served.  A seat change only
+deletes its module's bucket after commit, an O(1) call on the
+registration path; the next response that needs the bucket reloads it
+with one primary-key range query.  Nothing is ever read, patched and
+written back, so concurrent seat changes cannot lose each other.  A
+reload racing a seat change can keep the older count until the bucket
+expires after ``CATALOG_SEATS_TIMEOUT`` seconds.
+"""
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpResponse
+
+from .models import Module
+from .renderers import dumps, loads
+from .routers import primary_reads
+
+VERSION_KEY = "catalog:version"
+SEATS_KEY = "catalog:seats:{bucket}"
+HITS_KEY = "catalog:stats:hits"
+MISSES_KEY = "catalog:stats:misses"
+SEAT_BUCKET_SIZE = 256
+# Buckets loaded per query; keeps the OR of id ranges well inside SQLite's expression depth limit
+SEAT_BUCKETS_PER_QUERY = 100
+
+
+def get_cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+def get_timeout():
+    return getattr(settings, "CATALOG_CACHE_TIMEOUT", 60 * 15)
+
+
+def get_seats_timeout():
+    return getattr(settings, "CATALOG_SEATS_TIMEOUT", 30)
+
+
+def _incr(cache, key):
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The key was evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+async def _aincr(cache, key):
+    await cache.aadd(key, 0, timeout=None)
+    try:
+        return await cache.aincr(key)
+    except ValueError:
+        await cache.aset(key, 1, timeout=None)
+        return 1
+
+
+def current_version(cache=None):
+    cache = cache or get_cache()
+    cache.add(VERSION_KEY, 1, timeout=None)
+    return cache.get(VERSION_KEY) or 1
+
+
+def _response_key(version, name, params):
+    if not params:
+        return f"catalog:{version}:{name}"
+    # Keyed on the validated parameters rather than the query string, so
+    # the sync and async routes of an endpoint share their entries too;
+    # hashed to stay within memcached's 250-character key limit
+    query = urlencode(sorted(
+        (key, ",".join(map(str, value)) if isinstance(value, (list, tuple)) else value)
+        for key, value in params.items()
+    ))
+    return f"catalog:{version}:{name}:{hashlib.md5(query.encode()).hexdigest()}"
+
+
+def invalidate_catalog():
+    """Drop every cached catalog response by moving to a new version."""
+    return _incr(get_cache(), VERSION_KEY)
+
+
+def cached_data(name, build, params=None, timeout=None):
+    """``build()``'s result for ``name`` and ``params``, kept under the current catalog version.
+
+    For data embedded in a larger response; ``timeout`` defaults to
+    ``CATALOG_CACHE_TIMEOUT``.
+    """
+    cache = get_cache()
+    key = _response_key(current_version(cache), name, params)
+    data = cache.get(key)
+    if data is None:
+        with primary_reads():
+            data = build()
+        cache.set(key, data, get_timeout() if timeout is None else timeout)
+    return data
+
+
+def cached_json_response(name, build, params=None):
+    """Return the JSON body for ``name`` from the cache, building it on a miss.
+
+    ``build`` is called with no arguments and must return JSON-serializable
+    data.  ``params`` are the validated listing parameters (e.g. a parsed
+    page request), part of the key; ``None`` for the full listing.
+    """
+    cache = get_cache()
+    version = current_version(cache)
+    key = _response_key(version, name, params)
+
+    entry = cache.get(key)
+    if entry is not None:
+        _incr(cache, HITS_KEY)
+        body, seats = entry
+        changed = _changed_seats(seats, _seat_counts(cache, seats))
+        if changed:
+            body, entry = _overlay(entry, changed)
+            cache.set(key, entry, get_timeout())
+        return HttpResponse(body, content_type="application/json")
+
+    _incr(cache, MISSES_KEY)
+    # Built from the primary: a lagging replica would cache stale data
+    # under the new version until the next change
+    with primary_reads():
+        data = build()
+    body = dumps(data)
+    seats = _seat_snapshot(data)
+    if seats is not None:
+        cache.set(key, (body, seats), get_timeout())
+    return HttpResponse(body, content_type="application/json")
+
+
+async def acached_json_response(name, build, params=None):
+    """``cached_json_response`` for async views; ``build`` is a coroutine function."""
+    cache = get_cache()
+    await cache.aadd(VERSION_KEY, 1, timeout=None)
+    version = await cache.aget(VERSION_KEY) or 1
+    key = _response_key(version, name, params)
+
+    entry = await cache.aget(key)
+    if entry is not None:
+        await _aincr(cache, HITS_KEY)
+        body, seats = entry
+        changed = _changed_seats(seats, await _aseat_counts(cache, seats))
+        if changed:
+            body, entry = _overlay(entry, changed)
+            await cache.aset(key, entry, get_timeout())
+        return HttpResponse(body, content_type="application/json")
+
+    await _aincr(cache, MISSES_KEY)
+    with primary_reads():
+        data = await build()
+    body = dumps(data)
+    seats = _seat_snapshot(data)
+    if seats is not None:
+        await cache.aset(key, (body, seats), get_timeout())
+    return HttpResponse(body, content_type="application/json")
+
+
+def _seat_cells(data):
+    """Every module dict in a response body that carries a seat count."""
+    rows = data.get("results", [data]) if isinstance(data, dict) else data
+    for row in rows:
+        for module in row.get("modules") or []:
+            if "enrolled" in module:
+                yield module
+
+
+def _seat_snapshot(data):
+    """``{module_id: enrolled}`` of a body, or ``None`` if a seat count cannot be refreshed.
+
+    A projection such as ``module_fields=title,enrolled`` leaves out the
+    id the overlay needs; such a body is not cached, as its counts would
+    go stale for ``CATALOG_CACHE_TIMEOUT``.
+    """
+    seats = {}
+    for module in _seat_cells(data):
+        if "id" not in module:
+            return None
+        seats[module["id"]] = module["enrolled"]
+    return seats
+
+
+def _bucket_keys(module_ids):
+    buckets = {module_id // SEAT_BUCKET_SIZE for module_id in module_ids}
+    return {bucket: SEATS_KEY.format(bucket=bucket) for bucket in sorted(buckets)}
+
+
+def _bucket_query(buckets):
+    ranges = Q()
+    for bucket in buckets:
+        ranges |= Q(id__gte=bucket * SEAT_BUCKET_SIZE, id__lt=(bucket + 1) * SEAT_BUCKET_SIZE)
+    return Module.objects.filter(ranges).values_list("id", "enrolled")
+
+
+def _merge_buckets(keys, found, loaded_rows):
+    """``{module_id: enrolled}`` from cached buckets plus freshly loaded rows.
+
+    Returns the counts and the loaded buckets to store.
+    """
+    counts, loaded = {}, {}
+    for bucket, key in keys.items():
+        if key in found:
+            counts.update(found[key])
+        else:
+            loaded[key] = {}
+    for module_id, enrolled in loaded_rows:
+        loaded[SEATS_KEY.format(bucket=module_id // SEAT_BUCKET_SIZE)][module_id] = enrolled
+        counts[module_id] = enrolled
+    return counts, loaded
+
+
+def _missing(keys, found):
+    return [bucket for bucket, key in keys.items() if key not in found]
+
+
+def _seat_counts(cache, seats):
+    if not seats:
+        return {}
+    keys = _bucket_keys(seats)
+    found = cache.get_many(keys.values())
+    missing = _missing(keys, found)
+    rows = []
+    with primary_reads():
+        for start in range(0, len(missing), SEAT_BUCKETS_PER_QUERY):
+            rows.extend(_bucket_query(missing[start:start + SEAT_BUCKETS_PER_QUERY]))
+    counts, loaded = _merge_buckets(keys, found, rows)
+    if loaded:
+        cache.set_many(loaded, get_seats_timeout())
+    return counts
+
+
+async def _aseat_counts(cache, seats):
+    if not seats:
+        return {}
+    keys = _bucket_keys(seats)
+    found = await cache.aget_many(keys.values())
+    missing = _missing(keys, found)
+    rows = []
+    with primary_reads():
+        for start in range(0, len(missing), SEAT_BUCKETS_PER_QUERY):
+            rows.extend([row async for row in _bucket_query(missing[start:start + SEAT_BUCKETS_PER_QUERY])])
+    counts, loaded = _merge_buckets(keys, found, rows)
+    if loaded:
+        await cache.aset_many(loaded, get_seats_timeout())
+    return counts
+
+
+def _changed_seats(seats, counts):
+    return {
+        module_id: counts[module_id]
+        for module_id, enrolled in seats.items()
+        if module_id in counts and counts[module_id] != enrolled
+    }
+
+
+def _overlay(entry, changed):
+    """The cached body with the ``changed`` seat counts written in, and the entry to store.
+
+    Later hits start from the stored counts.  Storing an older overlay over
+    a newer one is harmless: every hit compares against the buckets again.
+    """
+    body, seats = entry
+    data = loads(body)
+    for module in _seat_cells(data):
+        if module["id"] in changed:
+            module["enrolled"] = changed[module["id"]]
+    body = dumps(data)
+    return body, (body, {**seats, **changed})
+
+
+def seats_changed(module_id):
+    """Forget the cached seat counts of ``module_id``'s bucket once the transaction commits."""
+    key = SEATS_KEY.format(bucket=module_id // SEAT_BUCKET_SIZE)
+    transaction.on_commit(lambda: get_cache().delete(key))
+
+
+def cache_stats():
+    cache = get_cache()
+    hits = cache.get(HITS_KEY) or 0
+    misses = cache.get(MISSES_KEY) or 0
+    total = hits + misses
+    return {
+        "version": current_version(cache),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / total if total else None,
+    }
+
+
+def reset_cache_stats():
+    cache = get_cache()
+    cache.delete_many([HITS_KEY, MISSES_KEY])
@@ -0,0 +1,347 @@
+"""Read path for the catalog endpoints.
+
+Every module dict the API returns is built by ``ModuleSerializer`` from
+tuples fetched with ``values_list()``, with the instructor columns
+joined into the same query, so no ``Module`` or ``Instructor`` instance
+is ever created on these endpoints.
+
+``/api/courses/`` and ``/api/instructors/`` keep returning the full
+nested list when called without parameters.  Passing any of ``limit``,
+``cursor``, ``fields``, ``include`` or ``module_fields`` switches to a
+paginated envelope::
+
+    {"results": [...], "next_cursor": "42"}
+
+Pages are keyed on ``id`` (``WHERE id > cursor ORDER BY id LIMIT n``),
+so the cost of a page does not depend on how deep into the catalog it
+is, and only the requested columns are read from the database.
+
+Functions prefixed with ``a`` are the same reads on Django's async ORM,
+used by ``accounts.async_views``.
+"""
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+
+from .models import Course, Instructor, Module
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+PAGE_PARAMS = ("limit", "cursor", "fields", "include", "module_fields")
+
+COURSE_FIELDS = ("id", "code", "title", "description", "department", "credits", "image", "module_count")
+COURSE_DETAIL_FIELDS = ("id", "code", "title", "description", "department", "credits", "module_count")
+INSTRUCTOR_FIELDS = ("id", "first_name", "last_name", "about", "department")
+
+# Response key -> Module column
+MODULE_COLUMNS = {
+    "id": "id",
+    "courseId": "course_id",
+    "code": "code",
+    "title": "title",
+    "description": "description",
+    "startDate": "start_date",
+    "endDate": "end_date",
+    "capacity": "capacity",
+    "enrolled": "enrolled",
+    "schedule": "schedule",
+    "location": "location",
+}
+# Nested "instructor" object, joined in the same query
+MODULE_INSTRUCTOR_COLUMNS = {
+    "id": "instructor_id",
+    "first_name": "instructor__first_name",
+    "last_name": "instructor__last_name",
+    "department": "instructor__department",
+}
+MODULE_FIELDS = (
+    "id", "courseId", "code", "title", "description", "instructor",
+    "startDate", "endDate", "capacity", "enrolled", "schedule", "location",
+)
+
+
+class CatalogQueryError(ValueError):
+    pass
+
+
+class ModuleSerializer:
+    """Build module dicts from ``values_list()`` tuples.
+
+    The column list and the tuple position of every response field are
+    worked out once, when the serializer is created; serializing a row is
+    then plain indexing.  ``key_column`` is fetched in front of the
+    module columns and used by ``group_by_key``.
+    """
+
+    def __init__(self, fields=MODULE_FIELDS, key_column=None):
+        columns = [key_column] if key_column else []
+        plan = []
+        for field in fields:
+            plan.append((field, len(columns)))
+            if field == "instructor":
+                columns.extend(MODULE_INSTRUCTOR_COLUMNS.values())
+            else:
+                columns.append(MODULE_COLUMNS[field])
+        self.columns = tuple(columns)
+        self.plan = tuple(plan)
+        self.key_column = key_column
+
+    def to_dict(self, row):
+        module = {}
+        for field, index in self.plan:
+            if field == "instructor":
+                instructor_id, first_name, last_name, department = row[index:index + 4]
+                module["instructor"] = {
+                    "id": instructor_id,
+                    "first_name": first_name,
+                    "last_name": last_name,
+                    "department": department,
+                }
+            else:
+                module[field] = row[index]
+        return module
+
+    def rows(self, queryset):
+        return queryset.values_list(*self.columns)
+
+    def serialize(self, queryset):
+        return [self.to_dict(row) for row in self.rows(queryset)]
+
+    def group_by_key(self, queryset):
+        """Return ``{key: [module, ...]}``; requires ``key_column``."""
+        grouped = defaultdict(list)
+        for row in self.rows(queryset):
+            grouped[row[0]].append(self.to_dict(row))
+        return grouped
+
+
+module_serializer = ModuleSerializer()
+
+
+def is_page_request(request):
+    return any(param in request.GET for param in PAGE_PARAMS)
+
+
+def _parse_fields(value, allowed, name):
+    if not value:
+        return list(allowed)
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise CatalogQueryError(f"Unknown {name}: {', '.join(unknown)}")
+    return fields
+
+
+def parse_limit_and_cursor(params):
+    """``limit`` and the keyset ``cursor`` (an id, or ``None``) of a listing request."""
+    try:
+        limit = int(params.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise CatalogQueryError("limit must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise CatalogQueryError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    cursor = params.get("cursor") or None
+    if cursor is not None:
+        try:
+            cursor = int(cursor)
+        except ValueError:
+            raise CatalogQueryError("Invalid cursor")
+    return limit, cursor
+
+
+def parse_page_request(params, allowed_fields):
+    """Validate the query string of a paginated listing request."""
+    limit, cursor = parse_limit_and_cursor(params)
+
+    include = {part.strip() for part in params.get("include", "").split(",") if part.strip()}
+    if include - {"modules"}:
+        raise CatalogQueryError("include only supports 'modules'")
+
+    return {
+        "limit": limit,
+        "cursor": cursor,
+        "fields": _parse_fields(params.get("fields"), allowed_fields, "fields"),
+        "include_modules": "modules" in include,
+        "module_fields": _parse_fields(params.get("module_fields"), MODULE_FIELDS, "module_fields"),
+    }
+
+
+def _modules_of(parent_column, parent_ids):
+    return Module.objects.filter(**{f"{parent_column}__in": parent_ids}).order_by("id")
+
+
+def fetch_modules(parent_column, parent_ids, fields=MODULE_FIELDS):
+    """Return ``{parent_id: [module, ...]}`` reading only the requested columns."""
+    serializer = ModuleSerializer(fields, key_column=parent_column)
+    return serializer.group_by_key(_modules_of(parent_column, parent_ids))
+
+
+def _assemble(rows, fields, include_modules, modules):
+    results = []
+    for row in rows:
+        item = {field: row[field] for field in fields}
+        if "image" in item:
+            item["image"] = default_storage.url(item["image"]) if item["image"] else None
+        if include_modules:
+            item["modules"] = modules.get(row["id"], [])
+        results.append(item)
+    return results
+
+
+def fetch_rows(queryset, parent_column, fields, include_modules=True, module_fields=MODULE_FIELDS):
+    """Serialize ``queryset`` (courses or instructors) with nested modules.
+
+    Two queries whatever the number of rows: one for the parents and one
+    for all of their modules.
+    """
+    rows = list(queryset.values(*{"id", *fields}))
+    modules = {}
+    if include_modules and rows:
+        modules = fetch_modules(parent_column, [row["id"] for row in rows], module_fields)
+    return _assemble(rows, fields, include_modules, modules)
+
+
+async def afetch_rows(queryset, parent_column, fields, include_modules=True, module_fields=MODULE_FIELDS):
+    """``fetch_rows`` on the async ORM."""
+    rows = [row async for row in queryset.values(*{"id", *fields})]
+    modules = defaultdict(list)
+    if include_modules and rows:
+        serializer = ModuleSerializer(module_fields, key_column=parent_column)
+        queryset = serializer.rows(_modules_of(parent_column, [row["id"] for row in rows]))
+        async for row in queryset:
+            modules[row[0]].append(serializer.to_dict(row))
+    return _assemble(rows, fields, include_modules, modules)
+
+
+def iter_rows(model, parent_column, fields, batch_size):
+    """Yield every ``model`` row with its modules, ``batch_size`` rows at a time.
+
+    Batches are keyset pages on ``id``, so memory use is bounded by the
+    batch size rather than the size of the table.
+    """
+    cursor = None
+    while True:
+        queryset = model.objects.order_by("id")
+        if cursor is not None:
+            queryset = queryset.filter(id__gt=cursor)
+        batch = fetch_rows(queryset[:batch_size], parent_column, fields)
+        yield from batch
+        if len(batch) < batch_size:
+            return
+        cursor = batch[-1]["id"]
+
+
+def _page_query(model, page):
+    queryset = model.objects.order_by("id")
+    if page["cursor"] is not None:
+        queryset = queryset.filter(id__gt=page["cursor"])
+    # Fetch one extra row to know whether there is a next page
+    fields = page["fields"] if "id" in page["fields"] else ["id", *page["fields"]]
+    return queryset[: page["limit"] + 1], fields
+
+
+def _page_envelope(rows, page):
+    has_more = len(rows) > page["limit"]
+    rows = rows[: page["limit"]]
+    next_cursor = str(rows[-1]["id"]) if has_more else None
+    if "id" not in page["fields"]:
+        for row in rows:
+            del row["id"]
+    return {"results": rows, "next_cursor": next_cursor}
+
+
+def fetch_page(model, parent_column, page):
+    """Return one page of ``model`` rows as the paginated response envelope."""
+    queryset, fields = _page_query(model, page)
+    rows = fetch_rows(queryset, parent_column, fields, page["include_modules"], page["module_fields"])
+    return _page_envelope(rows, page)
+
+
+async def afetch_page(model, parent_column, page):
+    queryset, fields = _page_query(model, page)
+    rows = await afetch_rows(queryset, parent_column, fields, page["include_modules"], page["module_fields"])
+    return _page_envelope(rows, page)
+
+
+def list_courses():
+    return fetch_rows(Course.objects.order_by("id"), "course_id", COURSE_FIELDS)
+
+
+def iter_courses(batch_size):
+    return iter_rows(Course, "course_id", COURSE_FIELDS, batch_size)
+
+
+def fetch_courses_page(page):
+    return fetch_page(Course, "course_id", page)
+
+
+async def alist_courses():
+    return await afetch_rows(Course.objects.order_by("id"), "course_id", COURSE_FIELDS)
+
+
+async def afetch_courses_page(page):
+    return await afetch_page(Course, "course_id", page)
+
+
+def get_course(course_id):
+    """The course-details payload, or ``None`` if there is no such course."""
+    rows = fetch_rows(Course.objects.filter(id=course_id), "course_id", COURSE_DETAIL_FIELDS)
+    return rows[0] if rows else None
+
+
+async def aget_course(course_id):
+    try:
+        course = await Course.objects.values(*COURSE_DETAIL_FIELDS).aget(id=course_id)
+    except Course.DoesNotExist:
+        return None
+    modules = defaultdict(list)
+    async for row in module_serializer.rows(_modules_of("course_id", [course_id])):
+        modules[course_id].append(module_serializer.to_dict(row))
+    return _assemble([course], COURSE_DETAIL_FIELDS, True, modules)[0]
+
+
+def list_instructors():
+    return fetch_rows(Instructor.objects.order_by("id"), "instructor_id", INSTRUCTOR_FIELDS)
+
+
+def iter_instructors(batch_size):
+    return iter_rows(Instructor, "instructor_id", INSTRUCTOR_FIELDS, batch_size)
+
+
+def fetch_instructors_page(page):
+    return fetch_page(Instructor, "instructor_id", page)
+
+
+async def alist_instructors():
+    return await afetch_rows(Instructor.objects.order_by("id"), "instructor_id", INSTRUCTOR_FIELDS)
+
+
+async def afetch_instructors_page(page):
+    return await afetch_page(Instructor, "instructor_id", page)
+
+
+def _module_details(row):
+    module = module_serializer.to_dict(row)
+    module["course"] = {"id": module["courseId"]}
+    return module
+
+
+def get_module(module_id):
+    """The module-details payload, or ``None`` if there is no such module."""
+    row = module_serializer.rows(Module.objects.filter(id=module_id)).first()
+    return _module_details(row) if row else None
+
+
+async def aget_module(module_id):
+    try:
+        row = await module_serializer.rows(Module.objects.all()).aget(id=module_id)
+    except Module.DoesNotExist:
+        return None
+    return _module_details(row)
+
+
+def enrolled_modules(user_id):
+    """Modules ``user_id`` is enrolled in, in enrollment order."""
+    return Module.objects.filter(enrollment__user_id=user_id).order_by("enrollment__id")
@@ -0,0 +1,168 @@
+"""Double-booked rooms and instructors.
+
+``find_conflicts`` loads every ``TimeSlot`` once and runs a sweep line
+per room and per instructor.  Each group is first split into terms:
+runs of modules whose date ranges chain into each other, so slots of
+different terms never meet.  Slots are then sorted by ``(group, term,
+start of week minute)`` and each one is compared only with the slots of
+its group and term still running when it starts, kept in a min-heap on
+their end.  That is O(n log n) plus the number of overlaps found.  Two
+slots only conflict if their modules' date ranges overlap as well.
+
+``module_conflicts`` is the incremental check behind ``Module.clean``:
+it looks up the slots sharing the module's room or instructor on the
+same weekdays and tests them against the module's new schedule.
+
+Rooms are compared on ``Module.room_key`` in both, so " room  101 " and
+"Room 101" are the same room whichever check runs.
+"""
+import heapq
+from collections import namedtuple
+
+from django.db.models import Q
+
+from .models import Instructor, TimeSlot, room_key
+from .timetable import DAYS, MINUTES_PER_DAY, _clock
+
+Slot = namedtuple(
+    "Slot", "module_id code location room instructor_id start end start_date end_date"
+)
+
+_SLOT_COLUMNS = (
+    "module_id", "module__code", "module__location", "module__room_key", "module__instructor_id",
+    "weekday", "start_minute", "end_minute", "module__start_date", "module__end_date",
+)
+
+
+def location_key(location):
+    return room_key(location) or None
+
+
+def _slot(module_id, code, location, room, instructor_id, weekday, start, end, start_date, end_date):
+    offset = weekday * MINUTES_PER_DAY
+    return Slot(
+        module_id, code, location, room or None, instructor_id, offset + start, offset + end, start_date, end_date
+    )
+
+
+def _terms(slots, keys):
+    """``{index: term}``: within each group, slots whose date ranges chain together share a term."""
+    terms = {}
+    current, term, term_end = object(), -1, None
+    for group, start_date, end_date, index in sorted(
+        (group, slot.start_date, slot.end_date, index) for index, (slot, group) in enumerate(zip(slots, keys))
+        if group is not None
+    ):
+        if group != current or start_date > term_end:
+            current, term, term_end = group, term + 1, end_date
+        else:
+            term_end = max(term_end, end_date)
+        terms[index] = term
+    return terms
+
+
+def sweep(slots, key):
+    """Yield ``(earlier, later)`` pairs of overlapping slots with the same ``key(slot)``.
+
+    Slots whose key is ``None`` are skipped.
+    """
+    keys = [key(slot) for slot in slots]
+    terms = _terms(slots, keys)
+    # Terms are numbered across groups, so the term alone separates them
+    ordered = sorted((term, slots[index].start, index) for index, term in terms.items())
+    active = []  # (end, index) of the current term's running slots
+    current = None
+    for term, start, index in ordered:
+        if term != current:
+            current, active = term, []
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        slot = slots[index]
+        for _, other_index in active:
+            other = slots[other_index]
+            if other.start_date <= slot.end_date and slot.start_date <= other.end_date:
+                yield other, slot
+        heapq.heappush(active, (slot.end, index))
+
+
+def _conflict(kind, key, first, second):
+    start, end = max(first.start, second.start), min(first.end, second.end)
+    day = start // MINUTES_PER_DAY
+    return {
+        "kind": kind,
+        key[0]: key[1],
+        "day": DAYS[day],
+        "start": _clock(start - day * MINUTES_PER_DAY),
+        "end": _clock(end - day * MINUTES_PER_DAY),
+        "modules": [
+            {"id": first.module_id, "code": first.code},
+            {"id": second.module_id, "code": second.code},
+        ],
+    }
+
+
+def _with_instructor_names(conflicts):
+    ids = {c["instructor"] for c in conflicts if c["kind"] == "instructor"}
+    names = {
+        id: f"{first_name} {last_name}"
+        for id, first_name, last_name in Instructor.objects.filter(id__in=ids).values_list(
+            "id", "first_name", "last_name"
+        )
+    }
+    for conflict in conflicts:
+        if conflict["kind"] == "instructor":
+            conflict["instructor"] = {"id": conflict["instructor"], "name": names.get(conflict["instructor"], "")}
+    return conflicts
+
+
+def find_conflicts(kinds=("location", "instructor")):
+    """Every double booking, as dicts sorted by kind, day and time."""
+    slots = [_slot(*row) for row in TimeSlot.objects.values_list(*_SLOT_COLUMNS).iterator(chunk_size=5000)]
+    conflicts = []
+    if "location" in kinds:
+        conflicts += [
+            _conflict("location", ("location", first.location), first, second)
+            for first, second in sweep(slots, lambda slot: slot.room)
+        ]
+    if "instructor" in kinds:
+        conflicts += [
+            _conflict("instructor", ("instructor", first.instructor_id), first, second)
+            for first, second in sweep(slots, lambda slot: slot.instructor_id)
+        ]
+    conflicts.sort(key=lambda c: (c["kind"], DAYS.index(c["day"]), c["start"], c["modules"][0]["id"]))
+    return _with_instructor_names(conflicts)
+
+
+def module_conflicts(module, slots):
+    """Conflicts ``module`` would have with parsed ``slots`` (``parse_schedule`` output)."""
+    if not slots:
+        return []
+    room = location_key(module.location)
+    shares = Q(module__instructor_id=module.instructor_id)
+    if room is not None:
+        shares |= Q(module__room_key=room)
+    overlaps = Q()
+    for weekday, start, end in slots:
+        overlaps |= Q(weekday=weekday, start_minute__lt=end, end_minute__gt=start)
+
+    candidates = (
+        TimeSlot.objects.filter(shares, overlaps)
+        .filter(module__start_date__lte=module.end_date, module__end_date__gte=module.start_date)
+        .exclude(module_id=module.pk)
+        .values_list(*_SLOT_COLUMNS)
+    )
+    own = [
+        _slot(module.pk, module.code, module.location, room, module.instructor_id, weekday, start, end,
+              module.start_date, module.end_date)
+        for weekday, start, end in slots
+    ]
+    conflicts = []
+    for row in candidates:
+        other = _slot(*row)
+        for slot in own:
+            if other.start < slot.end and slot.start < other.end:
+                if room is not None and other.room == room:
+                    conflicts.append(_conflict("location", ("location", other.location), other, slot))
+                if other.instructor_id == module.instructor_id:
+                    conflicts.append(_conflict("instructor", ("instructor", other.instructor_id), other, slot))
+    return _with_instructor_names(conflicts)
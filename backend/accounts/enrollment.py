@@ -0,0 +1,425 @@
+"""Seat reservation for modules.
+
+``Module.enrolled`` is only ever changed with a conditional
+``UPDATE ... SET enrolled = enrolled + 1 WHERE enrolled < capacity``
+executed in the same transaction as the ``Enrollment`` insert, so two
+concurrent registrations can neither overbook a module nor lose an
+increment.  Duplicate registrations are caught by the
+``unique_together`` constraint rather than a racy pre-check.
+"""
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Exists, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .cache import invalidate_catalog, seats_changed
+from .models import Enrollment, Module, WaitlistEntry
+from .timetable import ClashChecker, book, find_clash
+
+
+class EnrollmentError(Exception):
+    status = 400
+    message = "Enrollment failed."
+
+
+class ModuleNotFound(EnrollmentError):
+    status = 404
+    message = "Module not found."
+
+
+class UserNotFound(EnrollmentError):
+    status = 404
+    message = "User not found."
+
+
+class ModuleFull(EnrollmentError):
+    message = "Module is full. Cannot enroll."
+
+
+class AlreadyEnrolled(EnrollmentError):
+    message = "You are already enrolled in this module."
+
+
+class NotEnrolled(EnrollmentError):
+    status = 404
+    message = "You are not enrolled in this module."
+
+
+class SeatsAvailable(EnrollmentError):
+    status = 409
+    message = "Module has free seats. Register instead of joining the waitlist."
+
+
+class NotWaitlisted(EnrollmentError):
+    status = 404
+    message = "You are not on the waitlist for this module."
+
+
+class TimetableClash(EnrollmentError):
+    status = 409
+
+    def __init__(self, module_id):
+        super().__init__()
+        self.module_id = module_id
+        code = Module.objects.filter(id=module_id).values_list("code", flat=True).first()
+        self.message = f"This module clashes with {code} in your timetable."
+
+
+def reserve_seat(user_id, module_id):
+    """Enroll ``user_id`` in ``module_id`` and return the updated module row.
+
+    The returned dict has the module's ``title`` and new ``enrolled``
+    count, read inside the transaction so it is the count this
+    registration produced.  Raises an ``EnrollmentError`` subclass when
+    the seat cannot be reserved; nothing is written in that case.  Every
+    database error, too, is raised before or by the commit, so a caller
+    can retry it.
+    """
+    try:
+        with transaction.atomic():
+            reserved = (
+                Module.objects.filter(id=module_id, enrolled__lt=F("capacity"))
+                .filter(Exists(User.objects.filter(id=user_id)))
+                .update(enrolled=F("enrolled") + 1)
+            )
+            if not reserved:
+                # Only the failure path pays for working out why.
+                if not Module.objects.filter(id=module_id).exists():
+                    raise ModuleNotFound()
+                if not User.objects.filter(id=user_id).exists():
+                    raise UserNotFound()
+                raise ModuleFull()
+            # Checked after the seat UPDATE, so on SQLite this transaction
+            # already holds the write lock; elsewhere lock the student.
+            list(User.objects.select_for_update().filter(id=user_id).values_list("id"))
+            clash = find_clash(user_id, module_id)
+            if clash is not None:
+                raise TimetableClash(clash)
+            enrollment = Enrollment.objects.create(user_id=user_id, module_id=module_id)
+            book(Enrollment.objects.filter(id=enrollment.id))
+            module = Module.objects.values("title", "enrolled").get(id=module_id)
+            seats_changed(module_id)
+    except IntegrityError:
+        raise AlreadyEnrolled()
+    return module
+
+
+BULK_BATCH_SIZE = 500
+
+# Per-pair outcomes reported by bulk_enroll
+ENROLLED = "enrolled"
+ALREADY_ENROLLED = "already_enrolled"
+MODULE_FULL = "module_full"
+UNKNOWN_MODULE = "unknown_module"
+UNKNOWN_USER = "unknown_user"
+CLASH = "timetable_clash"
+
+
+class BulkEnrollmentConflict(EnrollmentError):
+    status = 409
+    message = "Seats changed while the batch was being applied. Retry the batch."
+
+
+def bulk_enroll(pairs, batch_size=BULK_BATCH_SIZE):
+    """Enroll many ``(user_id, module_id)`` pairs at once.
+
+    Capacity is checked per module for the whole batch, enrollments are
+    inserted with ``bulk_create`` in batches of ``batch_size`` and every
+    touched module gets a single grouped ``UPDATE`` of its counter.  Seats
+    are handed out in the order the pairs were given, skipping students
+    whose timetable clashes with the module (including with a module the
+    same batch gave them).  Returns one ``{"userId", "moduleId",
+    "status"}`` dict per input pair.
+    """
+    pairs = list(pairs)
+    user_ids = {user_id for user_id, _ in pairs}
+    module_ids = {module_id for _, module_id in pairs}
+    statuses = {}
+
+    with transaction.atomic():
+        modules = {
+            row[0]: row
+            for row in Module.objects.select_for_update()
+            .filter(id__in=module_ids)
+            .values_list("id", "capacity", "enrolled")
+        }
+        known_users = set(User.objects.filter(id__in=user_ids).values_list("id", flat=True))
+        existing = set(
+            Enrollment.objects.filter(module_id__in=modules, user_id__in=known_users)
+            .values_list("user_id", "module_id")
+        )
+
+        clashes = ClashChecker(known_users, modules)
+        free = {module_id: capacity - enrolled for module_id, capacity, enrolled in modules.values()}
+        granted = {}
+        for pair in pairs:
+            if pair in statuses:
+                continue
+            user_id, module_id = pair
+            if module_id not in modules:
+                statuses[pair] = UNKNOWN_MODULE
+            elif user_id not in known_users:
+                statuses[pair] = UNKNOWN_USER
+            elif pair in existing:
+                statuses[pair] = ALREADY_ENROLLED
+            elif free[module_id] <= 0:
+                statuses[pair] = MODULE_FULL
+            elif clashes.clash(user_id, module_id) is not None:
+                statuses[pair] = CLASH
+            else:
+                clashes.book(user_id, module_id)
+                free[module_id] -= 1
+                granted[module_id] = granted.get(module_id, 0) + 1
+                statuses[pair] = ENROLLED
+
+        try:
+            Enrollment.objects.bulk_create(
+                (Enrollment(user_id=user_id, module_id=module_id)
+                 for (user_id, module_id), outcome in statuses.items() if outcome == ENROLLED),
+                batch_size=batch_size,
+            )
+        except IntegrityError:
+            # A pair was enrolled concurrently after ``existing`` was read;
+            # skipping it would leave the counters one seat ahead
+            raise BulkEnrollmentConflict() from None
+        for module_id, count in granted.items():
+            updated = (
+                Module.objects.filter(id=module_id, enrolled__lte=F("capacity") - count)
+                .update(enrolled=F("enrolled") + count)
+            )
+            if not updated:
+                # Someone registered outside the lock (SQLite has no row locks)
+                raise BulkEnrollmentConflict()
+        book(
+            Enrollment.objects.filter(
+                module_id__in=granted,
+                user_id__in={user_id for (user_id, _), outcome in statuses.items() if outcome == ENROLLED},
+                booked_slots__isnull=True,
+            )
+        )
+
+    for module_id in granted:
+        seats_changed(module_id)
+
+    return [
+        {"userId": user_id, "moduleId": module_id, "status": statuses[(user_id, module_id)]}
+        for user_id, module_id in pairs
+    ]
+
+
+WAITLIST_JOIN_RETRIES = 5
+
+
+WAITLIST_RANK_LIMIT = 500
+
+
+def waitlist_rank(module_id, position):
+    """``(place, is_lower_bound)`` in the queue of the entry holding ``position``.
+
+    The place is 1-based.  The entries ahead are counted on the
+    ``(module, position)`` index and the count stops after
+    ``WAITLIST_RANK_LIMIT`` of them, so polling costs the same however
+    long the queue is; anyone further back is reported at
+    ``WAITLIST_RANK_LIMIT + 1`` with ``is_lower_bound`` set.
+    """
+    ahead = WaitlistEntry.objects.filter(module_id=module_id, position__lt=position).values("position")
+    counted = ahead[:WAITLIST_RANK_LIMIT].count()
+    return counted + 1, counted >= WAITLIST_RANK_LIMIT
+
+
+def join_waitlist(user_id, module_id):
+    """Queue ``user_id`` for a full module and return their ``waitlist_rank``.
+
+    Joining twice is harmless and returns the existing place.  The new
+    ticket is one past the current tail, found through the
+    ``(module, position)`` index; two students racing for the same
+    ticket are separated by the unique constraint and the loser retries.
+    """
+    module = Module.objects.filter(id=module_id).values("capacity", "enrolled").first()
+    if module is None:
+        raise ModuleNotFound()
+    if not User.objects.filter(id=user_id).exists():
+        raise UserNotFound()
+    if Enrollment.objects.filter(user_id=user_id, module_id=module_id).exists():
+        raise AlreadyEnrolled()
+    if module["enrolled"] < module["capacity"]:
+        raise SeatsAvailable()
+
+    for _ in range(WAITLIST_JOIN_RETRIES):
+        existing = (
+            WaitlistEntry.objects.filter(user_id=user_id, module_id=module_id)
+            .values_list("position", flat=True)
+            .first()
+        )
+        if existing is not None:
+            return waitlist_rank(module_id, existing)
+
+        tail = WaitlistEntry.objects.filter(module_id=module_id).aggregate(tail=Max("position"))["tail"]
+        position = (tail or 0) + 1
+        try:
+            with transaction.atomic():
+                WaitlistEntry.objects.create(user_id=user_id, module_id=module_id, position=position)
+        except IntegrityError:
+            continue
+        return waitlist_rank(module_id, position)
+    raise EnrollmentError()
+
+
+def get_waitlist_rank(user_id, module_id):
+    position = (
+        WaitlistEntry.objects.filter(user_id=user_id, module_id=module_id)
+        .values_list("position", flat=True)
+        .first()
+    )
+    if position is None:
+        raise NotWaitlisted()
+    return waitlist_rank(module_id, position)
+
+
+def leave_waitlist(user_id, module_id):
+    deleted, _ = WaitlistEntry.objects.filter(user_id=user_id, module_id=module_id).delete()
+    if not deleted:
+        raise NotWaitlisted()
+
+
+def promote_waitlist(module_id):
+    """Move students from the head of the queue into free seats.
+
+    Runs inside the caller's transaction when there is one, so a seat
+    freed by an unenrollment or a capacity increase is handed over
+    atomically.  Returns the promoted user ids.
+    """
+    with transaction.atomic():
+        module = (
+            Module.objects.select_for_update()
+            .filter(id=module_id)
+            .values("capacity", "enrolled")
+            .first()
+        )
+        if module is None or module["enrolled"] >= module["capacity"]:
+            return []
+        free = module["capacity"] - module["enrolled"]
+
+        # Walk the queue from the head until the seats are filled.  A
+        # student whose timetable now clashes with the module is passed
+        # over and keeps their ticket for a later seat.
+        promoted, served, last = [], [], 0
+        while len(promoted) < free:
+            heads = list(
+                WaitlistEntry.objects.filter(module_id=module_id, position__gt=last)
+                .order_by("position")
+                .values_list("id", "user_id", "position")[:free - len(promoted)]
+            )
+            if not heads:
+                break
+            last = heads[-1][2]
+            user_ids = [user_id for _, user_id, _ in heads]
+            enrolled = set(
+                Enrollment.objects.filter(module_id=module_id, user_id__in=user_ids)
+                .values_list("user_id", flat=True)
+            )
+            clashes = ClashChecker(user_ids, [module_id])
+            for entry_id, user_id, _ in heads:
+                if user_id in enrolled:
+                    served.append(entry_id)
+                elif clashes.clash(user_id, module_id) is None:
+                    served.append(entry_id)
+                    promoted.append(user_id)
+        if not served:
+            return []
+
+        Enrollment.objects.bulk_create(
+            [Enrollment(user_id=user_id, module_id=module_id) for user_id in promoted],
+            ignore_conflicts=True,
+        )
+        if promoted:
+            updated = (
+                Module.objects.filter(id=module_id, enrolled__lte=F("capacity") - len(promoted))
+                .update(enrolled=F("enrolled") + len(promoted))
+            )
+            if not updated:
+                raise BulkEnrollmentConflict()
+            book(Enrollment.objects.filter(module_id=module_id, user_id__in=promoted))
+        WaitlistEntry.objects.filter(id__in=served).delete()
+
+        seats_changed(module_id)
+    return promoted
+
+
+def seat_freed(module_id):
+    """Give back the seat of a deleted ``Enrollment``; see ``signals.enrollment_deleted``.
+
+    The queue is promoted after commit: when a module or a student is
+    being deleted, its enrollments go first and the waitlist entries
+    that promotion would read may still be there.
+    """
+    Module.objects.filter(id=module_id, enrolled__gt=0).update(enrolled=F("enrolled") - 1)
+    seats_changed(module_id)
+    transaction.on_commit(lambda: promote_waitlist(module_id))
+
+
+def release_seat(user_id, module_id):
+    """Unenroll ``user_id`` and hand the seat to the head of the waitlist.
+
+    Returns the user ids promoted from the waitlist.
+    """
+    with transaction.atomic():
+        enrollments = Enrollment.objects.select_for_update().filter(user_id=user_id, module_id=module_id)
+        if not enrollments.exists():
+            if not Module.objects.filter(id=module_id).exists():
+                raise ModuleNotFound()
+            raise NotEnrolled()
+        # The post_delete receiver frees the seat
+        enrollments.delete()
+        promoted = promote_waitlist(module_id)
+    return promoted
+
+
+RECONCILE_BATCH_SIZE = 1000
+
+
+def reconcile_enrollment_counts(dry_run=False, batch_size=RECONCILE_BATCH_SIZE):
+    """Bring every ``Module.enrolled`` back in line with its ``Enrollment`` rows.
+
+    One grouped ``COUNT`` finds the drifted modules.  They are then fixed
+    with an ``UPDATE`` that recomputes the count in a subquery, so a
+    registration that lands between the two statements is not
+    overwritten with a stale value.  Returns the drift found as
+    ``[{"id", "counter", "actual"}, ...]``.
+
+    A counter that was too high kept students on the waitlist of a module
+    with free seats; those modules are promoted once the fix commits.
+    """
+    drifted = [
+        {"id": module_id, "counter": counter, "actual": actual}
+        for module_id, counter, actual in Module.objects.annotate(actual=Count("enrollment"))
+        .exclude(enrolled=F("actual"))
+        .order_by("id")
+        .values_list("id", "enrolled", "actual")
+    ]
+    if dry_run or not drifted:
+        return drifted
+
+    true_count = (
+        Enrollment.objects.filter(module=OuterRef("pk"))
+        .order_by()
+        .values("module")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    ids = [row["id"] for row in drifted]
+    with transaction.atomic():
+        for start in range(0, len(ids), batch_size):
+            Module.objects.filter(id__in=ids[start:start + batch_size]).update(
+                enrolled=Coalesce(Subquery(true_count), 0)
+            )
+        for module_id in ids:
+            seats_changed(module_id)
+        transaction.on_commit(invalidate_catalog)
+        freed = [row["id"] for row in drifted if row["actual"] < row["counter"]]
+        if freed:
+            waiting = sorted(set(
+                WaitlistEntry.objects.filter(module_id__in=freed).values_list("module_id", flat=True)
+            ))
+            transaction.on_commit(lambda: [promote_waitlist(module_id) for module_id in waiting])
+    return drifted
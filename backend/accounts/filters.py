@@ -0,0 +1,181 @@
+"""Filtered module listing with facet counts for ``/api/modules/``.
+
+Filters (all optional, lists are comma-separated)::
+
+    department=math,computer_science   Course.department
+    credits=5,10                       Course.credits
+    instructor=3,7                     Module.instructor_id
+    date_from=2025-09-01               Module.start_date >= date_from
+    date_to=2025-12-20                 Module.end_date <= date_to
+    has_seats=true|false               enrolled < capacity
+
+Facets are counted the way a filter sidebar needs them: the counts for
+one facet apply every *other* active filter, so selecting a department
+still shows how many modules the other departments have.  All facets
+plus the total come from one ``UNION ALL`` of grouped subqueries, i.e.
+one query whatever the number of facets and values.  That query scans
+the catalog once per facet, so its result is kept in the versioned
+catalog cache, per set of filters, for ``CATALOG_SEATS_TIMEOUT``
+seconds: catalog changes drop it at once, and the seat counts behind
+``has_seats`` are at most that old, as in the cached listings.  The page
+of modules itself is a second, keyset-paginated query.
+"""
+from datetime import date
+
+from django.db.models import BooleanField, CharField, Count, ExpressionWrapper, F, Q, Value
+from django.db.models.functions import Cast, Concat
+
+from .cache import cached_data, get_seats_timeout
+from .catalog import MODULE_FIELDS, CatalogQueryError, ModuleSerializer, _parse_fields, parse_limit_and_cursor
+from .models import Course, Module
+
+FILTER_PARAMS = ("department", "credits", "instructor", "date_from", "date_to", "has_seats")
+FACETS = ("department", "credits", "instructor", "has_seats")
+
+DEPARTMENT_LABELS = dict(Course.DEPARTMENTS)
+
+_HAS_SEATS = ExpressionWrapper(Q(enrolled__lt=F("capacity")), output_field=BooleanField())
+
+# Facet -> (grouped expression, label expression or None)
+_FACET_COLUMNS = {
+    "department": (F("course__department"), None),
+    "credits": (F("course__credits"), None),
+    "instructor": (F("instructor_id"), Concat("instructor__first_name", Value(" "), "instructor__last_name")),
+    "has_seats": (_HAS_SEATS, None),
+}
+
+
+def _parse_list(params, name, cast=str):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return [cast(part.strip()) for part in value.split(",") if part.strip()]
+    except ValueError:
+        raise CatalogQueryError(f"Invalid {name}")
+
+
+def _parse_date(params, name):
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise CatalogQueryError(f"{name} must be a YYYY-MM-DD date")
+
+
+def parse_filter_request(params):
+    """Validate filters, ``fields``, ``limit`` and ``cursor``."""
+    departments = _parse_list(params, "department")
+    unknown = set(departments or ()) - set(DEPARTMENT_LABELS)
+    if unknown:
+        raise CatalogQueryError(f"Unknown department: {', '.join(sorted(unknown))}")
+
+    has_seats = params.get("has_seats")
+    if has_seats not in (None, "", "true", "false", "1", "0"):
+        raise CatalogQueryError("has_seats must be true or false")
+
+    limit, cursor = parse_limit_and_cursor(params)
+    return {
+        "filters": {
+            "department": departments,
+            "credits": _parse_list(params, "credits", int),
+            "instructor": _parse_list(params, "instructor", int),
+            "date_from": _parse_date(params, "date_from"),
+            "date_to": _parse_date(params, "date_to"),
+            "has_seats": None if not has_seats else has_seats in ("true", "1"),
+        },
+        "fields": _parse_fields(params.get("fields"), MODULE_FIELDS, "fields"),
+        "limit": limit,
+        "cursor": cursor,
+    }
+
+
+def _conditions(filters):
+    """One ``Q`` per active filter, keyed by filter name."""
+    conditions = {}
+    if filters["department"] is not None:
+        conditions["department"] = Q(course__department__in=filters["department"])
+    if filters["credits"] is not None:
+        conditions["credits"] = Q(course__credits__in=filters["credits"])
+    if filters["instructor"] is not None:
+        conditions["instructor"] = Q(instructor_id__in=filters["instructor"])
+    if filters["date_from"] is not None:
+        conditions["date_from"] = Q(start_date__gte=filters["date_from"])
+    if filters["date_to"] is not None:
+        conditions["date_to"] = Q(end_date__lte=filters["date_to"])
+    if filters["has_seats"] is not None:
+        seats = Q(enrolled__lt=F("capacity"))
+        conditions["has_seats"] = seats if filters["has_seats"] else ~seats
+    return conditions
+
+
+def _filtered(conditions, exclude=None):
+    queryset = Module.objects.all()
+    for name, condition in conditions.items():
+        if name != exclude:
+            queryset = queryset.filter(condition)
+    return queryset
+
+
+def _facet_branch(queryset, facet, value, label):
+    # Every branch yields (facet, value, label, count); values are cast to
+    # text so the branches have compatible column types on any backend.
+    return (
+        queryset.annotate(value=Cast(value, CharField()), label=label or Value(""))
+        .values("value", "label")
+        .annotate(facet=Value(facet), count=Count("id"))
+        .values_list("facet", "value", "label", "count")
+    )
+
+
+def _facet_value(facet, value):
+    if facet in ("credits", "instructor"):
+        return int(value)
+    if facet == "has_seats":
+        return value in ("1", "true")
+    return value
+
+
+def facet_counts(conditions):
+    """``{"total": n, facet: [{"value", "label", "count"}, ...]}`` in one query."""
+    branches = [_facet_branch(_filtered(conditions), "total", Value(""), None)]
+    for facet in FACETS:
+        value, label = _FACET_COLUMNS[facet]
+        branches.append(_facet_branch(_filtered(conditions, exclude=facet), facet, value, label))
+
+    counts = {"total": 0, **{facet: [] for facet in FACETS}}
+    for facet, value, label, count in branches[0].union(*branches[1:], all=True):
+        if facet == "total":
+            counts["total"] = count
+            continue
+        value = _facet_value(facet, value)
+        if facet == "department":
+            label = DEPARTMENT_LABELS.get(value, value)
+        counts[facet].append({"value": value, "label": label or str(value), "count": count})
+
+    for facet in FACETS:
+        counts[facet].sort(key=lambda item: (-item["count"], str(item["value"])))
+    return counts
+
+
+def filter_modules(request):
+    """The ``/api/modules/`` response for a ``parse_filter_request`` dict."""
+    conditions = _conditions(request["filters"])
+    queryset = _filtered(conditions).order_by("id")
+    if request["cursor"] is not None:
+        queryset = queryset.filter(id__gt=request["cursor"])
+
+    serializer = ModuleSerializer(request["fields"], key_column="id")
+    # One extra row tells whether there is a next page
+    rows = list(serializer.rows(queryset[: request["limit"] + 1]))
+    has_more = len(rows) > request["limit"]
+    rows = rows[: request["limit"]]
+    return {
+        "results": [serializer.to_dict(row) for row in rows],
+        "next_cursor": str(rows[-1][0]) if has_more else None,
+        "facets": cached_data(
+            "module_facets", lambda: facet_counts(conditions), request["filters"], get_seats_timeout()
+        ),
+    }
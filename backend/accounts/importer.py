@@ -0,0 +1,365 @@
+"""Bulk catalog import from CSV or JSONL files.
+
+One file per kind, imported in dependency order (instructors, courses,
+modules) inside a single transaction, so a bad row anywhere leaves the
+catalog untouched.  Columns (CSV header or JSON keys)::
+
+    instructors  first_name, last_name, about?, department?
+    courses      code, title, description?, department?, credits, module_count?
+    modules      course, code, title, description?, instructor, start_date,
+                 end_date, capacity, schedule?, location?
+
+Rows are matched to existing objects by natural key: an instructor by
+name, a course by ``code`` and a module by ``(course, code)``; a match
+is updated, anything else created.  A module's ``course`` is a course
+code and its ``instructor`` is a full name ("First Last"), so an
+instructors file naming the same person twice is rejected, and a module
+cannot name an instructor whose name several existing ones share.  Optional
+columns left out are imported as empty (or the model default), so the
+file is the source of truth for every column it covers; seat counts
+(``Module.enrolled``) are never touched.
+
+Files are read one row at a time and written every ``batch_size`` rows,
+new objects with ``bulk_create`` and changed ones with ``update_rows``.  The natural-key maps hold
+one id per existing object, so memory depends on the size of the
+catalog, not of the file.  Bulk writes skip the model signals; the
+derived data they maintain is updated here instead: time slots per
+batch, then the search index, the catalog cache and the waitlists of
+modules whose capacity may have grown.
+"""
+import csv
+import json
+import time
+from datetime import date
+
+from django.db import connections, router, transaction
+
+from .cache import invalidate_catalog
+from .enrollment import promote_waitlist
+from .models import Course, Instructor, Module, WaitlistEntry, room_key
+from .search import is_available as search_available, rebuild_index
+from .timetable import ScheduleError, parse_schedule, replace_time_slots
+
+KINDS = ("instructors", "courses", "modules")  # dependency order
+FORMATS = ("csv", "jsonl")
+DEFAULT_BATCH_SIZE = 2000
+MAX_REPORTED_ERRORS = 20
+
+
+class CatalogImportError(ValueError):
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} invalid row{'s' if len(errors) != 1 else ''}: " + "; ".join(errors[:3]))
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(filename):
+    suffix = filename.rsplit(".", 1)[-1].lower()
+    if suffix == "csv":
+        return "csv"
+    if suffix in ("jsonl", "ndjson"):
+        return "jsonl"
+    raise CatalogImportError([f"{filename}: unknown format, expected .csv or .jsonl"])
+
+
+def read_rows(lines, format):
+    """Yield ``(line number, dict)`` from an iterable of text lines.
+
+    An unreadable JSON line is yielded as a ``RowError`` instead.
+    """
+    if format == "csv":
+        # Line numbers count the header
+        yield from enumerate(csv.DictReader(lines), start=2)
+        return
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = RowError(f"invalid JSON ({e})")
+        yield number, row
+
+
+def name_key(name):
+    return " ".join(name.split()).casefold()
+
+
+def _text(row, column, required=False, max_length=None):
+    value = row.get(column)
+    value = "" if value is None else str(value).strip()
+    if required and not value:
+        raise RowError(f"{column} is required")
+    if max_length and len(value) > max_length:
+        raise RowError(f"{column} is longer than {max_length} characters")
+    return value
+
+
+def _int(row, column, default=None):
+    value = _text(row, column, required=default is None)
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise RowError(f"{column} must be a whole number")
+    if number < 0:
+        raise RowError(f"{column} must not be negative")
+    return number
+
+
+def _date(row, column):
+    try:
+        return date.fromisoformat(_text(row, column, required=True))
+    except ValueError:
+        raise RowError(f"{column} must be a YYYY-MM-DD date")
+
+
+def _choice(row, column, model):
+    field = model._meta.get_field(column)
+    value = _text(row, column)
+    if not value:
+        return field.default
+    for key, label in field.choices:
+        if value in (key, label):
+            return key
+    raise RowError(f"{column} must be one of: {', '.join(key for key, _ in field.choices)}")
+
+
+class InstructorRows:
+    model = Instructor
+    fields = ("first_name", "last_name", "about", "department")
+
+    def load_keys(self, maps):
+        keys, ambiguous = {}, set()
+        for id, first, last in Instructor.objects.values_list("id", "first_name", "last_name").iterator():
+            key = name_key(f"{first} {last}")
+            if key in keys:
+                ambiguous.add(key)
+            keys[key] = id
+        maps["instructors"], maps["ambiguous_instructors"] = keys, ambiguous
+        return keys
+
+    def parse(self, row, maps):
+        values = {
+            "first_name": _text(row, "first_name", required=True, max_length=255),
+            "last_name": _text(row, "last_name", required=True, max_length=255),
+            "about": _text(row, "about", max_length=255),
+            "department": _choice(row, "department", Instructor),
+        }
+        name = f"{values['first_name']} {values['last_name']}"
+        key = name_key(name)
+        # Two rows would be merged into one instructor, and modules could
+        # not tell them apart anyway
+        seen = maps.setdefault("imported_instructors", set())
+        if key in seen:
+            raise RowError(f"instructor {name!r} appears more than once")
+        seen.add(key)
+        return key, values
+
+
+class CourseRows:
+    model = Course
+    fields = ("code", "title", "description", "department", "credits", "module_count")
+
+    def load_keys(self, maps):
+        maps["courses"] = dict(Course.objects.values_list("code", "id").iterator())
+        return maps["courses"]
+
+    def parse(self, row, maps):
+        values = {
+            "code": _text(row, "code", required=True, max_length=8),
+            "title": _text(row, "title", required=True, max_length=35),
+            "description": _text(row, "description", max_length=255),
+            "department": _choice(row, "department", Course),
+            "credits": _int(row, "credits"),
+            "module_count": _int(row, "module_count", default=0),
+        }
+        return values["code"], values
+
+
+class ModuleRows:
+    model = Module
+    fields = (
+        "course_id", "code", "title", "description", "instructor_id",
+        "start_date", "end_date", "capacity", "schedule", "location", "room_key",
+    )
+
+    def load_keys(self, maps):
+        if "courses" not in maps:
+            CourseRows().load_keys(maps)
+        if "instructors" not in maps:
+            InstructorRows().load_keys(maps)
+        return {
+            (course_id, code): id
+            for id, course_id, code in Module.objects.values_list("id", "course_id", "code").iterator()
+        }
+
+    def parse(self, row, maps):
+        course = _text(row, "course", required=True)
+        if course not in maps["courses"]:
+            raise RowError(f"unknown course {course!r}")
+        instructor = name_key(_text(row, "instructor", required=True))
+        if instructor not in maps["instructors"]:
+            raise RowError(f"unknown instructor {row['instructor']!r}")
+        if instructor in maps["ambiguous_instructors"]:
+            raise RowError(f"several instructors are called {row['instructor']!r}")
+        values = {
+            "course_id": maps["courses"][course],
+            "code": _text(row, "code", required=True, max_length=20),
+            "title": _text(row, "title", required=True, max_length=255),
+            "description": _text(row, "description"),
+            "instructor_id": maps["instructors"][instructor],
+            "start_date": _date(row, "start_date"),
+            "end_date": _date(row, "end_date"),
+            "capacity": _int(row, "capacity"),
+            "schedule": _text(row, "schedule", max_length=255),
+            "location": _text(row, "location", max_length=255),
+        }
+        # bulk_create and update_rows bypass Module.save()
+        values["room_key"] = room_key(values["location"])
+        if values["end_date"] < values["start_date"]:
+            raise RowError("end_date is before start_date")
+        try:
+            values["slots"] = parse_schedule(values["schedule"])
+        except ScheduleError as e:
+            raise RowError(str(e))
+        return (values["course_id"], values["code"]), values
+
+
+ROWS = {"instructors": InstructorRows, "courses": CourseRows, "modules": ModuleRows}
+
+
+def update_rows(model, objs, fields):
+    """Save ``fields`` of ``objs`` with one parameterised ``UPDATE`` per row, sent with ``executemany``.
+
+    Does what ``bulk_update`` does, but ``bulk_update`` builds a ``CASE``
+    expression per field and row, which costs far more Python time than
+    the database needs to run the statements.
+    """
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    columns = [model._meta.get_field(name) for name in fields]
+    sql = "UPDATE {} SET {} WHERE {} = %s".format(
+        quote(model._meta.db_table),
+        ", ".join(f"{quote(field.column)} = %s" for field in columns),
+        quote(model._meta.pk.column),
+    )
+    params = [
+        [field.get_db_prep_save(getattr(obj, field.attname), connection) for field in columns] + [obj.pk]
+        for obj in objs
+    ]
+    if params:
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+
+
+class _Batch:
+    """Pending creates and updates, keyed by natural key so repeats collapse."""
+
+    def __init__(self, rows, keys):
+        self.rows = rows
+        self.keys = keys
+        self.creates = {}
+        self.updates = {}
+        self.slots = {}
+
+    def __len__(self):
+        return len(self.creates) + len(self.updates)
+
+    def add(self, key, values):
+        slots = values.pop("slots", None)
+        pending = self.updates if key in self.keys else self.creates
+        if key in pending:
+            for field, value in values.items():
+                setattr(pending[key], field, value)
+        else:
+            pending[key] = self.rows.model(id=self.keys.get(key), **values)
+        if slots is not None:
+            self.slots[key] = slots
+
+    def flush(self):
+        created = self.rows.model.objects.bulk_create(list(self.creates.values()))
+        if any(obj.pk is None for obj in created):  # backends without RETURNING
+            self.keys.clear()
+            self.keys.update(self.rows.load_keys({}))
+        else:
+            self.keys.update((key, obj.pk) for key, obj in self.creates.items())
+        update_rows(self.rows.model, self.updates.values(), self.rows.fields)
+        if self.slots:
+            replace_time_slots({self.keys[key]: slots for key, slots in self.slots.items()})
+        counts = len(self.creates), len(self.updates)
+        self.creates, self.updates, self.slots = {}, {}, {}
+        return counts
+
+
+def _import_kind(kind, rows_iter, maps, batch_size, stats, errors, updated_modules):
+    rows = ROWS[kind]()
+    keys = rows.load_keys(maps)
+    batch = _Batch(rows, keys)
+    for number, row in rows_iter:
+        try:
+            if isinstance(row, RowError):
+                raise row
+            if not isinstance(row, dict):
+                raise RowError("not a JSON object")
+            key, values = rows.parse(row, maps)
+        except RowError as e:
+            errors.append(f"{kind} line {number}: {e}")
+            if len(errors) >= MAX_REPORTED_ERRORS:
+                break
+            continue
+        if errors:
+            continue  # keep validating, nothing will be written
+        batch.add(key, values)
+        if kind == "modules" and key in keys:
+            updated_modules.add(keys[key])
+        if len(batch) >= batch_size:
+            created, updated = batch.flush()
+            stats[kind]["created"] += created
+            stats[kind]["updated"] += updated
+    if not errors:
+        created, updated = batch.flush()
+        stats[kind]["created"] += created
+        stats[kind]["updated"] += updated
+
+
+def import_catalog(sources, batch_size=DEFAULT_BATCH_SIZE):
+    """Import ``{kind: (lines, format)}`` in one transaction.
+
+    ``lines`` is any iterable of text lines, e.g. an open file.  Raises
+    ``CatalogImportError`` listing the bad rows (the first
+    ``MAX_REPORTED_ERRORS`` of them) and writes nothing if any row is
+    invalid.  Returns created/updated counts per kind.
+    """
+    unknown = set(sources) - set(KINDS)
+    if unknown:
+        raise CatalogImportError([f"unknown kind {kind!r}" for kind in sorted(unknown)])
+
+    started = time.perf_counter()
+    stats = {kind: {"created": 0, "updated": 0} for kind in KINDS if kind in sources}
+    errors, maps, updated_modules = [], {}, set()
+    with transaction.atomic():
+        for kind in KINDS:
+            if kind not in sources:
+                continue
+            lines, format = sources[kind]
+            _import_kind(kind, read_rows(lines, format), maps, batch_size, stats, errors, updated_modules)
+            if errors:
+                break
+        if errors:
+            raise CatalogImportError(errors)
+
+        if search_available() and ("courses" in sources or "modules" in sources):
+            rebuild_index()
+        transaction.on_commit(invalidate_catalog)
+        # A capacity raised by the import frees seats for queued students
+        waiting = set(WaitlistEntry.objects.values_list("module_id", flat=True).distinct())
+        for module_id in sorted(waiting & updated_modules):
+            promote_waitlist(module_id)
+
+    stats["seconds"] = round(time.perf_counter() - started, 2)
+    return stats
@@ -0,0 +1,57 @@
+import io
+import json
+from contextlib import redirect_stdout
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.benchmarks import isolated_database, seed_catalog
+from accounts.query_audit import WATCHED_TABLES, audit_routes
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database, call every /api/ route, EXPLAIN each SQL "
+        "statement it runs and report full scans of the enrollment, module "
+        "and user tables, as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, default=50)
+        parser.add_argument("--modules", type=int, default=500)
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--enrollments", type=int, default=2000)
+        parser.add_argument(
+            "--table", action="append",
+            help=f"Table whose scans are flagged (repeatable). Default: {', '.join(WATCHED_TABLES)}.",
+        )
+        parser.add_argument(
+            "--fail-on-scan", action="store_true",
+            help="Exit with an error if any flagged scan is found (for CI).",
+        )
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            seeded = seed_catalog(
+                courses=options["courses"],
+                modules=options["modules"],
+                users=options["users"],
+                enrollments=options["enrollments"],
+            )
+            # The views print as they go; keep that out of the JSON report
+            with redirect_stdout(io.StringIO()):
+                report = audit_routes(tuple(options["table"] or WATCHED_TABLES))
+
+        flagged = [call for call in report["routes"] if call["scans"]]
+        self.stdout.write(json.dumps({
+            "seeded": seeded,
+            "calls": len(report["routes"]),
+            "flagged_calls": len(flagged),
+            "not_exercised": report["not_exercised"],
+            "flagged": flagged,
+            "routes": [
+                {key: call[key] for key in ("method", "path", "status", "queries")}
+                for call in report["routes"]
+            ],
+        }, indent=2))
+        if options["fail_on_scan"] and flagged:
+            raise CommandError(f"{len(flagged)} calls scan {', '.join(options['table'] or WATCHED_TABLES)}")
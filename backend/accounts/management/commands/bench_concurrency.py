@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.benchmarks import percentiles
+
+# mode -> (uvicorn arguments, URL prefix)
+MODES = {
+    "wsgi": (["--interface", "wsgi", "myproject.wsgi:application"], "/api/"),
+    "asgi-sync": (["myproject.asgi:application"], "/api/"),
+    "asgi-async": (["myproject.asgi:application"], "/api/async/"),
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError("The server exited before accepting connections.")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise CommandError(f"The server did not start listening on port {port}.")
+
+
+async def fetch(port, path):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(
+        f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n".encode()
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    await writer.wait_closed()
+    return int(response.split(b" ", 2)[1])
+
+
+async def load(port, path, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                status = await fetch(port, path)
+            except OSError:
+                status = None
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return time.perf_counter() - started, latencies, errors
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare sync views under WSGI, sync views under ASGI and the async "
+        "views under ASGI by driving a uvicorn server with many concurrent "
+        "clients. Requires uvicorn. Only issues GET requests against the "
+        "configured database, so seed it first for meaningful numbers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="courses/", help="Endpoint below /api/ or /api/async/.")
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--concurrency", type=int, default=100)
+        parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated subset of: " + ", ".join(MODES))
+        parser.add_argument(
+            "--keep-cache", action="store_true",
+            help="Leave the response cache on (by default the servers use a dummy cache so the ORM path is measured).",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            import uvicorn  # noqa: F401
+        except ImportError:
+            raise CommandError("bench_concurrency needs uvicorn: pip install uvicorn")
+
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "myproject.settings"))
+        if not options["keep_cache"]:
+            env["CACHE_BACKEND"] = "django.core.cache.backends.dummy.DummyCache"
+
+        report = {"path": options["path"], "requests": options["requests"], "concurrency": options["concurrency"]}
+        for mode in options["modes"].split(","):
+            if mode not in MODES:
+                raise CommandError(f"Unknown mode {mode!r}")
+            server_args, prefix = MODES[mode]
+            port = free_port()
+            process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", *server_args, "--port", str(port), "--log-level", "warning"],
+                cwd=settings.BASE_DIR, env=env,
+            )
+            try:
+                wait_for_port(port, process)
+                path = prefix + options["path"]
+                # Warm up connections, caches and imports
+                asyncio.run(load(port, path, min(20, options["requests"]), 5))
+                elapsed, latencies, errors = asyncio.run(
+                    load(port, path, options["requests"], options["concurrency"])
+                )
+            finally:
+                process.terminate()
+                process.wait(timeout=10)
+            report[mode] = {
+                "requests_per_second": round(options["requests"] / elapsed, 1),
+                "errors": errors,
+                "latency_ms": percentiles(latencies),
+            }
+        self.stdout.write(json.dumps(report, indent=2))
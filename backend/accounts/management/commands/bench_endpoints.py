@@ -0,0 +1,160 @@
+import io
+import json
+import resource
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+
+from accounts.benchmarks import isolated_database, percentiles, seed_catalog
+from accounts.cache import invalidate_catalog
+from accounts.middleware import QueryStats
+from accounts.query_audit import client_settings, route_calls, route_fixtures, send
+from accounts.urls import urlpatterns
+from accounts.views import get_tokens_for_user
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch database, drive every /api/ route through the test "
+        "client and report p50/p95/p99 latency, queries per request and peak "
+        "memory per call as JSON. With --baseline, compare against an earlier "
+        "report and exit with an error on regressions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, default=1000)
+        parser.add_argument("--modules", type=int, default=10_000)
+        parser.add_argument("--instructors", type=int, default=500)
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--enrollments", type=int, default=40_000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--iterations", type=int, default=30)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument(
+            "--cold", action="store_true",
+            help="Invalidate the catalog cache before every call.",
+        )
+        parser.add_argument("--output", help="Also write the report to this file.")
+        parser.add_argument("--baseline", help="A report from an earlier run to compare against.")
+        parser.add_argument(
+            "--tolerance", type=float, default=0.25,
+            help="Allowed p95 slowdown against the baseline, as a fraction (default 0.25).",
+        )
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            seeded = seed_catalog(
+                courses=options["courses"],
+                modules=options["modules"],
+                instructors=options["instructors"],
+                users=options["users"],
+                enrollments=options["enrollments"],
+                seed=options["seed"],
+            )
+            # The views print as they go; keep that out of the JSON report
+            with client_settings(), redirect_stdout(io.StringIO()):
+                endpoints, not_exercised = self.run(options)
+
+        report = {
+            "seeded": seeded,
+            "iterations": options["iterations"],
+            "cold_cache": options["cold"],
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "not_exercised": not_exercised,
+            "endpoints": endpoints,
+        }
+        regressions = []
+        if options["baseline"]:
+            with open(options["baseline"]) as f:
+                regressions = compare(json.load(f)["endpoints"], endpoints, options["tolerance"])
+            report["regressions"] = regressions
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output)
+        self.stdout.write(output)
+        if regressions:
+            raise CommandError(f"{len(regressions)} endpoints regressed against {options['baseline']}")
+
+    def run(self, options):
+        fx = route_fixtures()
+        admin = Client()
+        admin.force_login(fx["admin"])
+        samples, queries, statuses, memory = {}, {}, {}, {}
+
+        def calls(n):
+            # Fresh tokens every round, so long runs do not outlive them
+            table = route_calls(fx, get_tokens_for_user(fx["student"]), n)
+            for pattern in urlpatterns:
+                route = str(pattern.pattern)
+                for method, path, payload, headers, as_admin in table.get(route, ()):
+                    query = path.partition("?")[2]
+                    key = f"{method.upper()} {route}" + (f"?{query}" if query else "")
+                    yield key, (admin if as_admin else Client()), (method, path, payload, headers)
+
+        rounds = options["warmup"] + options["iterations"]
+        for n in range(rounds):
+            for key, client, call in calls(n):
+                if options["cold"]:
+                    invalidate_catalog()
+                stats = QueryStats()
+                with connections["default"].execute_wrapper(stats):
+                    started = time.perf_counter()
+                    response = send(client, *call)
+                    elapsed = time.perf_counter() - started
+                if n < options["warmup"]:
+                    continue
+                samples.setdefault(key, []).append(elapsed)
+                queries.setdefault(key, []).append(stats.count)
+                statuses.setdefault(key, set()).add(response.status_code)
+
+        # One more round under tracemalloc, which slows everything down
+        # too much to share the timed rounds
+        tracemalloc.start()
+        try:
+            for key, client, call in calls(rounds):
+                if options["cold"]:
+                    invalidate_catalog()
+                tracemalloc.reset_peak()
+                before = tracemalloc.get_traced_memory()[0]
+                send(client, *call)
+                memory[key] = round((tracemalloc.get_traced_memory()[1] - before) / 1024, 1)
+        finally:
+            tracemalloc.stop()
+
+        table = route_calls(fx, get_tokens_for_user(fx["student"]))
+        not_exercised = [str(p.pattern) for p in urlpatterns if str(p.pattern) not in table]
+        endpoints = {
+            key: {
+                "latency_ms": percentiles(samples[key]),
+                "queries": max(queries[key]),
+                "statuses": sorted(statuses[key]),
+                "peak_memory_kb": memory.get(key),
+            }
+            for key in samples
+        }
+        return endpoints, not_exercised
+
+
+def compare(baseline, current, tolerance):
+    """Endpoints whose p95 grew by more than ``tolerance`` or that run more queries."""
+    regressions = []
+    for key, now in current.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+        p95, base_p95 = now["latency_ms"]["p95"], before["latency_ms"]["p95"]
+        slower = base_p95 and p95 > base_p95 * (1 + tolerance)
+        more_queries = now["queries"] > before["queries"]
+        if slower or more_queries:
+            regressions.append({
+                "endpoint": key,
+                "p95_ms": [base_p95, p95],
+                "queries": [before["queries"], now["queries"]],
+            })
+    return regressions
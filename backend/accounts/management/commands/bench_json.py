@@ -0,0 +1,89 @@
+import json
+import random
+import timeit
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from accounts import renderers
+
+
+def catalog_payload(courses, modules_per_course, seed=0):
+    """A get_courses-shaped payload plus a product list, with raw dates and Decimals."""
+    rng = random.Random(seed)
+    start = date(2025, 9, 1)
+    payload = []
+    module_id = 0
+    for course_id in range(1, courses + 1):
+        modules = []
+        for _ in range(modules_per_course):
+            module_id += 1
+            modules.append({
+                "id": module_id,
+                "courseId": course_id,
+                "code": f"M{module_id:06d}",
+                "title": f"Module {module_id}",
+                "description": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 3,
+                "instructor": {
+                    "id": rng.randint(1, 5000),
+                    "first_name": "Ada",
+                    "last_name": "Lovelace",
+                    "department": "computer_science",
+                },
+                "startDate": start,
+                "endDate": start + timedelta(days=110),
+                "capacity": 120,
+                "enrolled": rng.randint(0, 120),
+                "schedule": "Mon/Wed 10:00-11:30",
+                "location": f"Building {rng.randint(1, 20)}, Room {rng.randint(100, 499)}",
+            })
+        payload.append({
+            "id": course_id,
+            "code": f"C{course_id:05d}",
+            "title": f"Course {course_id}",
+            "description": "A course about things.",
+            "department": "computer_science",
+            "credits": 5,
+            "image": None,
+            "module_count": modules_per_course,
+            "modules": modules,
+        })
+    products = [
+        {
+            "id": i,
+            "price": Decimal(rng.randint(100, 100000)) / 100,
+            "created_at": datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i),
+        }
+        for i in range(courses)
+    ]
+    return {"courses": payload, "products": products}
+
+
+def stdlib_dumps(data):
+    # What JsonResponse does
+    return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+class Command(BaseCommand):
+    help = "Compare JSON encode time of the stdlib encoder and accounts.renderers.dumps."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, default=1000)
+        parser.add_argument("--modules", type=int, default=10, help="Modules per course.")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        data = catalog_payload(options["courses"], options["modules"])
+        report = {
+            "backend": "orjson" if renderers.orjson is not None else "stdlib",
+            "courses": options["courses"],
+            "modules": options["courses"] * options["modules"],
+            "bytes": len(renderers.dumps(data)),
+        }
+        for name, encode in (("stdlib", stdlib_dumps), ("fast", renderers.dumps)):
+            best = min(timeit.repeat(lambda: encode(data), number=1, repeat=options["repeat"]))
+            report[f"{name}_ms"] = round(best * 1000, 2)
+        report["speedup"] = round(report["stdlib_ms"] / report["fast_ms"], 1)
+        self.stdout.write(json.dumps(report, indent=2))
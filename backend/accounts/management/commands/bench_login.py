@@ -0,0 +1,86 @@
+import json
+import random
+import time
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from accounts.backends import EmailBackend
+from accounts.benchmarks import isolated_database, percentiles
+
+
+def timed(func, args_list):
+    samples = []
+    for args in args_list:
+        started = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+def legacy_lookup(email):
+    return User.objects.filter(email=email).first()
+
+
+def legacy_login(email, password):
+    # What login_view did before EmailBackend: find the user, then let
+    # authenticate() load it again by username.
+    user = legacy_lookup(email)
+    return authenticate(username=user.username, password=password)
+
+
+def email_login(email, password):
+    return authenticate(email=email, password=password)
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill a scratch database with --users accounts and compare the old "
+        "email-then-username login with EmailBackend, reporting latency "
+        "percentiles for the user lookup alone and for the whole login."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1_000_000)
+        parser.add_argument("--lookups", type=int, default=500)
+        parser.add_argument("--logins", type=int, default=30, help="Full logins per path (each one runs the password hasher).")
+        parser.add_argument("--batch-size", type=int, default=20000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        password = "correct horse battery staple"
+        users = options["users"]
+
+        with isolated_database():
+            # Hash once; the benchmark is about the lookup, not about inserting
+            hashed = make_password(password)
+            started = time.perf_counter()
+            for offset in range(0, users, options["batch_size"]):
+                stop = min(users, offset + options["batch_size"])
+                User.objects.bulk_create(
+                    User(username=f"bench_{i}", email=f"user{i}@example.com", password=hashed)
+                    for i in range(offset, stop)
+                )
+            seeded = time.perf_counter() - started
+
+            def emails(count):
+                return [f"user{rng.randrange(users)}@example.com" for _ in range(count)]
+
+            backend = EmailBackend()
+            report = {
+                "users": users,
+                "seed_seconds": round(seeded, 1),
+                "lookup_ms": {
+                    "email_exact_unindexed": timed(legacy_lookup, [(e,) for e in emails(options["lookups"])]),
+                    "email_lower_indexed": timed(backend.get_by_email, [(e.upper(),) for e in emails(options["lookups"])]),
+                },
+                "login_ms": {
+                    "legacy": timed(legacy_login, [(e, password) for e in emails(options["logins"])]),
+                    "email_backend": timed(email_login, [(e, password) for e in emails(options["logins"])]),
+                },
+            }
+
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,49 @@
+import json
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from accounts.benchmarks import isolated_database, registration_stress
+from accounts.models import Course, Enrollment, Instructor, Module
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer register_module's seat reservation from many threads in a "
+        "scratch database and report overbooking and throughput as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--capacity", type=int, default=500)
+        parser.add_argument("--threads", type=int, default=16)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            course = Course.objects.create(
+                title="Stress", code="STRESS", description="", credits=5, module_count=1
+            )
+            instructor = Instructor.objects.create(first_name="Stress", last_name="Test", about="")
+            module = Module.objects.create(
+                course=course, code="STRESS-1", title="Stress", description="",
+                instructor=instructor, start_date=date.today(), end_date=date.today(),
+                capacity=options["capacity"], schedule="", location="",
+            )
+            User.objects.bulk_create(
+                User(username=f"stress_{i}") for i in range(options["users"])
+            )
+            user_ids = list(User.objects.values_list("id", flat=True))
+
+            report = registration_stress(module.id, user_ids, threads=options["threads"])
+            module.refresh_from_db()
+            enrollments = Enrollment.objects.filter(module=module).count()
+            report.update({
+                "capacity": module.capacity,
+                "enrolled_counter": module.enrolled,
+                "enrollment_rows": enrollments,
+                "overbooked": max(0, enrollments - module.capacity),
+                "counter_drift": module.enrolled - enrollments,
+            })
+
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,102 @@
+import itertools
+import json
+import random
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.benchmarks import isolated_database, percentiles
+from accounts.models import Course, Instructor, Module
+from accounts.search import is_available, parse_search_request, rebuild_index, search
+
+SYLLABLES = ("al", "bo", "cen", "dra", "eth", "fu", "gor", "hin", "ix", "jo", "ka", "lum", "mer", "nov", "or", "pla")
+
+
+def vocabulary(rng, size):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def sentence(rng, words, weights, length):
+    return " ".join(rng.choices(words, cum_weights=weights, k=length))
+
+
+class Command(BaseCommand):
+    help = (
+        "Index --modules synthetic modules in a scratch database and report "
+        "/api/search/ query latency for common, rare, prefix and multi-word queries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modules", type=int, default=100_000)
+        parser.add_argument("--modules-per-course", type=int, default=50)
+        parser.add_argument("--queries", type=int, default=300)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        words = vocabulary(rng, 5000)
+        # Zipf's law: a few words are everywhere, most are rare
+        weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+        per_course = options["modules_per_course"]
+        courses = max(1, options["modules"] // per_course)
+
+        with isolated_database():
+            if not is_available():
+                raise CommandError("Search needs SQLite (FTS5) or PostgreSQL.")
+            instructor = Instructor.objects.create(first_name="Bench", last_name="Mark", about="")
+            Course.objects.bulk_create(
+                Course(
+                    code=f"B{i:06d}"[:8], title=sentence(rng, words, weights, 3)[:35],
+                    description=sentence(rng, words, weights, 20)[:255], credits=5, module_count=per_course,
+                )
+                for i in range(courses)
+            )
+            course_ids = list(Course.objects.values_list("id", flat=True))
+            today = date.today()
+            for offset in range(0, options["modules"], 5000):
+                Module.objects.bulk_create(
+                    Module(
+                        course_id=course_ids[i // per_course % len(course_ids)], code=f"M{i:07d}",
+                        title=sentence(rng, words, weights, 4), description=sentence(rng, words, weights, 40),
+                        instructor=instructor, start_date=today, end_date=today,
+                        capacity=30, schedule="", location="",
+                    )
+                    for i in range(offset, min(options["modules"], offset + 5000))
+                )
+            started = time.perf_counter()
+            documents = rebuild_index()
+            indexed = time.perf_counter() - started
+
+            query_sets = {
+                "common_word": lambda: words[0],
+                "rare_word": lambda: rng.choice(words[1000:]),
+                "prefix": lambda: rng.choice(words)[:3],
+                "two_words": lambda: f"{rng.choice(words[:50])} {rng.choice(words[:500])}",
+                "deep_page": lambda: words[1],
+            }
+            # Keyset cursor of the page starting at the 1000th match of deep_page
+            deep_cursor = None
+            for _ in range(10):
+                page = search(parse_search_request({"q": words[1], "limit": "100", "cursor": deep_cursor}))
+                deep_cursor = page["next_cursor"]
+                if deep_cursor is None:
+                    break
+
+            report = {"documents": documents, "index_seconds": round(indexed, 2), "latency_ms": {}}
+            for name, make_query in query_sets.items():
+                samples = []
+                for _ in range(options["queries"]):
+                    params = {"q": make_query(), "limit": "20"}
+                    if name == "deep_page":
+                        params["cursor"] = deep_cursor
+                    query = parse_search_request(params)
+                    started = time.perf_counter()
+                    search(query)
+                    samples.append(time.perf_counter() - started)
+                report["latency_ms"][name] = percentiles(samples)
+
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,88 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from accounts.benchmarks import isolated_database, mixed_workload, seed_catalog
+from accounts.models import Module
+from django.contrib.auth.models import User
+
+# profile -> connection OPTIONS
+PROFILES = {
+    "default": {},
+    "tuned": settings.SQLITE_TUNED_OPTIONS,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the same mixed read/write workload (module details and "
+        "enrollments read, registrations written) from many threads against "
+        "a scratch SQLite file with the default connection settings and with "
+        "the SQLITE_TUNED profile, and report throughput, latency and "
+        "'database is locked' errors as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modules", type=int, default=200)
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--enrollments", type=int, default=4000)
+        parser.add_argument("--operations", type=int, default=4000)
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--read-ratio", type=float, default=0.8)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--profiles", default=",".join(PROFILES),
+            help="Comma-separated subset of: " + ", ".join(PROFILES),
+        )
+
+    def handle(self, *args, **options):
+        connection = connections["default"]
+        if connection.vendor != "sqlite":
+            raise CommandError("bench_sqlite compares SQLite settings; the default database is not SQLite.")
+        if not 0 <= options["read_ratio"] <= 1:
+            raise CommandError("--read-ratio must be between 0 and 1.")
+        profiles = options["profiles"].split(",")
+        for profile in profiles:
+            if profile not in PROFILES:
+                raise CommandError(f"Unknown profile {profile!r}")
+
+        report = {"threads": options["threads"], "read_ratio": options["read_ratio"]}
+        saved_options = connection.settings_dict.get("OPTIONS", {})
+        try:
+            for profile in profiles:
+                connections.close_all()
+                # Thread connections are built from this same settings dict
+                connection.settings_dict["OPTIONS"] = dict(PROFILES[profile])
+                with isolated_database():
+                    report["seeded"] = seed_catalog(
+                        courses=max(1, options["modules"] // 5),
+                        modules=options["modules"],
+                        instructors=max(1, options["modules"] // 4),
+                        users=options["users"],
+                        enrollments=options["enrollments"],
+                        seed=options["seed"],
+                    )
+                    with connection.cursor() as cursor:
+                        cursor.execute("PRAGMA journal_mode")
+                        journal_mode = cursor.fetchone()[0]
+                    # The threads keep their connection for the whole run,
+                    # as CONN_MAX_AGE would between requests
+                    result = mixed_workload(
+                        list(User.objects.values_list("id", flat=True)),
+                        list(Module.objects.values_list("id", flat=True)),
+                        options["operations"],
+                        threads=options["threads"],
+                        read_ratio=options["read_ratio"],
+                        seed=options["seed"],
+                    )
+                report[profile] = {"journal_mode": journal_mode, **result}
+        finally:
+            connections.close_all()
+            connection.settings_dict["OPTIONS"] = saved_options
+
+        if "default" in report and "tuned" in report:
+            before, after = report["default"]["operations_per_second"], report["tuned"]["operations_per_second"]
+            report["speedup"] = round(after / before, 2) if before else None
+        self.stdout.write(json.dumps(report, indent=2))
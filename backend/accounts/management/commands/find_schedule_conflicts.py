@@ -0,0 +1,28 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.conflicts import find_conflicts
+
+
+class Command(BaseCommand):
+    help = (
+        "Report every room and instructor double booking across all modules' "
+        "time slots, as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--kind", choices=("location", "instructor"), action="append",
+            help="Only check this kind of conflict (repeatable). Default: both.",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        conflicts = find_conflicts(options["kind"] or ("location", "instructor"))
+        self.stdout.write(json.dumps({
+            "conflicts": len(conflicts),
+            "seconds": round(time.perf_counter() - started, 3),
+            "details": conflicts,
+        }, indent=2))
@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.importer import DEFAULT_BATCH_SIZE, FORMATS, CatalogImportError, detect_format, import_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update instructors, courses and modules from CSV or JSONL "
+        "files, in one transaction. See accounts/importer.py for the columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--instructors", metavar="FILE")
+        parser.add_argument("--courses", metavar="FILE")
+        parser.add_argument("--modules", metavar="FILE")
+        parser.add_argument(
+            "--format", choices=FORMATS,
+            help="File format; by default taken from each file's extension.",
+        )
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        paths = {kind: options[kind] for kind in ("instructors", "courses", "modules") if options[kind]}
+        if not paths:
+            raise CommandError("Give at least one of --instructors, --courses or --modules.")
+
+        files = {}
+        try:
+            for kind, path in paths.items():
+                format = options["format"] or detect_format(path)
+                # newline="" lets the csv module handle quoted line breaks
+                files[kind] = (open(path, encoding="utf-8-sig", newline=""), format)
+            stats = import_catalog(files, batch_size=options["batch_size"])
+        except CatalogImportError as e:
+            raise CommandError("\n".join(["Nothing was imported:", *e.errors]))
+        except OSError as e:
+            raise CommandError(str(e))
+        finally:
+            for file, _ in files.values():
+                file.close()
+        self.stdout.write(json.dumps(stats, indent=2))
@@ -0,0 +1,24 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.search import SearchUnavailable, rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the course/module search index from scratch. Run it after "
+        "bulk writes that bypass model signals."
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            documents = rebuild_index()
+        except SearchUnavailable:
+            raise CommandError("Search is only available on SQLite (FTS5) and PostgreSQL.")
+        self.stdout.write(json.dumps({
+            "documents": documents,
+            "seconds": round(time.perf_counter() - started, 3),
+        }))
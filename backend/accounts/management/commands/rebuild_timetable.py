@@ -0,0 +1,25 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.timetable import rebuild_time_slots
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-parse every Module.schedule into time slots, rebuild every "
+        "student's booked slots and refresh the normalised room of every module. "
+        "Run it after bulk writes that bypass model signals."
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        with transaction.atomic():
+            slots, bookings = rebuild_time_slots()
+        self.stdout.write(json.dumps({
+            "time_slots": slots,
+            "booked_slots": bookings,
+            "seconds": round(time.perf_counter() - started, 3),
+        }))
@@ -0,0 +1,39 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from accounts.enrollment import reconcile_enrollment_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Module.enrolled from the Enrollment rows and fix modules "
+        "whose counter has drifted. With --interval, keep running periodically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report the drift without fixing it."
+        )
+        parser.add_argument(
+            "--interval", type=float, default=0,
+            help="Seconds between runs. 0 (the default) runs once and exits.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            drifted = reconcile_enrollment_counts(dry_run=options["dry_run"])
+            self.stdout.write(json.dumps({
+                "drifted_modules": len(drifted),
+                "total_drift": sum(abs(row["counter"] - row["actual"]) for row in drifted),
+                "fixed": not options["dry_run"],
+                "seconds": round(time.perf_counter() - started, 3),
+                "modules": drifted,
+            }))
+            if not options["interval"]:
+                return
+            close_old_connections()
+            time.sleep(options["interval"])
@@ -0,0 +1,45 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.benchmarks import SEED_SCHEDULES, seed_catalog
+from accounts.models import Course, Module
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill an empty database with a deterministic synthetic catalog, "
+        "students and enrollments (same --seed, same data). Students log in "
+        "as student<n>@example.com with the password 'password'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, default=10_000)
+        parser.add_argument("--modules", type=int, default=100_000)
+        parser.add_argument("--instructors", type=int, default=5_000)
+        parser.add_argument("--users", type=int, default=250_000)
+        parser.add_argument("--enrollments", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if Course.objects.exists() or Module.objects.exists():
+            raise CommandError("The catalog is not empty; seed a fresh database.")
+        if options["enrollments"] > options["users"] * len(SEED_SCHEDULES):
+            raise CommandError(
+                f"A student takes at most {len(SEED_SCHEDULES)} modules; add --users or lower --enrollments."
+            )
+
+        started = time.perf_counter()
+        counts = seed_catalog(
+            courses=options["courses"],
+            modules=options["modules"],
+            instructors=options["instructors"],
+            users=options["users"],
+            enrollments=options["enrollments"],
+            batch_size=options["batch_size"],
+            seed=options["seed"],
+        )
+        counts["seconds"] = round(time.perf_counter() - started, 1)
+        self.stdout.write(json.dumps(counts, indent=2))
@@ -0,0 +1,169 @@
+"""Per-request database instrumentation.
+
+``QueryStatsMiddleware`` counts, for each request, the statements run, the time spent in them and how often each distinct
+statement was repeated.  Statements are fingerprinted by their SQL with
+the parameters left out, so a view loading one row per item of a list
+(an N+1) shows up as the same fingerprint many times.
+
+The numbers are sent back in a ``Server-Timing`` header, which browser
+dev tools display next to the request::
+
+    Server-Timing: db;dur=4.21;desc="7 queries", app;dur=11.80
+
+and logged as one line on the ``accounts.queries`` logger, with the
+same values in the record's ``extra`` for structured log handlers.  The
+line is a warning when the view ran more than its query budget
+(``QUERY_BUDGET``, or its URL name's entry in ``QUERY_BUDGETS``) or
+repeated a statement ``QUERY_REPEAT_THRESHOLD`` times or more.
+
+Every connection carries one permanent execute wrapper, ``record``,
+which hands each statement to the ``QueryStats`` of the request being
+served, found through a contextvar.  Under ASGI a view's queries run on
+a thread-pool connection, not on the connections the middleware sees on
+the event loop; the contextvar travels with ``sync_to_async`` where a
+per-request ``connection.execute_wrapper`` would not.  The wrapper is a
+counter increment and two clock reads per query, cheap enough to leave
+on in production.  Queries run while a streaming
+response is being consumed happen after the middleware has returned
+and are not counted.
+"""
+import contextvars
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger("accounts.queries")
+
+
+def query_budget(url_name):
+    budgets = getattr(settings, "QUERY_BUDGETS", {})
+    return budgets.get(url_name, getattr(settings, "QUERY_BUDGET", 20))
+
+
+def repeat_threshold():
+    return getattr(settings, "QUERY_REPEAT_THRESHOLD", 5)
+
+
+class QueryStats:
+    """``execute_wrapper`` counting statements and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[sql] = self.fingerprints.get(sql, 0) + 1
+
+    def repeated(self, threshold):
+        """``[(sql, times), ...]`` for statements run at least ``threshold`` times, most first."""
+        return sorted(
+            ((sql, times) for sql, times in self.fingerprints.items() if times >= threshold),
+            key=lambda item: -item[1],
+        )
+
+
+_request_stats = contextvars.ContextVar("request_stats", default=None)
+
+
+def record(execute, sql, params, many, context):
+    """Execute wrapper passing statements to the current request's ``QueryStats``."""
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install(sender=None, connection=None, **kwargs):
+    if record not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record)
+
+
+@sync_and_async_middleware
+class QueryStatsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.header = getattr(settings, "SERVER_TIMING_HEADER", True)
+        # Connections opened before this module was imported
+        for connection in connections.all(initialized_only=True):
+            install(connection=connection)
+        # Under ASGI, stay on the event loop instead of costing every
+        # request a hop to the thread pool
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = QueryStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        return self.finish(request, response, stats, time.perf_counter() - started)
+
+    def finish(self, request, response, stats, elapsed):
+        if self.header:
+            response.headers["Server-Timing"] = (
+                f'db;dur={stats.seconds * 1000:.2f};desc="{stats.count} queries", '
+                f"app;dur={elapsed * 1000:.2f}"
+            )
+        self.log(request, response, stats, elapsed)
+        return response
+
+    def log(self, request, response, stats, elapsed):
+        match = request.resolver_match
+        view = match.view_name if match else None
+        budget = query_budget(match.url_name if match else None)
+        repeated = stats.repeated(repeat_threshold())
+        over_budget = stats.count > budget
+        level = logging.WARNING if over_budget or repeated else logging.INFO
+        if not logger.isEnabledFor(level):
+            return
+
+        extra = {
+            "method": request.method,
+            "path": request.path,
+            "view": view,
+            "status": response.status_code,
+            "queries": stats.count,
+            "query_budget": budget,
+            "db_ms": round(stats.seconds * 1000, 2),
+            "total_ms": round(elapsed * 1000, 2),
+            "repeated_queries": [{"sql": sql, "times": times} for sql, times in repeated],
+        }
+        message = (
+            "%(method)s %(path)s view=%(view)s status=%(status)s queries=%(queries)s "
+            "db_ms=%(db_ms)s total_ms=%(total_ms)s"
+        ) % extra
+        if over_budget:
+            message += f" over_budget={budget}"
+        if repeated:
+            message += f" repeated={len(repeated)} worst={repeated[0][1]}x {repeated[0][0][:200]!r}"
+        logger.log(level, message, extra=extra)
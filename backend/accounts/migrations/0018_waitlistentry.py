@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_enrollment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WaitlistEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('joined_at', models.DateTimeField(auto_now_add=True)),
+                ('module', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waitlist', to='accounts.module')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('module', 'position'), ('user', 'module')},
+            },
+        ),
+    ]
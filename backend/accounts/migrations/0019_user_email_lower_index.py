@@ -0,0 +1,30 @@
+from django.db import migrations
+
+INDEX_NAME = "accounts_user_email_lower"
+
+
+def create_index(apps, schema_editor):
+    table = schema_editor.quote_name("auth_user")
+    # MySQL needs the extra parentheses around a functional key part
+    expression = "((LOWER(email)))" if schema_editor.connection.vendor == "mysql" else "(LOWER(email))"
+    schema_editor.execute(f"CREATE INDEX {INDEX_NAME} ON {table} {expression}")
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == "mysql":
+        schema_editor.execute(f"DROP INDEX {INDEX_NAME} ON {schema_editor.quote_name('auth_user')}")
+    else:
+        schema_editor.execute(f"DROP INDEX {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+    """Index ``auth_user`` on ``LOWER(email)`` for ``accounts.backends.EmailBackend``."""
+
+    dependencies = [
+        ('accounts', '0018_waitlistentry'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
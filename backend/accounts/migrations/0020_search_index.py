@@ -0,0 +1,63 @@
+from django.db import migrations
+
+# Kept in sync with accounts.search; see the docstring there.
+SQLITE_TABLE = """
+CREATE VIRTUAL TABLE accounts_search USING fts5(
+    kind UNINDEXED, object_id UNINDEXED, course_id UNINDEXED,
+    code, title, description,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3 4 5'
+)
+"""
+
+POSTGRESQL_TABLE = """
+CREATE TABLE accounts_search (
+    id bigint PRIMARY KEY,
+    kind varchar(6) NOT NULL,
+    object_id integer NOT NULL,
+    course_id integer NOT NULL,
+    code text NOT NULL,
+    title text NOT NULL,
+    description text NOT NULL,
+    document tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', code), 'A')
+        || setweight(to_tsvector('simple', title), 'B')
+        || setweight(to_tsvector('simple', description), 'C')
+    ) STORED
+);
+CREATE INDEX accounts_search_document ON accounts_search USING GIN (document);
+"""
+
+POPULATE = """
+INSERT INTO accounts_search ({doc_id}, kind, object_id, course_id, code, title, description)
+SELECT id * 2, 'course', id, id, code, title, description FROM accounts_course
+UNION ALL
+SELECT id * 2 + 1, 'module', id, course_id, code, title, description FROM accounts_module
+"""
+
+
+def create_search_table(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        schema_editor.execute(SQLITE_TABLE)
+        schema_editor.execute(POPULATE.format(doc_id="rowid"))
+    elif vendor == "postgresql":
+        schema_editor.execute(POSTGRESQL_TABLE)
+        schema_editor.execute(POPULATE.format(doc_id="id"))
+    # Other databases have no search index; /api/search/ answers 501
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor in ("sqlite", "postgresql"):
+        schema_editor.execute("DROP TABLE accounts_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0019_user_email_lower_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
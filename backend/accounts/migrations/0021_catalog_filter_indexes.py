@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_search_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='course',
+            name='credits',
+            field=models.IntegerField(db_index=True, max_length=2),
+        ),
+        migrations.AlterField(
+            model_name='course',
+            name='department',
+            field=models.CharField(choices=[('computer_science', 'Computer Science'), ('math', 'Maths'), ('natural science', 'Natural Science')], db_index=True, default='Computer Science', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='module',
+            name='end_date',
+            field=models.DateField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='module',
+            name='start_date',
+            field=models.DateField(db_index=True),
+        ),
+    ]
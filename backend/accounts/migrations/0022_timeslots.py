@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from accounts.timetable import MINUTES_PER_DAY, ScheduleError, parse_schedule
+
+
+def parse_existing_schedules(apps, schema_editor):
+    Module = apps.get_model('accounts', 'Module')
+    TimeSlot = apps.get_model('accounts', 'TimeSlot')
+    Enrollment = apps.get_model('accounts', 'Enrollment')
+    BookedSlot = apps.get_model('accounts', 'BookedSlot')
+
+    slots = {}
+    for module in Module.objects.only('id', 'schedule', 'start_date', 'end_date').iterator():
+        try:
+            slots[module.id] = (module, parse_schedule(module.schedule))
+        except ScheduleError:
+            continue
+    TimeSlot.objects.bulk_create(
+        (TimeSlot(module_id=module_id, weekday=day, start_minute=start, end_minute=end)
+         for module_id, (_, parsed) in slots.items() for day, start, end in parsed),
+        batch_size=1000,
+    )
+    BookedSlot.objects.bulk_create(
+        (BookedSlot(
+            enrollment_id=enrollment_id, user_id=user_id, module_id=module_id,
+            start=day * MINUTES_PER_DAY + start, end=day * MINUTES_PER_DAY + end,
+            start_date=slots[module_id][0].start_date, end_date=slots[module_id][0].end_date,
+        )
+         for enrollment_id, user_id, module_id in Enrollment.objects.values_list('id', 'user_id', 'module_id').iterator()
+         if module_id in slots
+         for day, start, end in slots[module_id][1]),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0021_catalog_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookedSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.PositiveIntegerField()),
+                ('end', models.PositiveIntegerField()),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('enrollment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booked_slots', to='accounts.enrollment')),
+                ('module', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='accounts.module')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'start'], name='accounts_bo_user_id_6093b5_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TimeSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField()),
+                ('start_minute', models.PositiveSmallIntegerField()),
+                ('end_minute', models.PositiveSmallIntegerField()),
+                ('module', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='time_slots', to='accounts.module')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['weekday', 'start_minute'], name='accounts_ti_weekday_bb72e8_idx')],
+            },
+        ),
+        migrations.RunPython(parse_existing_schedules, migrations.RunPython.noop),
+    ]
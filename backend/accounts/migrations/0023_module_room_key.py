@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:42
+
+from django.db import migrations, models
+
+from accounts.models import room_key
+
+
+def fill_room_keys(apps, schema_editor):
+    Module = apps.get_model('accounts', 'Module')
+    modules = []
+    for module in Module.objects.only('id', 'location').iterator():
+        module.room_key = room_key(module.location)
+        modules.append(module)
+    Module.objects.bulk_update(modules, ['room_key'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_timeslots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='module',
+            name='room_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(fill_room_keys, migrations.RunPython.noop),
+    ]
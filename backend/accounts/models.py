@@ -1,3 +1,4 @@
+from django.core.exceptions import ValidationError
 from django.db import models
 from decimal import Decimal
 from django.contrib.auth.models import User
@@ -158,14 +159,24 @@ class Course(models.Model):
     title = models.CharField(max_length=35)
     code = models.CharField(max_length=8, unique=True)
     description = models.CharField(max_length=255)
-    department = models.CharField(max_length=20, choices=DEPARTMENTS, default='Computer Science')
-    credits = models.IntegerField(max_length=2)
+    department = models.CharField(max_length=20, choices=DEPARTMENTS, default='Computer Science', db_index=True)
+    credits = models.IntegerField(max_length=2, db_index=True)
     image = models.ImageField(upload_to="test", null=True, blank=True)  # Используем ImageField
     module_count = models.PositiveIntegerField()
 
     def __str__(self):
         return f"{self.code}: {self.title}"
 
+# Locations several modules can use at once
+SHARED_LOCATIONS = {"", "tba", "online", "remote"}
+
+
+def room_key(location):
+    """``location`` with its whitespace collapsed and case folded; ``""`` for a shared location."""
+    key = " ".join((location or "").split()).casefold()
+    return "" if key in SHARED_LOCATIONS else key
+
+
 class Module(models.Model):
     id = models.AutoField(primary_key=True)
     course = models.ForeignKey('Course', related_name='modules', on_delete=models.CASCADE)  # Link back to course
@@ -174,15 +185,43 @@ class Module(models.Model):
     title = models.CharField(max_length=255)
     description = models.TextField()
     instructor = models.ForeignKey('Instructor', related_name='modules', on_delete=models.CASCADE)
-    start_date = models.DateField()
-    end_date = models.DateField()
+    start_date = models.DateField(db_index=True)
+    end_date = models.DateField(db_index=True)
     capacity = models.PositiveIntegerField()
     enrolled = models.PositiveIntegerField(default=0)
     schedule = models.CharField(max_length=255)
     location = models.CharField(max_length=255)
+    # room_key(location), kept up to date by save(); rooms are matched on it
+    room_key = models.CharField(max_length=255, blank=True, default='', db_index=True, editable=False)
 
     def __str__(self):
         return f"{self.code}: {self.title}"
+
+    def save(self, *args, **kwargs):
+        self.room_key = room_key(self.location)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'location' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'room_key'}
+        super().save(*args, **kwargs)
+
+    def clean(self):
+        # Imported here: both modules import this one
+        from .conflicts import module_conflicts
+        from .timetable import ScheduleError, parse_schedule
+
+        try:
+            slots = parse_schedule(self.schedule)
+        except ScheduleError as e:
+            raise ValidationError({'schedule': str(e)})
+        if self.start_date and self.end_date and self.instructor_id:
+            conflicts = module_conflicts(self, slots)
+            if conflicts:
+                raise ValidationError([
+                    f"{c['day']} {c['start']}-{c['end']}: "
+                    f"{'room ' + c['location'] if c['kind'] == 'location' else c['instructor']['name']}"
+                    f" is already booked for {c['modules'][0]['code']}"
+                    for c in conflicts
+                ])
     
 class Instructor(models.Model):
     DEPARTMENTS = [
@@ -207,6 +246,57 @@ class Enrollment(models.Model):
     class Meta:
         unique_together = ('user', 'module')  # Prevent duplicate enrollments
 
+class WaitlistEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    module = models.ForeignKey(Module, related_name='waitlist', on_delete=models.CASCADE)
+    # Increasing ticket number within the module; the head of the queue is
+    # the lowest position still present, so positions may have gaps.
+    position = models.PositiveIntegerField()
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = [
+            ('user', 'module'),  # One place in the queue per student
+            ('module', 'position'),  # Also the index for head/tail/rank lookups
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} waiting for {self.module_id} (#{self.position})"
+
+class TimeSlot(models.Model):
+    """One weekly meeting of a module, parsed from ``Module.schedule``."""
+    module = models.ForeignKey(Module, related_name='time_slots', on_delete=models.CASCADE)
+    weekday = models.PositiveSmallIntegerField()  # 0 = Monday
+    start_minute = models.PositiveSmallIntegerField()  # Minutes since midnight
+    end_minute = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['weekday', 'start_minute'])]
+
+    def __str__(self):
+        return f"{self.module_id}: day {self.weekday} {self.start_minute}-{self.end_minute}"
+
+class BookedSlot(models.Model):
+    """A time slot of one of a user's enrollments: the per-user interval index.
+
+    ``start``/``end`` are minutes since Monday 00:00 and the dates are
+    copied from the module, so a clash check is a range lookup on
+    ``(user, start)`` with no joins.
+    """
+    enrollment = models.ForeignKey(Enrollment, related_name='booked_slots', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    module = models.ForeignKey(Module, on_delete=models.CASCADE)
+    start = models.PositiveIntegerField()
+    end = models.PositiveIntegerField()
+    start_date = models.DateField()
+    end_date = models.DateField()
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'start'])]
+
+    def __str__(self):
+        return f"{self.user_id} in {self.module_id}: {self.start}-{self.end}"
+
 # class Enrollments(models.Model):
 #     student_id = models.IntegerField()
 #     instructor_id = models.IntegerField()
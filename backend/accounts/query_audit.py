@@ -0,0 +1,244 @@
+"""Query-plan audit of the ``/api/`` endpoints.
+
+``audit_routes`` calls every route in ``accounts.urls`` through the test
+client, records each SQL statement the request runs (with its
+parameters, through ``connection.execute_wrapper``) and asks the
+database for its plan: ``EXPLAIN QUERY PLAN`` on SQLite, ``EXPLAIN`` on
+PostgreSQL.  Full scans of the tables that grow with the number of
+students (``WATCHED_TABLES``) are flagged; those are the statements that
+get slower with every term's enrollments.
+
+Which requests to send for each route is spelled out in
+``route_calls``; a route added to ``accounts.urls`` without an entry
+there is reported as not exercised rather than skipped silently.  The
+endpoint benchmark (``bench_endpoints``) drives the same calls.
+"""
+import json
+import re
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import F
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from .cache import invalidate_catalog
+from .models import Course, Enrollment, Module
+from .timetable import find_clash
+from .urls import urlpatterns
+from .views import get_tokens_for_user
+
+WATCHED_TABLES = ("accounts_enrollment", "accounts_module", "auth_user")
+
+# Transaction control and PRAGMAs have no plan
+_SKIPPED_STATEMENTS = re.compile(r"^\s*(SAVEPOINT|RELEASE|ROLLBACK|BEGIN|COMMIT|PRAGMA|SET)\b", re.IGNORECASE)
+
+_SCAN_PATTERNS = {
+    # "SCAN accounts_module" / "SCAN accounts_module USING COVERING INDEX ..."
+    "sqlite": re.compile(r"\bSCAN (?:TABLE )?(?P<table>\w+)"),
+    "postgresql": re.compile(r"\bSeq Scan on (?P<table>\w+)"),
+}
+
+
+def explain(sql, params):
+    """The plan of one statement as a list of text lines."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute("EXPLAIN " + sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def scanned_tables(plan, tables=WATCHED_TABLES):
+    """Tables from ``tables`` that ``plan`` reads in full."""
+    pattern = _SCAN_PATTERNS.get(connection.vendor)
+    if pattern is None:
+        return []
+    found = []
+    for line in plan:
+        match = pattern.search(line)
+        if match and match["table"] in tables and match["table"] not in found:
+            found.append(match["table"])
+    return found
+
+
+class QueryRecorder:
+    """``execute_wrapper`` keeping every statement with its parameters."""
+
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and not _SKIPPED_STATEMENTS.match(sql):
+            self.statements.append((sql, tuple(params or ())))
+        return execute(sql, params, many, context)
+
+
+def route_fixtures():
+    """Users and catalog rows the calls need, taken from the seeded data."""
+    student = User.objects.filter(is_superuser=False).exclude(enrollment=None).order_by("id").first()
+    enrollment = Enrollment.objects.filter(user=student).order_by("id").first()
+    enrolled = set(Enrollment.objects.filter(user=student).values_list("module_id", flat=True))
+    # A module with seats whose schedule fits, so registering succeeds
+    free = next(
+        (
+            module for module in Module.objects.exclude(id__in=enrolled).order_by("id")
+            if module.enrolled < module.capacity
+            and find_clash(student.id, module.id) is None
+        ),
+        None,
+    )
+    # A full module to queue for
+    full = Module.objects.exclude(id__in=enrolled).exclude(id=getattr(free, "id", None)).order_by("id").first()
+    Module.objects.filter(id=full.id).update(capacity=F("enrolled"))
+    admin = User.objects.filter(is_superuser=True).first() or User.objects.create_superuser(
+        "audit-admin", "audit-admin@example.com", "password"
+    )
+    return {
+        "student": student,
+        "admin": admin,
+        "course": Course.objects.order_by("id").first(),
+        "module": enrollment.module,
+        "free_module": free or enrollment.module,
+        "full_module": full,
+    }
+
+
+def route_calls(fx, tokens, round=0):
+    """Route pattern -> list of ``(method, path, payload, headers, as_admin)``.
+
+    The calls of one round leave the data as they found it (registering
+    is followed by unregistering, joining a waitlist by leaving it),
+    except signup, which uses a new address each ``round``.
+    """
+    student, module, free, full = fx["student"], fx["module"], fx["free_module"], fx["full_module"]
+    bearer = {"HTTP_AUTHORIZATION": f"Bearer {tokens['access']}"}
+    user_id = {"userId": student.id}
+    return {
+        "login/": [("post", "login/", {"email": student.email, "password": "password"}, {}, False)],
+        "signup/": [("post", "signup/", {"email": f"audit-signup-{round}@example.com", "password": "password"}, {}, False)],
+        "user-details/": [("get", "user-details/", None, bearer, False)],
+        "user-details/<str:username>/": [
+            ("put", f"user-details/{student.username}/", {"firstName": student.first_name}, bearer, False),
+        ],
+        "api/token/": [("post", "api/token/", {"username": student.username, "password": "password"}, {}, False)],
+        "api/token/refresh/": [("post", "api/token/refresh/", {"refresh": tokens["refresh"]}, {}, False)],
+        "courses/": [
+            ("get", "courses/", None, {}, False),
+            ("get", "courses/?limit=24&fields=id,code,title,module_count", None, {}, False),
+        ],
+        "courses/<str:course_id>/": [("get", f"courses/{fx['course'].id}/", None, {}, False)],
+        "modules/": [
+            ("get", "modules/?limit=24", None, {}, False),
+            ("get", "modules/?department=math&has_seats=true&limit=24", None, {}, False),
+        ],
+        "modules/<str:module_id>/": [("get", f"modules/{module.id}/", None, {}, False)],
+        "modules/<str:module_id>/register/": [("post", f"modules/{free.id}/register/", user_id, {}, False)],
+        # Leaving a module or a waitlist acts on the signed-in student
+        "modules/<str:module_id>/unregister/": [("post", f"modules/{free.id}/unregister/", None, bearer, False)],
+        "modules/<str:module_id>/waitlist/": [
+            ("post", f"modules/{full.id}/waitlist/", user_id, {}, False),
+            ("get", f"modules/{full.id}/waitlist/?userId={student.id}", None, {}, False),
+            ("delete", f"modules/{full.id}/waitlist/", None, bearer, False),
+        ],
+        "modules/<str:module_id>/roster.<str:file_format>": [
+            ("get", f"modules/{module.id}/roster.csv", None, {}, True),
+        ],
+        "courses/<str:course_id>/roster.<str:file_format>": [
+            ("get", f"courses/{fx['course'].id}/roster.jsonl", None, {}, True),
+        ],
+        "rosters.<str:file_format>": [
+            ("get", f"rosters.csv?date_from={module.start_date}&date_to={module.end_date}", None, {}, True),
+        ],
+        "instructors/": [("get", "instructors/", None, {}, False)],
+        "my_enrollments/": [("post", "my_enrollments/", user_id, {}, False)],
+        "my_timetable/": [("post", "my_timetable/", user_id, {}, False)],
+        "enrollments/bulk/": [
+            ("post", "enrollments/bulk/", {"enrollments": [{"userId": student.id, "moduleId": module.id}]}, {}, True),
+        ],
+        "search/": [("get", "search/?q=data", None, {}, False)],
+        "catalog/cache-stats/": [("get", "catalog/cache-stats/", None, {}, True)],
+        "async/courses/": [("get", "async/courses/", None, {}, False)],
+        "async/courses/<str:course_id>/": [("get", f"async/courses/{fx['course'].id}/", None, {}, False)],
+        "async/modules/<str:module_id>/": [("get", f"async/modules/{module.id}/", None, {}, False)],
+        "async/instructors/": [("get", "async/instructors/", None, {}, False)],
+    }
+
+
+def api_prefix():
+    return reverse("get-courses")[: -len("courses/")]
+
+
+def client_settings():
+    """Settings the test client needs to reach the API from a management command."""
+    return override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"])
+
+
+def send(client, method, path, payload, headers):
+    """Send one call from ``route_calls``; ``path`` is relative to the API prefix."""
+    path = api_prefix() + path
+    if payload is None:
+        response = getattr(client, method)(path, **headers)
+    else:
+        response = getattr(client, method)(path, data=json.dumps(payload), content_type="application/json", **headers)
+    if response.streaming:
+        # Streamed bodies run their queries as they are read; keep the
+        # body readable for the caller
+        response.streaming_content = [response.getvalue()]
+    return response
+
+
+def audit_routes(tables=WATCHED_TABLES):
+    """Exercise every route and explain its statements.
+
+    Returns ``{"routes": [...], "not_exercised": [...]}``; each route lists
+    its calls with their status, statement count and the statements that
+    scan one of ``tables``.  Writes to the current database, so run it
+    against seeded scratch data.
+    """
+    fx = route_fixtures()
+    calls = route_calls(fx, get_tokens_for_user(fx["student"]))
+    report = {"routes": [], "not_exercised": []}
+    with client_settings():
+        for pattern in urlpatterns:
+            route = str(pattern.pattern)
+            if route not in calls:
+                report["not_exercised"].append(route)
+                continue
+            for method, path, payload, headers, as_admin in calls[route]:
+                client = Client()
+                if as_admin:
+                    client.force_login(fx["admin"])
+                # Cached catalog responses would hide the queries behind them
+                invalidate_catalog()
+                recorder = QueryRecorder()
+                with connection.execute_wrapper(recorder):
+                    response = send(client, method, path, payload, headers)
+                report["routes"].append({
+                    "route": route,
+                    "method": method.upper(),
+                    "path": api_prefix() + path,
+                    "status": response.status_code,
+                    "queries": len(recorder.statements),
+                    "scans": _explain_all(recorder.statements, tables),
+                })
+    return report
+
+
+def _explain_all(statements, tables):
+    findings, seen = [], set()
+    for sql, params in statements:
+        if sql in seen:
+            continue
+        seen.add(sql)
+        try:
+            plan = explain(sql, params)
+        except Exception as e:  # e.g. a statement the backend cannot explain
+            findings.append({"sql": sql, "error": str(e)})
+            continue
+        scanned = scanned_tables(plan, tables)
+        if scanned:
+            findings.append({"sql": sql, "tables": scanned, "plan": plan})
+    return findings
@@ -0,0 +1,69 @@
+"""Fast JSON encoding shared by the plain Django views and DRF.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise.  Both paths serialize dates, datetimes, UUIDs and Decimals
+themselves, so views can hand over model values as they come out of
+the database instead of converting them in Python loops.  Decimals are
+written as strings in both cases, matching Django's JSON encoder.
+"""
+import json
+from decimal import Decimal
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+_encoder = DjangoJSONEncoder(separators=(",", ":"))
+
+
+def _orjson_default(obj):
+    if isinstance(obj, Decimal):
+        return str(obj)
+    # Lazy translation strings, durations, ...
+    return _encoder.default(obj)
+
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+    def dumps(data):
+        """Encode ``data`` to JSON bytes."""
+        return orjson.dumps(data, default=_orjson_default, option=ORJSON_OPTIONS)
+
+    loads = orjson.loads
+else:
+    def dumps(data):
+        """Encode ``data`` to JSON bytes."""
+        return _encoder.encode(data).encode()
+
+    loads = json.loads
+
+
+class FastJsonResponse(HttpResponse):
+    """Drop-in replacement for ``JsonResponse`` that encodes with ``dumps``."""
+
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the "
+                "safe parameter to False."
+            )
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=dumps(data), **kwargs)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """DRF renderer using ``dumps``; indented output still goes through DRF."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type or "", renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
@@ -0,0 +1,138 @@
+"""Send catalog reads to read replicas and everything else to the primary.
+
+``CatalogReplicaRouter`` routes reads of ``Course``, ``Module`` and
+``Instructor`` made while serving a request to one of the aliases in
+``DATABASE_REPLICAS``; every write, and every read of any other model,
+goes to the primary (``default``).  ``ReplicaPinningMiddleware`` picks
+the replica once per request, so all of a request's reads come from one
+snapshot, however far each replica lags.  With no replicas configured
+the router changes nothing.
+
+Replicas lag behind the primary, so reads fall back to the primary when
+staleness would show:
+
+* outside the request cycle: management commands, the shell and
+  background work write based on what they read;
+* inside a transaction on the primary, so a transaction sees its own
+  uncommitted rows;
+* for the rest of a request once it has written anything (a seat taken
+  by ``register_module`` is then visible to the reads that follow);
+* for ``REPLICA_PIN_SECONDS`` after a request that wrote, on requests
+  carrying the cookie ``ReplicaPinningMiddleware`` sets, so the module
+  details a student loads right after registering show their seat;
+* while building a catalog cache entry, which outlives any lag.
+
+The pin cookie goes out with the response headers, so only writes made
+before the view returns count: a ``StreamingHttpResponse`` body runs
+after the middleware is done (its reads use the primary) and cannot pin
+the client.  The streaming endpoints only read.
+
+Replicas are copies of the primary, so nothing is migrated on them.
+"""
+import contextvars
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.decorators import sync_and_async_middleware
+
+CATALOG_MODELS = {"accounts.course", "accounts.module", "accounts.instructor"}
+PIN_COOKIE = "primary_pin"
+
+# The replica this request reads catalog models from (None: the
+# primary), and whether it has written (and should pin the client)
+_replica = contextvars.ContextVar("replica", default=None)
+_wrote = contextvars.ContextVar("wrote", default=False)
+
+
+def replica_aliases():
+    return getattr(settings, "DATABASE_REPLICAS", ())
+
+
+def pin_seconds():
+    return getattr(settings, "REPLICA_PIN_SECONDS", 5)
+
+
+@contextmanager
+def primary_reads():
+    """Read catalog models from the primary inside the ``with`` block."""
+    token = _replica.set(None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+class CatalogReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower not in CATALOG_MODELS:
+            return None
+        replica = _replica.get()
+        if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        _replica.set(None)
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
+
+
+@sync_and_async_middleware
+class ReplicaPinningMiddleware:
+    """Pick the request's replica; keep a client on the primary for ``REPLICA_PIN_SECONDS`` after it writes."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        tokens = self.start(request)
+        try:
+            response = self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            self.end(tokens)
+        return self.finish(response, wrote)
+
+    async def __acall__(self, request):
+        tokens = self.start(request)
+        try:
+            response = await self.get_response(request)
+            wrote = _wrote.get()
+        finally:
+            self.end(tokens)
+        return self.finish(response, wrote)
+
+    def start(self, request):
+        replicas = replica_aliases()
+        pinned = not replicas or PIN_COOKIE in request.COOKIES
+        return _replica.set(None if pinned else random.choice(replicas)), _wrote.set(False)
+
+    def end(self, tokens):
+        replica, wrote = tokens
+        _replica.reset(replica)
+        _wrote.reset(wrote)
+
+    def finish(self, response, wrote):
+        if wrote and replica_aliases():
+            response.set_cookie(PIN_COOKIE, "1", max_age=pin_seconds(), httponly=True, samesite="Lax")
+        return response
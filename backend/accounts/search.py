@@ -0,0 +1,216 @@
+"""Full-text search over course and module titles, codes and descriptions.
+
+The index lives in one ``accounts_search`` table created by migration
+0020: an FTS5 virtual table on SQLite, or a table with a weighted
+``tsvector`` column and a GIN index on PostgreSQL.  Each course and
+module is one document whose id is derived from the object
+(``id * 2`` for courses, ``id * 2 + 1`` for modules), so keeping a
+document in sync is a delete and an insert by primary key.
+
+``accounts.signals`` re-indexes on save and delete.  Bulk writes that
+bypass signals (``bulk_create``, ``QuerySet.update``) should be followed
+by ``rebuild_index()`` (``manage.py rebuild_search_index``).
+
+Ranking is bm25 on SQLite with code > title > description weights, and
+``ts_rank`` with the same A/B/C weights on PostgreSQL, over every match:
+the database keeps only the best ``limit + 1`` while scoring, so a page
+costs one pass over the match list however deep it is.  Pages are keyed
+on the last result's ``(score, document id)``, not an offset.  Every
+query term is matched as a prefix, so partial words typed into a search
+box match; the FTS5 table keeps prefix indexes for 2 to 5 characters so
+that stays cheap.
+"""
+import re
+
+from django.db import connection
+
+from .catalog import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, CatalogQueryError
+
+SEARCH_TABLE = "accounts_search"
+SEARCH_VENDORS = ("sqlite", "postgresql")
+KINDS = ("course", "module")
+
+MAX_QUERY_TERMS = 8
+TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+# Same statement on both backends; the document id column is FTS5's
+# rowid on SQLite and an ordinary primary key on PostgreSQL.
+_DOC_ID = {"sqlite": "rowid", "postgresql": "id"}
+
+_REBUILD_SELECT = """
+    SELECT id * 2, 'course', id, id, code, title, description FROM accounts_course
+    UNION ALL
+    SELECT id * 2 + 1, 'module', id, course_id, code, title, description FROM accounts_module
+"""
+
+_SEARCH_SQL = {
+    # bm25() takes one weight per column, UNINDEXED ones included; lower
+    # is better
+    "sqlite": f"""
+        SELECT * FROM (
+            SELECT kind, object_id, course_id, code, title,
+                   bm25({SEARCH_TABLE}, 0, 0, 0, 10.0, 5.0, 1.0) AS score, rowid AS doc_id
+            FROM {SEARCH_TABLE}
+            WHERE {SEARCH_TABLE} MATCH %s {{kind_filter}}
+        )
+        {{after}}
+        ORDER BY score, doc_id
+        LIMIT %s
+    """,
+    # ts_rank weights are ordered {D, C, B, A}; higher is better
+    "postgresql": f"""
+        SELECT * FROM (
+            SELECT kind, object_id, course_id, code, title,
+                   ts_rank('{{{{0, 0.1, 0.5, 1.0}}}}', document, query)::float8 AS score, id AS doc_id
+            FROM {SEARCH_TABLE}, to_tsquery('simple', %s) AS query
+            WHERE document @@ query {{kind_filter}}
+        ) AS matches
+        {{after}}
+        ORDER BY score DESC, doc_id
+        LIMIT %s
+    """,
+}
+
+# Rows ranked after the previous page's last (score, doc_id)
+_AFTER_SQL = {
+    "sqlite": "WHERE score > %s OR (score = %s AND doc_id > %s)",
+    "postgresql": "WHERE score < %s OR (score = %s AND doc_id > %s)",
+}
+
+
+class SearchUnavailable(Exception):
+    pass
+
+
+def is_available():
+    return connection.vendor in SEARCH_VENDORS
+
+
+def _doc_id(kind, object_id):
+    return object_id * 2 + (kind == "module")
+
+
+def _index(kind, object_id, course_id, code, title, description):
+    if not is_available():
+        return
+    doc_id = _doc_id(kind, object_id)
+    column = _DOC_ID[connection.vendor]
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE} WHERE {column} = %s", [doc_id])
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} ({column}, kind, object_id, course_id, code, title, description) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            [doc_id, kind, object_id, course_id, code, title, description],
+        )
+
+
+def index_course(course):
+    _index("course", course.id, course.id, course.code, course.title, course.description)
+
+
+def index_module(module):
+    _index("module", module.id, module.course_id, module.code, module.title, module.description)
+
+
+def remove_from_index(kind, object_id):
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {SEARCH_TABLE} WHERE {_DOC_ID[connection.vendor]} = %s",
+            [_doc_id(kind, object_id)],
+        )
+
+
+def rebuild_index():
+    """Re-index every course and module; returns the number of documents."""
+    if not is_available():
+        raise SearchUnavailable()
+    column = _DOC_ID[connection.vendor]
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} ({column}, kind, object_id, course_id, code, title, description) "
+            + _REBUILD_SELECT
+        )
+        return cursor.rowcount
+
+
+def _parse_cursor(value):
+    """``(score, doc_id)`` from a ``next_cursor``, or ``None``."""
+    if not value:
+        return None
+    score, _, doc_id = value.rpartition(":")
+    try:
+        return float(score), int(doc_id)
+    except ValueError:
+        raise CatalogQueryError("Invalid cursor")
+
+
+def parse_search_request(params):
+    """Validate ``q``, ``type``, ``limit`` and ``cursor``."""
+    terms = TERM_RE.findall(params.get("q", ""))[:MAX_QUERY_TERMS]
+    if not terms:
+        raise CatalogQueryError("q must contain at least one word")
+
+    kind = params.get("type") or None
+    if kind is not None and kind not in KINDS:
+        raise CatalogQueryError(f"type must be one of: {', '.join(KINDS)}")
+
+    try:
+        limit = int(params.get("limit", DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise CatalogQueryError("limit must be an integer")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise CatalogQueryError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    return {"terms": terms, "kind": kind, "limit": limit, "after": _parse_cursor(params.get("cursor"))}
+
+
+def _match_expression(terms):
+    if connection.vendor == "sqlite":
+        # Quoted so FTS5 operators in user input are taken literally
+        return " ".join(f'"{term}"*' for term in terms)
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def search(query):
+    """One page of ranked results for a ``parse_search_request`` dict."""
+    if not is_available():
+        raise SearchUnavailable()
+    vendor = connection.vendor
+    params = [_match_expression(query["terms"])]
+    kind_filter = ""
+    if query["kind"]:
+        kind_filter = "AND kind = %s"
+        params.append(query["kind"])
+
+    after = ""
+    if query["after"] is not None:
+        score, doc_id = query["after"]
+        after = _AFTER_SQL[vendor]
+        params += [score, score, doc_id]
+
+    # One extra row tells whether there is a next page
+    params.append(query["limit"] + 1)
+    with connection.cursor() as cursor:
+        cursor.execute(_SEARCH_SQL[vendor].format(kind_filter=kind_filter, after=after), params)
+        rows = cursor.fetchall()
+
+    has_more = len(rows) > query["limit"]
+    results = [
+        {
+            "type": kind,
+            "id": object_id,
+            "courseId": course_id,
+            "code": code,
+            "title": title,
+            "score": round(abs(score), 4),
+        }
+        for kind, object_id, course_id, code, title, score, _ in rows[: query["limit"]]
+    ]
+    next_cursor = None
+    if has_more:
+        *_, score, doc_id = rows[query["limit"] - 1]
+        next_cursor = f"{score!r}:{doc_id}"
+    return {"results": results, "next_cursor": next_cursor}
@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_catalog, seats_changed
+from .enrollment import promote_waitlist, seat_freed
+from .models import Course, Enrollment, Instructor, Module
+from .search import index_course, index_module, remove_from_index
+from .timetable import sync_time_slots
+
+
+@receiver(post_save, sender=Course)
+@receiver(post_save, sender=Instructor)
+@receiver(post_delete, sender=Course)
+@receiver(post_delete, sender=Instructor)
+@receiver(post_delete, sender=Module)
+def catalog_changed(sender, **kwargs):
+    # After commit: a cache miss during the transaction would otherwise
+    # cache pre-commit data under the new version
+    transaction.on_commit(invalidate_catalog)
+
+
+@receiver(post_save, sender=Course)
+def course_saved(sender, instance, **kwargs):
+    index_course(instance)
+
+
+@receiver(post_delete, sender=Course)
+def course_deleted(sender, instance, **kwargs):
+    remove_from_index("course", instance.id)
+
+
+@receiver(post_delete, sender=Module)
+def module_deleted(sender, instance, **kwargs):
+    remove_from_index("module", instance.id)
+
+
+@receiver(post_delete, sender=Enrollment)
+def enrollment_deleted(sender, instance, **kwargs):
+    # Every way out of a module (unregistering, the admin, a cascade from
+    # the student) gives the seat back
+    seat_freed(instance.module_id)
+
+
+@receiver(post_save, sender=Module)
+def module_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    seats_changed(instance.id)
+    # Seat bookkeeping saves only "enrolled"; the cached catalog stays
+    if update_fields is not None and set(update_fields) == {"enrolled"}:
+        return
+
+    transaction.on_commit(invalidate_catalog)
+    index_module(instance)
+    sync_time_slots(instance)
+    if not created:
+        # The capacity may have grown; fill new seats from the waitlist
+        # in the same transaction as the save.
+        promote_waitlist(instance.id)
@@ -0,0 +1,54 @@
+"""Account creation for ``signup_view``.
+
+Signups without a username get ``user_<12 hex digits>``.  Picking a
+random name costs no query, unlike counting ``auth_user``.  Two signups
+can no longer race for the same name either: the unique constraint on
+``username`` catches the (astronomically rare) collision and the insert
+is retried with a fresh name.
+"""
+import secrets
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+from .backends import users_with_email
+
+USERNAME_PREFIX = "user_"
+USERNAME_RETRIES = 5
+
+
+class SignupError(Exception):
+    status = 400
+    message = "Signup failed"
+
+
+class EmailTaken(SignupError):
+    message = "User already exists"
+
+
+class UsernameTaken(SignupError):
+    message = "Username already taken"
+
+
+def generate_username():
+    return f"{USERNAME_PREFIX}{secrets.token_hex(6)}"
+
+
+def create_account(email, password, username=None, **fields):
+    """Create and return a user, generating a username if none is given."""
+    if users_with_email(email).exists():
+        raise EmailTaken()
+
+    for _ in range(1 if username else USERNAME_RETRIES):
+        try:
+            with transaction.atomic():
+                return User.objects.create_user(
+                    username=username or generate_username(),
+                    email=email,
+                    password=password,
+                    **fields,
+                )
+        except IntegrityError:
+            if username:
+                raise UsernameTaken()
+    raise SignupError()
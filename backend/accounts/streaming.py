@@ -0,0 +1,83 @@
+"""Incrementally encoded JSON, JSONL and CSV responses for the large list endpoints.
+
+With ``?stream=1`` the full listings are written out one element at a
+time from ``QuerySet.iterator()`` instead of being built as a list and
+encoded in one go, so a worker's memory stays flat however large the
+catalog is and the client receives the first bytes straight away.
+"""
+import csv
+import itertools
+
+from django.http import StreamingHttpResponse
+
+from .renderers import dumps
+
+# Rows fetched per database round trip (and per prefetch batch)
+STREAM_CHUNK_SIZE = 500
+# Encoded elements are sent in pieces of roughly this many bytes
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+def wants_stream(request):
+    return request.GET.get("stream", "").lower() in ("1", "true", "yes")
+
+
+def iter_json_array(rows, prefix="", suffix=""):
+    """Yield ``prefix + [row, row, ...] + suffix`` as encoded chunks."""
+    buffer = [prefix.encode(), b"["]
+    size = 0
+    first = True
+    for row in rows:
+        encoded = dumps(row)
+        buffer.append(encoded if first else b"," + encoded)
+        first = False
+        size += len(encoded)
+        if size >= STREAM_BUFFER_SIZE:
+            yield b"".join(buffer)
+            buffer = []
+            size = 0
+    buffer.append(b"]")
+    buffer.append(suffix.encode())
+    yield b"".join(buffer)
+
+
+def streaming_json_response(rows, prefix="", suffix=""):
+    """Stream ``rows`` as a JSON array, optionally wrapped in an object.
+
+    ``prefix`` and ``suffix`` must be valid JSON fragments, e.g.
+    ``'{"modules": '`` and ``'}'``.
+    """
+    return StreamingHttpResponse(
+        iter_json_array(rows, prefix, suffix), content_type="application/json"
+    )
+
+
+def _buffered(pieces):
+    """Join encoded ``pieces`` into chunks of about ``STREAM_BUFFER_SIZE`` bytes."""
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= STREAM_BUFFER_SIZE:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+class _Line:
+    # csv.writer only needs write(); hand each formatted line straight back
+    def write(self, line):
+        return line
+
+
+def iter_csv(rows, header):
+    """Yield ``header`` and then every tuple in ``rows`` as UTF-8 CSV chunks."""
+    writer = csv.writer(_Line())
+    lines = (writer.writerow(row).encode() for row in rows)
+    return _buffered(itertools.chain([writer.writerow(header).encode()], lines))
+
+
+def iter_jsonl(rows, columns):
+    """Yield every tuple in ``rows`` as one JSON object per line, keyed by ``columns``."""
+    return _buffered(dumps(dict(zip(columns, row))) + b"\n" for row in rows)
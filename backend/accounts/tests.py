@@ -1,3 +1,1478 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections
+from django.db.models import F
+from django.http import HttpResponse
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.benchmarks import mixed_workload, registration_stress, run_threads, seed_catalog
+from accounts.cache import cache_stats, get_cache
+from accounts.catalog import iter_courses
+from accounts.conflicts import find_conflicts
+from accounts.management.commands.bench_endpoints import compare
+from accounts.importer import CatalogImportError, import_catalog
+from accounts.enrollment import (
+    AlreadyEnrolled,
+    ModuleFull,
+    TimetableClash,
+    bulk_enroll,
+    promote_waitlist,
+    reconcile_enrollment_counts,
+    reserve_seat,
+)
+from accounts.middleware import QueryStatsMiddleware
+from accounts.models import Course, Enrollment, Instructor, Module, WaitlistEntry
+from accounts.query_audit import audit_routes, scanned_tables
+from accounts.renderers import FastJSONRenderer, dumps, loads
+from accounts.routers import PIN_COOKIE, CatalogReplicaRouter, ReplicaPinningMiddleware
+from accounts.signup import USERNAME_PREFIX, create_account
+from accounts.timetable import DAYS, ClashChecker, ScheduleError, find_clash, parse_schedule, weekly_grid
+
+
+def distinct_schedule(index):
+    """A different weekly hour for every module index, so none clash."""
+    hour = index // 7 % 24
+    return f"{DAYS[index % 7]} {hour}:00-{hour}:50"
+
+
+def make_catalog(courses=2, modules_per_course=3):
+    """Create a small catalog; every module gets its own instructor."""
+    created = []
+    for c in range(courses):
+        course = Course.objects.create(
+            title=f"Course {c}",
+            code=f"C{c:04d}",
+            description="Test course",
+            department="computer_science",
+            credits=5,
+            module_count=modules_per_course,
+        )
+        for m in range(modules_per_course):
+            instructor = Instructor.objects.create(
+                first_name=f"First{c}{m}",
+                last_name=f"Last{c}{m}",
+                about="Test instructor",
+                department="computer_science",
+            )
+            Module.objects.create(
+                course=course,
+                code=f"C{c:04d}-M{m}",
+                title=f"Module {c}.{m}",
+                description="Test module",
+                instructor=instructor,
+                start_date=date(2025, 9, 1),
+                end_date=date(2025, 12, 20),
+                capacity=30,
+                schedule=distinct_schedule(c * modules_per_course + m),
+                location="Room 101",
+            )
+        created.append(course)
+    return created
+
+
+class CatalogQueryCountTests(TestCase):
+    """Catalog endpoints must run a fixed number of queries, whatever the size."""
+
+    def setUp(self):
+        get_cache().clear()
+
+    def assert_constant_queries(self, url, expected):
+        for size in (1, 5):
+            with self.captureOnCommitCallbacks(execute=True):
+                Module.objects.all().delete()
+                Course.objects.all().delete()
+                Instructor.objects.all().delete()
+                courses = make_catalog(courses=size, modules_per_course=size)
+            target = url.format(course_id=courses[0].id, module_id=courses[0].modules.first().id)
+            with self.assertNumQueries(expected):
+                response = self.client.get(target)
+            self.assertEqual(response.status_code, 200)
+
+    def test_get_courses(self):
+        self.assert_constant_queries("/api/courses/", 2)
+
+    def test_get_instructors(self):
+        self.assert_constant_queries("/api/instructors/", 2)
+
+    def test_get_course_details(self):
+        self.assert_constant_queries("/api/courses/{course_id}/", 2)
+
+    def test_get_module_details(self):
+        self.assert_constant_queries("/api/modules/{module_id}/", 1)
+
+    def test_get_courses_payload(self):
+        course = make_catalog(courses=1, modules_per_course=2)[0]
+        data = self.client.get("/api/courses/").json()
+        self.assertEqual(len(data), 1)
+        self.assertEqual(len(data[0]["modules"]), 2)
+        module = data[0]["modules"][0]
+        self.assertEqual(module["courseId"], course.id)
+        self.assertEqual(module["instructor"]["first_name"], "First00")
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.course = make_catalog(courses=1, modules_per_course=2)[0]
+        self.module = self.course.modules.first()
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.client.get("/api/courses/")
+        # The first hit loads the seat counts, later ones run no query
+        with self.assertNumQueries(1):
+            second = self.client.get("/api/courses/")
+        with self.assertNumQueries(0):
+            third = self.client.get("/api/courses/")
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first.content, third.content)
+        stats = cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+
+    def test_equivalent_queries_share_an_entry(self):
+        self.client.get("/api/courses/?limit=2&fields=id,title")
+        self.client.get("/api/courses/?fields=id,title&limit=2&utm_source=mail")
+        stats = cache_stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_instructor_change_invalidates(self):
+        self.client.get("/api/instructors/")
+        instructor = self.module.instructor
+        instructor.about = "Updated"
+        with self.captureOnCommitCallbacks(execute=True):
+            instructor.save()
+            # Not before commit: a miss now would cache uncommitted data
+            data = self.client.get("/api/instructors/").json()
+            self.assertNotIn("Updated", [row["about"] for row in data])
+        data = self.client.get("/api/instructors/").json()
+        self.assertIn("Updated", [row["about"] for row in data])
+
+    def test_course_create_invalidates(self):
+        self.client.get("/api/courses/")
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.create(
+                title="New", code="NEW1", description="", department="math",
+                credits=5, module_count=0,
+            )
+        data = self.client.get("/api/courses/").json()
+        self.assertEqual(len(data), 2)
+
+    def test_module_delete_invalidates(self):
+        self.client.get("/api/courses/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.module.delete()
+        data = self.client.get("/api/courses/").json()
+        self.assertEqual(len(data[0]["modules"]), 1)
+
+    def test_enrollment_refreshes_seats_without_rebuild(self):
+        self.client.get("/api/courses/")
+        user = User.objects.create_user(username="student", password="pw")
+        response = self.client.post(
+            f"/api/modules/{self.module.id}/register/",
+            json.dumps({"userId": user.id}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        # Only the module's seat bucket is reloaded
+        with self.assertNumQueries(1):
+            data = self.client.get("/api/courses/").json()
+        seats = {m["id"]: m["enrolled"] for m in data[0]["modules"]}
+        self.assertEqual(seats[self.module.id], 1)
+        self.assertEqual(cache_stats()["misses"], 1)
+
+    def test_seat_counts_without_module_ids_stay_fresh(self):
+        url = "/api/courses/?include=modules&module_fields=title,enrolled"
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_seat(User.objects.create_user(username="student", password="pw").id, self.module.id)
+        data = self.client.get(url).json()
+        seats = {m["title"]: m["enrolled"] for m in data["results"][0]["modules"]}
+        self.assertEqual(seats[self.module.title], 1)
+
+    def test_concurrent_seat_changes_are_not_lost(self):
+        self.client.get("/api/courses/")
+        other = self.course.modules.exclude(id=self.module.id).get()
+        # Both changes commit before any response reads the counts
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_seat(User.objects.create_user(username="a", password="pw").id, self.module.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_seat(User.objects.create_user(username="b", password="pw").id, other.id)
+        data = self.client.get("/api/courses/").json()
+        seats = {m["id"]: m["enrolled"] for m in data[0]["modules"]}
+        self.assertEqual((seats[self.module.id], seats[other.id]), (1, 1))
+
+
+class CatalogPaginationTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.courses = make_catalog(courses=5, modules_per_course=2)
+
+    def test_keyset_pages_cover_catalog(self):
+        seen = []
+        url = "/api/courses/?limit=2"
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(row["id"] for row in data["results"])
+            cursor = data["next_cursor"]
+            url = f"/api/courses/?limit=2&cursor={cursor}" if cursor else None
+        self.assertEqual(seen, [course.id for course in self.courses])
+
+    def test_sparse_fields_without_modules(self):
+        data = self.client.get("/api/courses/?fields=id,title&limit=10").json()
+        self.assertEqual(set(data["results"][0]), {"id", "title"})
+        self.assertIsNone(data["next_cursor"])
+
+    def test_include_modules_with_module_fields(self):
+        with self.assertNumQueries(2):
+            data = self.client.get(
+                "/api/courses/?fields=code&include=modules&module_fields=id,title,instructor&limit=3"
+            ).json()
+        first = data["results"][0]
+        self.assertEqual(set(first), {"code", "modules"})
+        self.assertEqual(len(first["modules"]), 2)
+        self.assertEqual(set(first["modules"][0]), {"id", "title", "instructor"})
+        self.assertEqual(first["modules"][0]["instructor"]["first_name"], "First00")
+
+    def test_instructors_page(self):
+        data = self.client.get("/api/instructors/?limit=4&include=modules").json()
+        self.assertEqual(len(data["results"]), 4)
+        self.assertEqual(len(data["results"][0]["modules"]), 1)
+        self.assertIsNotNone(data["next_cursor"])
+
+    def test_invalid_parameters(self):
+        for query in ("limit=0", "limit=abc", "cursor=x", "fields=password", "include=students"):
+            response = self.client.get(f"/api/courses/?{query}")
+            self.assertEqual(response.status_code, 400, query)
+
+
+class RegisterModuleTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.module = make_catalog(courses=1, modules_per_course=1)[0].modules.get()
+        self.user = User.objects.create_user(username="student", password="pw")
+
+    def register(self, user_id, module_id=None):
+        return self.client.post(
+            f"/api/modules/{module_id or self.module.id}/register/",
+            json.dumps({"userId": user_id}),
+            content_type="application/json",
+        )
+
+    def test_register(self):
+        response = self.register(self.user.id)
+        self.assertEqual(response.status_code, 201)
+        self.module.refresh_from_db()
+        self.assertEqual(self.module.enrolled, 1)
+        self.assertTrue(Enrollment.objects.filter(user=self.user, module=self.module).exists())
+
+    def test_duplicate_is_rejected_without_counting(self):
+        self.register(self.user.id)
+        response = self.register(self.user.id)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["message"], AlreadyEnrolled.message)
+        self.module.refresh_from_db()
+        self.assertEqual(self.module.enrolled, 1)
+
+    def test_full_module(self):
+        Module.objects.filter(id=self.module.id).update(capacity=0)
+        response = self.register(self.user.id)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["message"], ModuleFull.message)
+
+    def test_unknown_user_and_module(self):
+        self.assertEqual(self.register(self.user.id + 100).status_code, 404)
+        self.assertEqual(self.register(self.user.id, module_id=self.module.id + 100).status_code, 404)
+        self.module.refresh_from_db()
+        self.assertEqual(self.module.enrolled, 0)
+
+
+class ConcurrentRegistrationTests(TransactionTestCase):
+    def test_no_overbooking_under_concurrency(self):
+        module = make_catalog(courses=1, modules_per_course=1)[0].modules.get()
+        Module.objects.filter(id=module.id).update(capacity=10)
+        User.objects.bulk_create(User(username=f"u{i}") for i in range(40))
+        user_ids = list(User.objects.values_list("id", flat=True))
+
+        result = registration_stress(module.id, user_ids, threads=8)
+
+        # The shared in-memory test database reports table locks instead of
+        # waiting; one can hit the read that follows a committed enrollment,
+        # so its retry comes back "already enrolled". Check the stored rows.
+        module.refresh_from_db()
+        self.assertEqual(result["gave_up"], 0)
+        self.assertEqual(module.enrolled, 10)
+        self.assertEqual(Enrollment.objects.filter(module=module).count(), 10)
+
+
+class BulkEnrollmentTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        course = make_catalog(courses=1, modules_per_course=2)[0]
+        self.small, self.large = course.modules.order_by("id")
+        Module.objects.filter(id=self.small.id).update(capacity=2)
+        self.admin = User.objects.create_superuser(username="registrar", password="pw")
+        self.client.force_login(self.admin)
+        self.students = User.objects.bulk_create(User(username=f"s{i}") for i in range(4))
+
+    def post(self, enrollments):
+        return self.client.post(
+            "/api/enrollments/bulk/",
+            json.dumps({"enrollments": enrollments}),
+            content_type="application/json",
+        )
+
+    def test_capacity_is_checked_per_module(self):
+        Enrollment.objects.create(user=self.students[0], module=self.large)
+        Module.objects.filter(id=self.large.id).update(enrolled=1)
+        pairs = [{"userId": s.id, "moduleId": self.small.id} for s in self.students]
+        pairs += [{"userId": s.id, "moduleId": self.large.id} for s in self.students]
+        pairs += [{"userId": self.students[0].id, "moduleId": 999999}, {"userId": 999999, "moduleId": self.small.id}]
+
+        response = self.post(pairs)
+
+        self.assertEqual(response.status_code, 200)
+        statuses = [result["status"] for result in response.json()["results"]]
+        self.assertEqual(statuses, [
+            "enrolled", "enrolled", "module_full", "module_full",
+            "already_enrolled", "enrolled", "enrolled", "enrolled",
+            "unknown_module", "unknown_user",
+        ])
+        self.small.refresh_from_db()
+        self.large.refresh_from_db()
+        self.assertEqual((self.small.enrolled, self.large.enrolled), (2, 4))
+        self.assertEqual(Enrollment.objects.count(), 6)
+
+    def test_pair_enrolled_concurrently_fails_the_batch(self):
+        student = self.students[0]
+
+        def racing_checker(*args):
+            Enrollment.objects.create(user=student, module=self.large)
+            return ClashChecker(*args)
+
+        with mock.patch("accounts.enrollment.ClashChecker", side_effect=racing_checker):
+            response = self.post([{"userId": s.id, "moduleId": self.large.id} for s in self.students])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Enrollment.objects.count(), 0)
+        self.large.refresh_from_db()
+        self.assertEqual(self.large.enrolled, 0)
+
+    def test_query_count_does_not_grow_with_batch(self):
+        pairs = [{"userId": s.id, "moduleId": self.large.id} for s in self.students]
+        # session, user, savepoint, modules, users, existing, module slots,
+        # booked slots, insert, update, booked slots insert, release
+        with self.assertNumQueries(12):
+            self.post(pairs)
+
+    def test_requires_staff(self):
+        self.client.logout()
+        response = self.post([{"userId": self.students[0].id, "moduleId": self.large.id}])
+        self.assertEqual(response.status_code, 403)
+
+    def test_invalid_payload(self):
+        self.assertEqual(self.post([{"userId": "x", "moduleId": 1}]).status_code, 400)
+        self.assertEqual(self.post([]).status_code, 400)
+        for body in ("[1, 2]", '"text"', "null"):
+            response = self.client.post("/api/enrollments/bulk/", body, content_type="application/json")
+            self.assertEqual(response.status_code, 400, body)
+
+
+class WaitlistTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.module = make_catalog(courses=1, modules_per_course=1)[0].modules.get()
+        Module.objects.filter(id=self.module.id).update(capacity=1)
+        self.students = User.objects.bulk_create(User(username=f"w{i}") for i in range(4))
+        reserve_seat(self.students[0].id, self.module.id)
+
+    def call(self, method, user, path="waitlist"):
+        url = f"/api/modules/{self.module.id}/{path}/"
+        if method == "get":
+            return self.client.get(url, {"userId": user.id})
+        if method == "delete" or path == "unregister":
+            self.client.force_login(user)
+        return getattr(self.client, method)(
+            url, json.dumps({"userId": user.id}), content_type="application/json"
+        )
+
+    def test_join_and_lookup_position(self):
+        self.assertEqual(self.call("post", self.students[1]).json()["position"], 1)
+        self.assertEqual(self.call("post", self.students[2]).json()["position"], 2)
+        # Joining again keeps the place
+        self.assertEqual(self.call("post", self.students[1]).json()["position"], 1)
+        self.assertEqual(self.call("get", self.students[2]).json()["position"], 2)
+        self.assertEqual(self.call("get", self.students[3]).status_code, 404)
+
+    def test_cannot_join_with_free_seats_or_when_enrolled(self):
+        self.assertEqual(self.call("post", self.students[0]).status_code, 400)
+        Module.objects.filter(id=self.module.id).update(capacity=5)
+        self.assertEqual(self.call("post", self.students[1]).status_code, 409)
+
+    def test_leaving_moves_queue_up(self):
+        self.call("post", self.students[1])
+        self.call("post", self.students[2])
+        self.assertEqual(self.call("delete", self.students[1]).status_code, 200)
+        self.assertEqual(self.call("get", self.students[2]).json()["position"], 1)
+
+    def test_unregister_promotes_head(self):
+        self.call("post", self.students[1])
+        self.call("post", self.students[2])
+        response = self.call("post", self.students[0], path="unregister")
+        self.assertEqual(response.json()["promoted"], [self.students[1].id])
+        self.module.refresh_from_db()
+        self.assertEqual(self.module.enrolled, 1)
+        self.assertTrue(Enrollment.objects.filter(user=self.students[1], module=self.module).exists())
+        self.assertEqual(self.call("get", self.students[2]).json()["position"], 1)
+
+    def test_capacity_increase_promotes(self):
+        for student in self.students[1:]:
+            self.call("post", student)
+        self.module.refresh_from_db()
+        self.module.capacity = 3
+        self.module.save()
+        self.module.refresh_from_db()
+        self.assertEqual(self.module.enrolled, 3)
+        self.assertEqual(self.call("get", self.students[3]).json()["position"], 1)
+
+    def test_unregister_when_not_enrolled(self):
+        self.assertEqual(self.call("post", self.students[1], path="unregister").status_code, 404)
+
+    def test_leaving_needs_the_student_signed_in(self):
+        self.call("post", self.students[1])
+        url = f"/api/modules/{self.module.id}/"
+        self.assertEqual(self.client.post(url + "unregister/").status_code, 401)
+        self.assertEqual(self.client.delete(url + "waitlist/").status_code, 401)
+        # The body's userId is ignored: students[2] leaves nothing of students[1]'s
+        self.client.force_login(self.students[2])
+        body = json.dumps({"userId": self.students[1].id})
+        self.assertEqual(self.client.delete(url + "waitlist/", body, content_type="application/json").status_code, 404)
+        self.assertEqual(self.client.post(url + "unregister/", body, content_type="application/json").status_code, 404)
+        self.assertEqual(self.call("get", self.students[1]).json()["position"], 1)
+        self.assertTrue(Enrollment.objects.filter(user=self.students[0]).exists())
+
+    def test_deleting_an_enrollment_frees_the_seat(self):
+        self.call("post", self.students[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            Enrollment.objects.filter(user=self.students[0]).delete()
+        self.module.refresh_from_db()
+        self.assertEqual(self.module.enrolled, 1)
+        self.assertTrue(Enrollment.objects.filter(user=self.students[1], module=self.module).exists())
+
+    def test_rank_count_is_bounded(self):
+        for student in self.students[1:3]:
+            self.assertFalse(self.call("post", student).json()["positionIsLowerBound"])
+        with mock.patch("accounts.enrollment.WAITLIST_RANK_LIMIT", 1):
+            joined = self.call("post", self.students[3]).json()
+            first = self.call("get", self.students[1]).json()
+            last = self.call("get", self.students[3]).json()
+        # Third in a queue longer than the limit: reported as "2 or later"
+        self.assertEqual((joined["position"], joined["positionIsLowerBound"]), (2, True))
+        self.assertEqual((last["position"], last["positionIsLowerBound"]), (2, True))
+        self.assertEqual((first["position"], first["positionIsLowerBound"]), (1, False))
+
+
+class ReconcileEnrollmentTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        course = make_catalog(courses=1, modules_per_course=3)[0]
+        self.modules = list(course.modules.order_by("id"))
+        students = User.objects.bulk_create(User(username=f"r{i}") for i in range(3))
+        for student in students:
+            reserve_seat(student.id, self.modules[0].id)
+        # Drift: a counter bumped without an enrollment, and a lost increment
+        Enrollment.objects.filter(user=students[0]).delete()
+        Module.objects.filter(id=self.modules[0].id).update(enrolled=F("enrolled") + 1)
+        Enrollment.objects.create(user=students[0], module=self.modules[1])
+
+    def test_reports_and_fixes_drift_in_constant_queries(self):
+        # count, savepoint, update, waitlisted modules, release
+        with self.assertNumQueries(5):
+            drifted = reconcile_enrollment_counts()
+        self.assertEqual(drifted, [
+            {"id": self.modules[0].id, "counter": 3, "actual": 2},
+            {"id": self.modules[1].id, "counter": 0, "actual": 1},
+        ])
+        counts = dict(Module.objects.values_list("id", "enrolled"))
+        self.assertEqual([counts[m.id] for m in self.modules], [2, 1, 0])
+        self.assertEqual(reconcile_enrollment_counts(), [])
+
+    def test_freed_seats_go_to_the_waitlist(self):
+        Module.objects.filter(id=self.modules[0].id).update(capacity=3)
+        queued = User.objects.create_user(username="queued", password="pw")
+        WaitlistEntry.objects.create(user=queued, module=self.modules[0], position=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            reconcile_enrollment_counts()
+        self.assertTrue(Enrollment.objects.filter(user=queued, module=self.modules[0]).exists())
+        self.assertFalse(WaitlistEntry.objects.exists())
+        self.assertEqual(Module.objects.get(id=self.modules[0].id).enrolled, 3)
+
+    def test_dry_run_leaves_counters(self):
+        out = io.StringIO()
+        call_command("reconcile_enrollments", "--dry-run", stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual((report["drifted_modules"], report["total_drift"]), (2, 2))
+        self.assertEqual(Module.objects.get(id=self.modules[0].id).enrolled, 3)
+
+
+class StreamingResponseTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        make_catalog(courses=3, modules_per_course=2)
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return json.loads(b"".join(response.streaming_content))
+
+    def test_streamed_lists_match_regular_ones(self):
+        for url in ("/api/courses/", "/api/instructors/"):
+            expected = self.client.get(url).json()
+            self.assertEqual(self.read(self.client.get(url, {"stream": "1"})), expected)
+
+    def test_streamed_enrollments(self):
+        user = User.objects.create_user(username="streamer")
+        for module in Module.objects.all()[:2]:
+            reserve_seat(user.id, module.id)
+        body = json.dumps({"userId": user.id})
+        expected = self.client.post("/api/my_enrollments/", body, content_type="application/json").json()
+        streamed = self.read(
+            self.client.post("/api/my_enrollments/?stream=1", body, content_type="application/json")
+        )
+        self.assertEqual(streamed, expected)
+        self.assertEqual(len(streamed["modules"]), 2)
+
+    def test_empty_list(self):
+        Course.objects.all().delete()
+        self.assertEqual(self.read(self.client.get("/api/courses/?stream=1")), [])
+
+
+class RendererTests(TestCase):
+    def test_dumps_handles_dates_and_decimals(self):
+        data = {"day": date(2025, 9, 1), "price": Decimal("19.90"), 1: "key"}
+        self.assertEqual(loads(dumps(data)), {"day": "2025-09-01", "price": "19.90", "1": "key"})
+
+    def test_drf_views_use_fast_renderer(self):
+        get_cache().clear()
+        admin = User.objects.create_superuser(username="admin", password="pw")
+        self.client.force_login(admin)
+        response = self.client.get("/api/catalog/cache-stats/", HTTP_ACCEPT="application/json")
+        self.assertIsInstance(response.accepted_renderer, FastJSONRenderer)
+        self.assertIn("hits", response.json())
+
+
+class ModuleSerializerTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.course = make_catalog(courses=2, modules_per_course=2)[0]
+        self.module = self.course.modules.order_by("id").first()
+        self.user = User.objects.create_user(username="serial")
+        reserve_seat(self.user.id, self.module.id)
+
+    def test_views_do_not_instantiate_models(self):
+        body = json.dumps({"userId": self.user.id})
+        with mock.patch.object(Module, "from_db") as module_from_db, \
+                mock.patch.object(Instructor, "from_db") as instructor_from_db:
+            self.client.get("/api/courses/")
+            self.client.get("/api/instructors/")
+            self.client.get(f"/api/courses/{self.course.id}/")
+            self.client.get(f"/api/modules/{self.module.id}/")
+            self.client.post("/api/my_enrollments/", body, content_type="application/json")
+        module_from_db.assert_not_called()
+        instructor_from_db.assert_not_called()
+
+    def test_module_shape_is_shared(self):
+        from_courses = self.client.get("/api/courses/").json()[0]["modules"][0]
+        details = self.client.get(f"/api/modules/{self.module.id}/").json()
+        enrolled = self.client.post(
+            "/api/my_enrollments/", json.dumps({"userId": self.user.id}), content_type="application/json"
+        ).json()["modules"][0]
+        self.assertEqual(details.pop("course"), {"id": self.course.id})
+        self.assertEqual(from_courses, details)
+        self.assertEqual(from_courses, enrolled)
+        self.assertEqual(details["startDate"], "2025-09-01")
+        self.assertEqual(details["enrolled"], 1)
+
+    def test_unknown_ids_are_404(self):
+        self.assertEqual(self.client.get("/api/modules/999999/").status_code, 404)
+        self.assertEqual(self.client.get("/api/courses/abc/").status_code, 404)
+
+    def test_streaming_batches_cover_everything(self):
+        rows = list(iter_courses(batch_size=1))
+        self.assertEqual([row["id"] for row in rows], list(Course.objects.order_by("id").values_list("id", flat=True)))
+        self.assertEqual(sum(len(row["modules"]) for row in rows), 4)
+
+
+class AsyncCatalogViewTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.course = make_catalog(courses=2, modules_per_course=2)[0]
+        self.module = self.course.modules.order_by("id").first()
+
+    async def test_async_views_match_sync_views(self):
+        urls = [
+            "courses/",
+            "courses/?limit=1&include=modules&fields=id,title",
+            "instructors/",
+            f"courses/{self.course.id}/",
+            f"modules/{self.module.id}/",
+        ]
+        for url in urls:
+            await get_cache().aclear()
+            expected = (await self.async_client.get(f"/api/{url}")).json()
+            await get_cache().aclear()
+            response = await self.async_client.get(f"/api/async/{url}")
+            self.assertEqual(response.status_code, 200, url)
+            self.assertEqual(response.json(), expected, url)
+
+    async def test_async_errors(self):
+        self.assertEqual((await self.async_client.get("/api/async/modules/999999/")).status_code, 404)
+        self.assertEqual((await self.async_client.get("/api/async/courses/x/")).status_code, 404)
+        self.assertEqual((await self.async_client.get("/api/async/courses/?limit=0")).status_code, 400)
+        self.assertEqual((await self.async_client.post("/api/async/courses/")).status_code, 405)
+
+    async def test_async_listing_shares_cache(self):
+        await self.async_client.get("/api/courses/")
+        await self.async_client.get("/api/async/courses/")
+        stats = await sync_to_async(cache_stats)()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+
+class EmailLoginTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="ada", email="Ada.Lovelace@example.com", password="engine"
+        )
+
+    def login(self, email, password):
+        return self.client.post(
+            "/api/login/",
+            json.dumps({"email": email, "password": password}),
+            content_type="application/json",
+        )
+
+    def test_email_is_case_insensitive_and_one_query(self):
+        with self.assertNumQueries(1):
+            user = authenticate(email="ada.lovelace@EXAMPLE.com", password="engine")
+        self.assertEqual(user, self.user)
+
+    def test_login_view(self):
+        response = self.login("ADA.lovelace@example.com", "engine")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"]["id"], self.user.id)
+        self.assertIn("access", response.json()["tokens"])
+
+    def test_bad_credentials(self):
+        self.assertEqual(self.login("ada.lovelace@example.com", "wrong").status_code, 400)
+        self.assertEqual(self.login("nobody@example.com", "engine").status_code, 400)
+
+    def test_username_login_still_works(self):
+        self.assertEqual(authenticate(username="ada", password="engine"), self.user)
+
+    def test_lower_email_index(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, "auth_user")
+        self.assertIn("accounts_user_email_lower", constraints)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class SignupTests(TestCase):
+    def signup(self, **data):
+        return self.client.post("/api/signup/", json.dumps(data), content_type="application/json")
+
+    def test_generated_username(self):
+        response = self.signup(email="grace@example.com", password="cobol")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["user"]["username"].startswith(USERNAME_PREFIX))
+
+    def test_query_count_does_not_depend_on_user_count(self):
+        with self.assertNumQueries(4):
+            create_account("first@example.com", "pw")
+        User.objects.bulk_create(User(username=f"filler_{i}") for i in range(100))
+        with self.assertNumQueries(4):
+            create_account("second@example.com", "pw")
+
+    def test_collision_is_retried(self):
+        existing = User.objects.create_user(username=f"{USERNAME_PREFIX}aaaaaaaaaaaa")
+        with mock.patch("accounts.signup.secrets.token_hex", side_effect=["aaaaaaaaaaaa", "bbbbbbbbbbbb"]):
+            user = create_account("grace@example.com", "pw")
+        self.assertNotEqual(user.username, existing.username)
+        self.assertEqual(user.username, f"{USERNAME_PREFIX}bbbbbbbbbbbb")
+
+    def test_existing_email_and_username(self):
+        User.objects.create_user(username="grace", email="Grace@example.com")
+        self.assertEqual(self.signup(email="grace@EXAMPLE.com", password="pw").json()["error"], "User already exists")
+        response = self.signup(email="other@example.com", password="pw", username="grace")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["error"], "Username already taken")
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ConcurrentSignupTests(TransactionTestCase):
+    def test_signup_burst(self):
+        emails = [f"burst{i}@example.com" for i in range(40)]
+
+        def worker(chunk):
+            for email in chunk:
+                # The shared in-memory test database reports locks instead of waiting
+                for _ in range(50):
+                    try:
+                        create_account(email, "pw")
+                        break
+                    except OperationalError:
+                        continue
+
+        run_threads(worker, emails, threads=8)
+        self.assertEqual(User.objects.filter(email__in=emails).count(), len(emails))
+        self.assertEqual(User.objects.values("username").distinct().count(), len(emails))
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ProfileTokenTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="ada", email="ada@example.com", password="engine",
+            first_name="Ada", last_name="Lovelace",
+        )
+        response = self.client.post(
+            "/api/login/",
+            json.dumps({"email": "ada@example.com", "password": "engine"}),
+            content_type="application/json",
+        )
+        self.tokens = response.json()["tokens"]
+
+    def details(self, access):
+        return self.client.get("/api/user-details/", HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_details_from_token_without_queries(self):
+        with self.assertNumQueries(0):
+            response = self.details(self.tokens["access"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "first_name": "Ada", "last_name": "Lovelace",
+            "email": "ada@example.com", "username": "ada",
+        })
+
+    def test_token_without_claims_loads_user(self):
+        access = RefreshToken.for_user(self.user).access_token
+        with self.assertNumQueries(1):
+            response = self.details(access)
+        self.assertEqual(response.json()["first_name"], "Ada")
+
+    def test_update_returns_refreshed_claims(self):
+        response = self.client.put(
+            "/api/user-details/ada/",
+            json.dumps({"firstName": "Augusta"}),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}",
+        )
+        self.assertEqual(response.status_code, 200)
+        access = response.json()["tokens"]["access"]
+        self.assertEqual(self.details(access).json()["first_name"], "Augusta")
+
+    def test_cannot_update_someone_else(self):
+        User.objects.create_user(username="grace")
+        response = self.client.put(
+            "/api/user-details/grace/",
+            json.dumps({"firstName": "Mallory"}),
+            content_type="application/json",
+            HTTP_AUTHORIZATION=f"Bearer {self.tokens['access']}",
+        )
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(User.objects.get(username="grace").first_name, "")
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.courses = make_catalog(courses=2, modules_per_course=3)
+        Course.objects.filter(id=self.courses[1].id).update(description="Quantum computing")
+
+    def search(self, **params):
+        return self.client.get("/api/search/", params)
+
+    def test_ranked_prefix_search(self):
+        response = self.search(q="modu")
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(len(results), 6)
+        self.assertEqual({r["type"] for r in results}, {"module"})
+
+        # A code hit outranks description hits
+        results = self.search(q="C0001").json()["results"]
+        self.assertEqual((results[0]["type"], results[0]["id"]), ("course", self.courses[1].id))
+
+    def test_pagination_and_type_filter(self):
+        first = self.search(q="test", limit=4).json()
+        self.assertEqual(len(first["results"]), 4)
+        second = self.search(q="test", limit=4, cursor=first["next_cursor"]).json()
+        self.assertIsNone(second["next_cursor"])
+        self.assertEqual(len(first["results"]) + len(second["results"]), 8)
+
+        courses = self.search(q="test", type="course").json()["results"]
+        self.assertEqual({r["type"] for r in courses}, {"course"})
+
+    def test_pages_follow_the_ranking(self):
+        # Every match is ranked, and keyset pages continue where the last ended
+        ranked = self.search(q="c0001 test", limit=20).json()["results"]
+        paged, cursor = [], None
+        while True:
+            page = self.search(q="c0001 test", limit=1, **({"cursor": cursor} if cursor else {})).json()
+            paged.extend(page["results"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(paged, ranked)
+        self.assertEqual((ranked[0]["type"], ranked[0]["id"]), ("course", self.courses[1].id))
+
+    def test_signals_keep_index_in_sync(self):
+        module = self.courses[0].modules.order_by("id").first()
+        module.title = "Topology"
+        module.save()
+        self.assertEqual([r["id"] for r in self.search(q="topology").json()["results"]], [module.id])
+        module.delete()
+        self.assertEqual(self.search(q="topology").json()["results"], [])
+
+    def test_rebuild_after_bulk_writes(self):
+        # QuerySet.update() bypasses signals
+        self.assertEqual(self.search(q="quantum").json()["results"], [])
+        call_command("rebuild_search_index", stdout=io.StringIO())
+        results = self.search(q="quantum").json()["results"]
+        self.assertEqual([r["id"] for r in results], [self.courses[1].id])
+
+    def test_bad_queries(self):
+        self.assertEqual(self.search(q="  *** ").status_code, 400)
+        self.assertEqual(self.search(q="test", type="teacher").status_code, 400)
+        self.assertEqual(self.search(q="test", limit="0").status_code, 400)
+        self.assertEqual(self.search(q="test", cursor="10").status_code, 400)
+        # FTS5 syntax in user input is treated as plain words
+        self.assertEqual(self.search(q='test" OR NEAR(').status_code, 200)
+
+
+class ModuleFilterTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.cs, self.maths = make_catalog(courses=2, modules_per_course=3)
+        Course.objects.filter(id=self.maths.id).update(department="math", credits=10)
+        self.full = self.maths.modules.order_by("id").first()
+        Module.objects.filter(id=self.full.id).update(enrolled=30)
+        Module.objects.filter(course=self.cs).update(start_date=date(2026, 1, 10), end_date=date(2026, 5, 1))
+
+    def filter(self, **params):
+        return self.client.get("/api/modules/", params)
+
+    def facet(self, body, name):
+        return {item["value"]: item["count"] for item in body["facets"][name]}
+
+    def test_two_queries_whatever_the_facets(self):
+        with self.assertNumQueries(2):
+            response = self.filter(department="math", has_seats="true")
+        self.assertEqual(response.status_code, 200)
+        # The facets of the same filters come from the cache
+        with self.assertNumQueries(1):
+            cached = self.filter(has_seats="true", department="math", limit=1)
+        self.assertEqual(cached.json()["facets"], response.json()["facets"])
+
+    def test_catalog_change_drops_cached_facets(self):
+        self.filter(department="math")
+        with self.captureOnCommitCallbacks(execute=True):
+            Course.objects.get(id=self.cs.id).save()
+        with self.assertNumQueries(2):
+            self.filter(department="math")
+
+    def test_facets_ignore_their_own_filter(self):
+        body = self.filter(department="math").json()
+        self.assertEqual({m["courseId"] for m in body["results"]}, {self.maths.id})
+        self.assertEqual(body["facets"]["total"], 3)
+        self.assertEqual(self.facet(body, "department"), {"computer_science": 3, "math": 3})
+        self.assertEqual(self.facet(body, "credits"), {10: 3})
+        self.assertEqual(self.facet(body, "has_seats"), {True: 2, False: 1})
+
+    def test_seats_and_dates(self):
+        body = self.filter(has_seats="false").json()
+        self.assertEqual([m["id"] for m in body["results"]], [self.full.id])
+        self.assertEqual(self.facet(body, "department"), {"math": 1})
+
+        body = self.filter(date_from="2026-01-01", date_to="2026-06-30").json()
+        self.assertEqual({m["courseId"] for m in body["results"]}, {self.cs.id})
+
+    def test_instructor_labels_and_pagination(self):
+        module = self.cs.modules.order_by("id").first()
+        body = self.filter(instructor=str(module.instructor_id), fields="id,title").json()
+        self.assertEqual(body["results"], [{"id": module.id, "title": module.title}])
+        labels = {item["value"]: item["label"] for item in body["facets"]["instructor"]}
+        self.assertEqual(labels[module.instructor_id], "First00 Last00")
+
+        first = self.filter(limit=4).json()
+        second = self.filter(limit=4, cursor=first["next_cursor"]).json()
+        self.assertEqual(len(first["results"]) + len(second["results"]), 6)
+        self.assertIsNone(second["next_cursor"])
+
+    def test_invalid_filters(self):
+        self.assertEqual(self.filter(department="history").status_code, 400)
+        self.assertEqual(self.filter(credits="five").status_code, 400)
+        self.assertEqual(self.filter(date_from="01/09/2025").status_code, 400)
+        self.assertEqual(self.filter(has_seats="maybe").status_code, 400)
+
+
+class TimetableTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.first, self.second, self.third = make_catalog(courses=1, modules_per_course=3)[0].modules.order_by("id")
+        self.user = User.objects.create_user(username="student")
+
+    def set_schedule(self, module, schedule, **fields):
+        module.schedule = schedule
+        for name, value in fields.items():
+            setattr(module, name, value)
+        module.save()
+
+    def test_parse_schedule(self):
+        self.assertEqual(parse_schedule("Mon, Wed 10:00-11:30"), [(0, 600, 690), (2, 600, 690)])
+        self.assertEqual(parse_schedule("Mon/Wed 9:00-10:00; Fri 14.00–15.00"), [(0, 540, 600), (2, 540, 600), (4, 840, 900)])
+        self.assertEqual([day for day, _, _ in parse_schedule("Tue-Thu 8:00-9:00")], [1, 2, 3])
+        self.assertEqual(parse_schedule(""), [])
+        for bad in ("asfasfasfa", "Mon 11:00-10:00", "Funday 10:00-11:00", "Mon 25:00-26:00"):
+            with self.assertRaises(ScheduleError):
+                parse_schedule(bad)
+
+    def test_clash_is_rejected(self):
+        self.set_schedule(self.first, "Mon/Wed 10:00-11:30")
+        self.set_schedule(self.second, "Wed 11:00-12:00")
+        reserve_seat(self.user.id, self.first.id)
+        with self.assertNumQueries(8):
+            # savepoint, seat update, user lock, slots, clash, clashing code, rollback
+            response = self.client.post(
+                f"/api/modules/{self.second.id}/register/",
+                json.dumps({"userId": self.user.id}),
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, 409)
+        self.assertIn(self.first.code, response.json()["message"])
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.enrolled, 0)
+
+    def test_adjacent_slots_and_other_terms_do_not_clash(self):
+        self.set_schedule(self.first, "Mon 10:00-11:00")
+        self.set_schedule(self.second, "Mon 11:00-12:00")
+        reserve_seat(self.user.id, self.first.id)
+        reserve_seat(self.user.id, self.second.id)
+
+        self.set_schedule(self.third, "Mon 10:00-11:00", start_date=date(2026, 2, 1), end_date=date(2026, 5, 31))
+        reserve_seat(self.user.id, self.third.id)
+
+    def test_duplicate_is_still_already_enrolled(self):
+        reserve_seat(self.user.id, self.first.id)
+        with self.assertRaises(AlreadyEnrolled):
+            reserve_seat(self.user.id, self.first.id)
+
+    def test_schedule_change_rebooks_students(self):
+        reserve_seat(self.user.id, self.first.id)
+        self.set_schedule(self.first, "Fri 9:00-10:00")
+        self.set_schedule(self.second, "Fri 9:30-10:30")
+        with self.assertRaises(TimetableClash):
+            reserve_seat(self.user.id, self.second.id)
+
+    def test_weekly_grid(self):
+        self.set_schedule(self.first, "Mon/Wed 10:00-11:30")
+        self.set_schedule(self.second, "Mon 8:00-9:00")
+        reserve_seat(self.user.id, self.first.id)
+        reserve_seat(self.user.id, self.second.id)
+        with self.assertNumQueries(1):
+            response = self.client.post(
+                "/api/my_timetable/", json.dumps({"userId": self.user.id}), content_type="application/json"
+            )
+        grid = response.json()["timetable"]
+        self.assertEqual(
+            [(slot["moduleId"], slot["start"], slot["end"]) for slot in grid["Mon"]],
+            [(self.second.id, "08:00", "09:00"), (self.first.id, "10:00", "11:30")],
+        )
+        self.assertEqual(len(grid["Wed"]), 1)
+        self.assertEqual(grid["Fri"], [])
+
+    def test_bulk_enroll_skips_clashes(self):
+        self.set_schedule(self.first, "Mon 10:00-11:00")
+        self.set_schedule(self.second, "Mon 10:30-11:30")
+        self.set_schedule(self.third, "Mon 10:45-12:00")
+        other = User.objects.create_user(username="other")
+        reserve_seat(self.user.id, self.first.id)
+        results = bulk_enroll([
+            (self.user.id, self.second.id),
+            (other.id, self.second.id),
+            # Clashes with the seat granted a line above
+            (other.id, self.third.id),
+        ])
+        self.assertEqual([row["status"] for row in results], ["timetable_clash", "enrolled", "timetable_clash"])
+        self.assertEqual(Module.objects.get(id=self.third.id).enrolled, 0)
+
+    def test_promotion_passes_over_clashing_students(self):
+        self.set_schedule(self.first, "Tue 10:00-11:00")
+        self.set_schedule(self.second, "Tue 10:30-11:30")
+        Module.objects.filter(id=self.second.id).update(capacity=0)
+        other = User.objects.create_user(username="other")
+        reserve_seat(self.user.id, self.first.id)
+        for position, student in enumerate((self.user, other), start=1):
+            WaitlistEntry.objects.create(user=student, module=self.second, position=position)
+        Module.objects.filter(id=self.second.id).update(capacity=1)
+        self.assertEqual(promote_waitlist(self.second.id), [other.id])
+        # The clashing student keeps their ticket
+        self.assertEqual(list(WaitlistEntry.objects.values_list("user_id", flat=True)), [self.user.id])
+
+    def test_rebuild_after_bulk_writes(self):
+        Module.objects.filter(id=self.first.id).update(schedule="Thu 12:00-13:00")
+        reserve_seat(self.user.id, self.first.id)
+        call_command("rebuild_timetable", stdout=io.StringIO())
+        self.assertEqual([slot["start"] for slot in weekly_grid(self.user.id)["Thu"]], ["12:00"])
+
+
+class ScheduleConflictTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.a, self.b, self.c = make_catalog(courses=1, modules_per_course=3)[0].modules.order_by("id")
+
+    def update(self, module, **fields):
+        Module.objects.filter(id=module.id).update(**fields)
+
+    def conflicts(self):
+        call_command("rebuild_timetable", stdout=io.StringIO())
+        return [
+            (c["kind"], c["day"], c["start"], c["end"], sorted(m["id"] for m in c["modules"]))
+            for c in find_conflicts()
+        ]
+
+    def test_room_and_instructor_double_bookings(self):
+        self.update(self.a, schedule="Mon/Wed 10:00-11:30", location="Room 101")
+        self.update(self.b, schedule="Wed 11:00-12:00", location=" room  101 ")
+        self.update(self.c, schedule="Mon 9:00-10:30", location="Lab", instructor=self.a.instructor)
+        self.assertEqual(self.conflicts(), [
+            ("instructor", "Mon", "10:00", "10:30", [self.a.id, self.c.id]),
+            ("location", "Wed", "11:00", "11:30", [self.a.id, self.b.id]),
+        ])
+
+    def test_back_to_back_other_terms_and_online_are_fine(self):
+        self.update(self.a, schedule="Mon 10:00-11:00", location="Room 101")
+        self.update(self.b, schedule="Mon 11:00-12:00", location="Room 101")
+        self.update(self.c, schedule="Mon 10:00-11:00", location="Room 101",
+                    start_date=date(2026, 2, 1), end_date=date(2026, 5, 31))
+        self.assertEqual(self.conflicts(), [])
+
+        self.update(self.b, schedule="Mon 10:00-11:00", location="Online")
+        self.update(self.a, location="online")
+        self.assertEqual(self.conflicts(), [])
+
+    def test_clean_checks_the_new_schedule(self):
+        self.update(self.a, schedule="Tue 14:00-16:00")
+        call_command("rebuild_timetable", stdout=io.StringIO())
+
+        self.b.schedule, self.b.location = "Tue 15:00-17:00", self.a.location
+        with self.assertRaisesMessage(ValidationError, f"room {self.a.location} is already booked for {self.a.code}"):
+            self.b.full_clean()
+        self.b.schedule = "Tue 16:00-17:00"
+        self.b.full_clean()
+        self.b.schedule = "sometime"
+        with self.assertRaises(ValidationError):
+            self.b.full_clean()
+
+    def test_clean_matches_rooms_like_the_report(self):
+        self.a.schedule, self.a.location = "Thu 10:00-11:00", "Room  101"
+        self.a.save()
+        self.b.schedule, self.b.location = "Thu 10:30-11:30", " room 101"
+        with self.assertRaises(ValidationError):
+            self.b.full_clean()
+        self.b.save()
+        self.assertEqual([kind for kind, *_ in self.conflicts()], ["location"])
+
+    def test_terms_are_swept_separately(self):
+        self.update(self.a, schedule="Mon 10:00-11:00", start_date=date(2025, 1, 1), end_date=date(2025, 12, 31))
+        self.update(self.b, schedule="Mon 9:00-12:00", start_date=date(2024, 1, 1), end_date=date(2024, 6, 30))
+        # Chains into a's term through its end date, and clashes with it
+        self.update(self.c, schedule="Mon 10:30-11:30", start_date=date(2025, 6, 1), end_date=date(2026, 6, 30))
+        self.assertEqual(self.conflicts(), [("location", "Mon", "10:30", "11:00", [self.a.id, self.c.id])])
+
+    def test_admin_report(self):
+        self.update(self.a, schedule="Fri 9:00-10:00")
+        self.update(self.b, schedule="Fri 9:30-10:30")
+        call_command("rebuild_timetable", stdout=io.StringIO())
+        admin = User.objects.create_superuser(username="office", password="pw")
+        self.client.force_login(admin)
+        response = self.client.get("/admin/accounts/module/conflicts/")
+        self.assertContains(response, "1 double booking found")
+        self.assertContains(response, self.b.code)
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class QueryAuditTests(TestCase):
+    def test_every_route_is_exercised_without_scanning_enrollments_or_users(self):
+        seed_catalog(courses=4, modules=16, instructors=5, users=10, enrollments=20)
+        report = audit_routes()
+
+        self.assertEqual(report["not_exercised"], [])
+        for call in report["routes"]:
+            self.assertLess(call["status"], 400, call["path"])
+            for finding in call["scans"]:
+                self.assertNotIn("error", finding, call["path"])
+                self.assertNotIn("accounts_enrollment", finding["tables"], call["path"])
+                self.assertNotIn("auth_user", finding["tables"], call["path"])
+
+    def test_scanned_tables(self):
+        if connection.vendor == "sqlite":
+            plan = ["SCAN accounts_module USING COVERING INDEX x", "SEARCH auth_user USING INTEGER PRIMARY KEY (rowid=?)"]
+        else:
+            plan = ["Seq Scan on accounts_module  (cost=0.00..1.00 rows=1 width=4)", "Index Scan using x on auth_user"]
+        self.assertEqual(scanned_tables(plan), ["accounts_module"])
+
+
+class QueryStatsMiddlewareTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        make_catalog(courses=1, modules_per_course=2)
+
+    def test_server_timing_header_counts_the_request_queries(self):
+        response = self.client.get("/api/courses/?fields=id,title&limit=5")
+        self.assertEqual(response.status_code, 200)
+        db, app = response.headers["Server-Timing"].split(", ")
+        self.assertRegex(db, r'^db;dur=\d+\.\d{2};desc="1 queries"$')
+        self.assertRegex(app, r"^app;dur=\d+\.\d{2}$")
+
+    def test_async_views_are_counted(self):
+        response = self.client.get("/api/async/instructors/")
+        self.assertIn('desc="2 queries"', response.headers["Server-Timing"])
+
+    async def test_async_requests_stay_on_the_event_loop(self):
+        async def view(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(QueryStatsMiddleware(view)))
+        response = await self.async_client.get("/api/async/instructors/")
+        self.assertIn('desc="2 queries"', response.headers["Server-Timing"])
+
+    def test_repeated_query_is_logged_as_a_warning(self):
+        module = Module.objects.first()
+        with self.assertLogs("accounts.queries", "WARNING") as logs, override_settings(QUERY_REPEAT_THRESHOLD=1):
+            self.client.get(f"/api/modules/{module.id}/")
+        record = logs.records[0]
+        self.assertEqual(record.view, "module-details")
+        self.assertEqual(record.queries, 1)
+        self.assertEqual(record.repeated_queries[0]["times"], 1)
+        self.assertIn("repeated=1", record.getMessage())
+
+    def test_query_budget_per_url_name(self):
+        with self.assertLogs("accounts.queries", "INFO") as logs:
+            self.client.get("/api/instructors/")
+            with override_settings(QUERY_BUDGETS={"get_instructors": 0}):
+                self.client.get("/api/instructors/?fields=id")
+        within, over = logs.records
+        self.assertEqual((within.levelname, within.query_budget), ("INFO", 20))
+        self.assertEqual((over.levelname, over.query_budget), ("WARNING", 0))
+        self.assertIn("over_budget=0", over.getMessage())
+
+
+class SeedCatalogTests(TestCase):
+    def test_seed_is_deterministic_and_clash_free(self):
+        counts = seed_catalog(courses=3, modules=20, instructors=4, users=6, enrollments=30)
+        self.assertEqual(counts, {"instructors": 4, "courses": 3, "modules": 20, "users": 6, "enrollments": 30})
+        self.assertEqual(reconcile_enrollment_counts(dry_run=True), [])
+        self.assertEqual(sum(Course.objects.values_list("module_count", flat=True)), 20)
+        first = list(Enrollment.objects.order_by("id").values_list("user__username", "module__code"))
+
+        Enrollment.objects.all().delete()
+        Module.objects.all().delete()
+        Course.objects.all().delete()
+        Instructor.objects.all().delete()
+        User.objects.all().delete()
+        seed_catalog(courses=3, modules=20, instructors=4, users=6, enrollments=30)
+        self.assertEqual(list(Enrollment.objects.order_by("id").values_list("user__username", "module__code")), first)
+
+        user = User.objects.get(username="student0")
+        for module_id in Enrollment.objects.filter(user=user).values_list("module_id", flat=True):
+            self.assertIsNone(find_clash(user.id, module_id))
+
+    def test_seed_command_refuses_a_non_empty_catalog(self):
+        make_catalog(courses=1, modules_per_course=1)
+        with self.assertRaisesMessage(CommandError, "not empty"):
+            call_command("seed_catalog", stdout=io.StringIO())
+
+
+class EndpointBenchmarkTests(TestCase):
+    def test_compare_flags_slower_and_chattier_endpoints(self):
+        def endpoint(p95, queries):
+            return {"latency_ms": {"p95": p95}, "queries": queries}
+
+        baseline = {"GET a": endpoint(10, 2), "GET b": endpoint(10, 2), "GET c": endpoint(10, 2)}
+        current = {"GET a": endpoint(12, 2), "GET b": endpoint(20, 2), "GET c": endpoint(5, 3), "GET d": endpoint(9, 9)}
+        self.assertEqual(
+            [r["endpoint"] for r in compare(baseline, current, tolerance=0.25)],
+            ["GET b", "GET c"],
+        )
+
+
+class CatalogImportTests(TestCase):
+    INSTRUCTORS = "first_name,last_name,department\nAda,Lovelace,math\nAlan,Turing,Computer Science\n"
+    COURSES = "code,title,credits,department\nIMP1,Imported,10,math\n"
+
+    def modules_jsonl(self, capacity=30, schedule="Mon/Wed 10:00-11:30"):
+        return "".join(
+            json.dumps({
+                "course": "IMP1", "code": f"IMP1-{i}", "title": f"Module {i}", "instructor": name,
+                "start_date": "2025-09-01", "end_date": "2025-12-20", "capacity": capacity,
+                "schedule": schedule, "location": f"Room {i}",
+            }) + "\n"
+            for i, name in enumerate(["Ada Lovelace", "alan  turing"])
+        )
+
+    def run_import(self, **sources):
+        return import_catalog({
+            kind: (io.StringIO(text), "jsonl" if kind == "modules" else "csv") for kind, text in sources.items()
+        }, batch_size=1)
+
+    def test_creates_then_updates_by_natural_key(self):
+        stats = self.run_import(instructors=self.INSTRUCTORS, courses=self.COURSES, modules=self.modules_jsonl())
+        self.assertEqual(stats["modules"], {"created": 2, "updated": 0})
+        module = Module.objects.get(code="IMP1-1")
+        self.assertEqual((module.course.code, module.instructor.last_name), ("IMP1", "Turing"))
+        self.assertEqual(Instructor.objects.get(first_name="Alan").department, "computer_science")
+        self.assertEqual(module.time_slots.count(), 2)
+
+        student = User.objects.create_user(username="student")
+        reserve_seat(student.id, module.id)
+        stats = self.run_import(modules=self.modules_jsonl(capacity=50, schedule="Fri 9:00-10:00"))
+        self.assertEqual(stats["modules"], {"created": 0, "updated": 2})
+        module.refresh_from_db()
+        self.assertEqual((module.capacity, module.enrolled, module.schedule), (50, 1, "Fri 9:00-10:00"))
+        self.assertEqual(weekly_grid(student.id)["Fri"][0]["moduleId"], module.id)
+
+    def test_bad_rows_import_nothing(self):
+        modules = self.modules_jsonl() + '{"course": "NOPE", "code": "X"}\nnot json\n'
+        with self.assertRaises(CatalogImportError) as raised:
+            self.run_import(instructors=self.INSTRUCTORS, courses=self.COURSES, modules=modules)
+        self.assertEqual(len(raised.exception.errors), 2)
+        self.assertIn("modules line 3: unknown course 'NOPE'", raised.exception.errors[0])
+        self.assertIn("modules line 4: invalid JSON", raised.exception.errors[1])
+        self.assertFalse(Instructor.objects.exists())
+        self.assertFalse(Course.objects.exists())
+
+    def test_instructor_named_twice_is_rejected(self):
+        instructors = self.INSTRUCTORS + "alan ,TURING,math\n"
+        with self.assertRaises(CatalogImportError) as raised:
+            self.run_import(instructors=instructors, courses=self.COURSES, modules=self.modules_jsonl())
+        self.assertEqual(raised.exception.errors, ["instructors line 4: instructor 'alan TURING' appears more than once"])
+        self.assertFalse(Instructor.objects.exists())
+
+    def test_command_and_admin_upload(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "instructors.csv")
+            with open(path, "w") as f:
+                f.write(self.INSTRUCTORS)
+            call_command("import_catalog", instructors=path, stdout=io.StringIO())
+        self.assertEqual(Instructor.objects.count(), 2)
+
+        admin = User.objects.create_superuser(username="office", password="pw")
+        self.client.force_login(admin)
+        response = self.client.post(
+            "/admin/accounts/course/import/",
+            {"file": SimpleUploadedFile("courses.csv", self.COURSES.encode())},
+        )
+        self.assertRedirects(response, "/admin/accounts/course/")
+        self.assertTrue(Course.objects.filter(code="IMP1").exists())
+
+        response = self.client.post(
+            "/admin/accounts/module/import/",
+            {"file": SimpleUploadedFile("modules.jsonl", b'{"course": "IMP1"}\n')},
+        )
+        self.assertContains(response, "Nothing was imported")
+        self.assertContains(response, "modules line 1: instructor is required")
+
+
+
+class RosterExportTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.course = make_catalog(courses=2, modules_per_course=2)[0]
+        self.modules = list(self.course.modules.order_by("id"))
+        self.students = [
+            User.objects.create_user(username=f"pupil{i}", first_name=f"Pupil, {i}", email=f"pupil{i}@example.com")
+            for i in range(3)
+        ]
+        for student in self.students:
+            reserve_seat(student.id, self.modules[0].id)
+        reserve_seat(self.students[0].id, self.modules[1].id)
+        self.client.force_login(User.objects.create_superuser(username="registrar", password="pw"))
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_module_roster_csv(self):
+        module = self.modules[0]
+        response = self.client.get(f"/api/modules/{module.id}/roster.csv")
+        self.assertEqual(response["Content-Disposition"], f'attachment; filename="roster-{module.code}.csv"')
+        rows = list(csv.DictReader(io.StringIO(self.read(response))))
+        self.assertEqual([row["username"] for row in rows], ["pupil0", "pupil1", "pupil2"])
+        self.assertEqual(rows[1]["first_name"], "Pupil, 1")
+        self.assertEqual(rows[0]["module_code"], module.code)
+        enrollment = Enrollment.objects.get(user=self.students[0], module=module)
+        self.assertEqual(rows[0]["enrolled_at"], enrollment.enrollment_date.isoformat())
+
+    def test_course_roster_jsonl(self):
+        body = self.read(self.client.get(f"/api/courses/{self.course.id}/roster.jsonl"))
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row["module_id"] for row in rows], [self.modules[0].id] * 3 + [self.modules[1].id])
+        self.assertEqual(rows[3]["email"], "pupil0@example.com")
+
+    def test_term_roster(self):
+        Module.objects.filter(pk=self.modules[1].pk).update(start_date=date(2026, 1, 10), end_date=date(2026, 3, 20))
+        body = self.read(self.client.get("/api/rosters.csv?date_from=2026-01-01&date_to=2026-06-30"))
+        self.assertEqual(len(body.splitlines()), 2)
+        self.assertIn(self.modules[1].code, body.splitlines()[1])
+
+        self.assertEqual(self.client.get("/api/rosters.csv").status_code, 400)
+        self.assertEqual(self.client.get("/api/rosters.csv?date_from=soon").status_code, 400)
+
+    def test_errors_and_permissions(self):
+        self.assertEqual(self.client.get(f"/api/modules/{self.modules[0].id}/roster.xlsx").status_code, 400)
+        self.assertEqual(self.client.get("/api/modules/999999/roster.csv").status_code, 404)
+        self.assertEqual(self.client.get("/api/courses/abc/roster.csv").status_code, 404)
+        self.client.logout()
+        self.client.force_login(self.students[0])
+        self.assertEqual(self.client.get(f"/api/modules/{self.modules[0].id}/roster.csv").status_code, 403)
+
+
+class SqliteProfileTests(TransactionTestCase):
+    def test_tuned_profile_applies_pragmas_to_new_connections(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tuned = type(connections["default"])(
+                {**connection.settings_dict, "NAME": os.path.join(tmp, "tuned.sqlite3"),
+                 "OPTIONS": settings.SQLITE_TUNED_OPTIONS},
+                alias="tuned",
+            )
+            try:
+                with tuned.cursor() as cursor:
+                    pragmas = {}
+                    for name in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "temp_store"):
+                        cursor.execute(f"PRAGMA {name}")
+                        pragmas[name] = cursor.fetchone()[0]
+            finally:
+                tuned.close()
+        # synchronous NORMAL = 1, temp_store MEMORY = 2
+        self.assertEqual(
+            pragmas,
+            {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 5000, "cache_size": -65536, "temp_store": 2},
+        )
+        self.assertEqual(tuned.transaction_mode, "IMMEDIATE")
+
+    def test_mixed_workload_leaves_data_unchanged(self):
+        module_ids = [module.id for course in make_catalog(courses=2, modules_per_course=2) for module in course.modules.all()]
+        User.objects.bulk_create(User(username=f"mix{i}") for i in range(10))
+        user_ids = list(User.objects.values_list("id", flat=True))
+
+        result = mixed_workload(user_ids, module_ids, operations=40, threads=1, read_ratio=0.5)
+
+        self.assertEqual(result["operations"], 40)
+        self.assertFalse(Enrollment.objects.exists())
+        self.assertEqual(sum(Module.objects.values_list("enrolled", flat=True)), 0)
+
+
+class ReplicaRouterTests(TransactionTestCase):
+    """The replica is a second SQLite file holding a snapshot of the test database."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Added after the test runner set up its databases: nothing
+        # needs creating, setUp fills the file
+        cls.tmp = tempfile.mkdtemp()
+        connections.settings["replica"] = {
+            **connections["default"].settings_dict, "NAME": os.path.join(cls.tmp, "replica.sqlite3"),
+        }
+        cls.databases = {*cls.databases, "replica"}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica"].close()
+        del connections["replica"]
+        del connections.settings["replica"]
+        shutil.rmtree(cls.tmp)
+
+    def setUp(self):
+        get_cache().clear()
+        self.course = make_catalog(courses=1, modules_per_course=1)[0]
+        self.module = self.course.modules.get()
+        self.student = User.objects.create_user(username="replicated")
+        self.replicate()
+        replicas = override_settings(DATABASE_REPLICAS=["replica"])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+
+    def replicate(self):
+        connections["replica"].close()
+        connection.ensure_connection()
+        replica = sqlite3.connect(connections["replica"].settings_dict["NAME"])
+        try:
+            connection.connection.backup(replica)
+        finally:
+            replica.close()
+
+    def test_catalog_reads_use_the_replica_until_the_client_writes(self):
+        Module.objects.filter(id=self.module.id).update(title="Renamed on the primary")
+        self.assertEqual(self.client.get(f"/api/modules/{self.module.id}/").json()["title"], "Module 0.0")
+
+        response = self.client.post(
+            f"/api/modules/{self.module.id}/register/", json.dumps({"userId": self.student.id}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        # Read-your-own-writes for the student, the lagging replica for everyone else
+        details = self.client.get(f"/api/modules/{self.module.id}/").json()
+        self.assertEqual((details["title"], details["enrolled"]), ("Renamed on the primary", 1))
+        self.assertEqual(Client().get(f"/api/modules/{self.module.id}/").json()["enrolled"], 0)
+        self.assertEqual(Enrollment.objects.using("replica").count(), 0)
+
+    def test_cached_catalog_is_built_from_the_primary(self):
+        Course.objects.filter(id=self.course.id).update(title="Renamed")
+        self.assertEqual(self.client.get(f"/api/courses/{self.course.id}/").json()["title"], "Course 0")
+        self.assertEqual(self.client.get("/api/courses/").json()[0]["title"], "Renamed")
+
+    def test_one_replica_per_request_and_the_primary_outside_requests(self):
+        with override_settings(DATABASE_REPLICAS=["replica", "default"]), \
+                mock.patch("accounts.routers.random.choice", side_effect=lambda aliases: aliases[0]) as choice:
+            response = self.client.get(f"/api/courses/{self.course.id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(choice.call_count, 1)
+        # Commands and the shell read what they are about to write from the primary
+        self.assertEqual(Module.objects.all().db, "default")
+
+    async def test_writes_pin_the_client_under_asgi(self):
+        response = await self.async_client.post(
+            f"/api/modules/{self.module.id}/register/", {"userId": self.student.id}, content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_middleware_is_async_capable(self):
+        async def view(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(ReplicaPinningMiddleware(view)))
+        self.assertFalse(iscoroutinefunction(ReplicaPinningMiddleware(lambda request: HttpResponse())))
+
+    def test_replicas_are_not_migrated(self):
+        router = CatalogReplicaRouter()
+        self.assertIs(router.allow_migrate("replica", "accounts"), False)
+        self.assertIsNone(router.allow_migrate("default", "accounts"))
+        self.assertIsNone(router.db_for_read(User))
@@ -0,0 +1,261 @@
+"""Weekly timetables: parsing ``Module.schedule`` and detecting clashes.
+
+``Module.schedule`` stays the free text shown to students, e.g.
+``"Mon, Wed 10:00-11:30"`` or ``"Mon/Wed 10:00-11:30; Fri 9:00-10:00"``.
+It is parsed into ``TimeSlot`` rows whenever a module is saved.  For
+every enrollment, each of the module's slots is copied into
+``BookedSlot`` as minutes since Monday 00:00, indexed on
+``(user, start)``.
+
+A user's booked slots never overlap within a term, so checking a new
+slot ``[s, e)`` is an index range scan on ``user = ? AND start < e``
+that only visits the user's earlier slots in the week; a student's
+whole timetable is a few dozen rows.  Only modules whose date ranges
+overlap can clash, so the same weekly time in different terms is
+allowed.
+"""
+import re
+
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+from django.db.models import F, Q
+
+from .models import BookedSlot, Enrollment, Module, TimeSlot, room_key
+
+# Enrollments booked per statement by rebuild_time_slots
+BOOKING_BATCH_SIZE = 20000
+
+DAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+MINUTES_PER_DAY = 24 * 60
+
+_DAY_ALIASES = {
+    **{day.lower(): index for index, day in enumerate(DAYS)},
+    **{name: index for index, name in enumerate(
+        ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+    )},
+    "tues": 1, "thur": 3, "thurs": 3,
+}
+_GROUP_RE = re.compile(
+    r"^(?P<days>[A-Za-z][A-Za-z,/&\s-]*?)\s*(?P<start>\d{1,2}[:.]\d{2})\s*[-–]\s*(?P<end>\d{1,2}[:.]\d{2})$"
+)
+
+
+class ScheduleError(ValueError):
+    pass
+
+
+def _minutes(value):
+    hours, minutes = (int(part) for part in re.split(r"[:.]", value))
+    if hours > 24 or minutes > 59 or hours * 60 + minutes > MINUTES_PER_DAY:
+        raise ScheduleError(f"Invalid time {value!r}")
+    return hours * 60 + minutes
+
+
+def _days(value):
+    days = []
+    for token in filter(None, re.split(r"[,/&\s]+", value.lower())):
+        first, _, last = token.partition("-")
+        if first not in _DAY_ALIASES or (last and last not in _DAY_ALIASES):
+            raise ScheduleError(f"Unknown day {token!r}")
+        start = _DAY_ALIASES[first]
+        days.extend(range(start, _DAY_ALIASES[last] + 1) if last else [start])
+    return days
+
+
+def parse_schedule(schedule):
+    """Parse a schedule into sorted ``(weekday, start_minute, end_minute)`` tuples.
+
+    Groups are separated by ``;``; each one is a list of days (``Mon``,
+    ``Mon/Wed``, ``Mon, Wed``, ``Mon-Fri``) followed by a 24-hour time
+    range.  An empty schedule has no slots.  Raises ``ScheduleError``.
+    """
+    slots = set()
+    for group in filter(None, (part.strip() for part in (schedule or "").split(";"))):
+        match = _GROUP_RE.match(group)
+        if match is None:
+            raise ScheduleError(f"Cannot read schedule {group!r}; expected e.g. 'Mon/Wed 10:00-11:30'")
+        start, end = _minutes(match["start"]), _minutes(match["end"])
+        if start >= end:
+            raise ScheduleError(f"{group!r} ends before it starts")
+        slots.update((day, start, end) for day in _days(match["days"]))
+    return sorted(slots)
+
+
+def book(enrollments):
+    """Add the ``BookedSlot`` rows for an ``Enrollment`` queryset in one ``INSERT ... SELECT``."""
+    rows = (
+        enrollments.filter(module__time_slots__isnull=False)
+        .annotate(
+            slot_start=F("module__time_slots__weekday") * MINUTES_PER_DAY + F("module__time_slots__start_minute"),
+            slot_end=F("module__time_slots__weekday") * MINUTES_PER_DAY + F("module__time_slots__end_minute"),
+        )
+        .values_list("id", "user_id", "module_id", "slot_start", "slot_end", "module__start_date", "module__end_date")
+    )
+    try:
+        sql, params = rows.query.sql_with_params()
+    except EmptyResultSet:  # e.g. filtered on an empty id list
+        return
+    connection = connections[rows.db]
+    columns = ", ".join(
+        connection.ops.quote_name(column)
+        for column in ("enrollment_id", "user_id", "module_id", "start", "end", "start_date", "end_date")
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {BookedSlot._meta.db_table} ({columns}) {sql}", params)
+
+
+def sync_time_slots(module):
+    """Re-parse ``module.schedule`` and re-book its enrolled students.
+
+    An unreadable schedule leaves the module without slots (it shows as
+    "to be announced" and cannot clash).
+    """
+    try:
+        slots = parse_schedule(module.schedule)
+    except ScheduleError:
+        slots = []
+    replace_time_slots({module.id: slots})
+
+
+def replace_time_slots(slots_by_module):
+    """Set the parsed slots of several modules at once and re-book their students."""
+    module_ids = list(slots_by_module)
+    TimeSlot.objects.filter(module_id__in=module_ids).delete()
+    TimeSlot.objects.bulk_create(
+        TimeSlot(module_id=module_id, weekday=day, start_minute=start, end_minute=end)
+        for module_id, slots in slots_by_module.items()
+        for day, start, end in slots
+    )
+    BookedSlot.objects.filter(module_id__in=module_ids).delete()
+    book(Enrollment.objects.filter(module_id__in=module_ids))
+
+
+def rebuild_time_slots():
+    """Re-parse every schedule and rebuild all bookings; returns ``(slots, bookings)``.
+
+    Also brings ``Module.room_key`` back in line with ``location``.
+    """
+    stale = [
+        Module(id=module_id, room_key=room_key(location))
+        for module_id, location, key in Module.objects.values_list("id", "location", "room_key").iterator()
+        if room_key(location) != key
+    ]
+    Module.objects.bulk_update(stale, ["room_key"], batch_size=1000)
+    TimeSlot.objects.all().delete()
+    BookedSlot.objects.all().delete()
+    slots = []
+    for module_id, schedule in Module.objects.values_list("id", "schedule").iterator():
+        try:
+            parsed = parse_schedule(schedule)
+        except ScheduleError:
+            continue
+        slots.extend(
+            TimeSlot(module_id=module_id, weekday=day, start_minute=start, end_minute=end)
+            for day, start, end in parsed
+        )
+    TimeSlot.objects.bulk_create(slots, batch_size=1000)
+    # In id ranges, so a large enrollment table is never loaded at once
+    last = 0
+    while True:
+        ids = list(
+            Enrollment.objects.filter(id__gt=last).order_by("id").values_list("id", flat=True)[:BOOKING_BATCH_SIZE]
+        )
+        if not ids:
+            break
+        book(Enrollment.objects.filter(id__gte=ids[0], id__lte=ids[-1]))
+        last = ids[-1]
+    return len(slots), BookedSlot.objects.count()
+
+
+def find_clash(user_id, module_id):
+    """The id of an enrolled module that meets at the same time as ``module_id``, or ``None``."""
+    slots = list(
+        TimeSlot.objects.filter(module_id=module_id).values_list(
+            "weekday", "start_minute", "end_minute", "module__start_date", "module__end_date"
+        )
+    )
+    if not slots:
+        return None
+    _, _, _, start_date, end_date = slots[0]
+    overlaps = Q()
+    for weekday, start, end, _, _ in slots:
+        offset = weekday * MINUTES_PER_DAY
+        overlaps |= Q(start__lt=offset + end, end__gt=offset + start)
+    return (
+        BookedSlot.objects.filter(user_id=user_id, start_date__lte=end_date, end_date__gte=start_date)
+        .filter(overlaps)
+        .exclude(module_id=module_id)
+        .values_list("module_id", flat=True)
+        .first()
+    )
+
+
+class ClashChecker:
+    """``find_clash`` for a batch of enrollments, in two queries.
+
+    Loads the slots of ``module_ids`` and everything ``user_ids`` have
+    booked up front.  ``book`` records an enrollment granted during the
+    batch, so two modules given to the same student in one batch are
+    checked against each other too.
+    """
+
+    def __init__(self, user_ids, module_ids):
+        self.slots = {}
+        for module_id, weekday, start, end, start_date, end_date in TimeSlot.objects.filter(
+            module_id__in=module_ids
+        ).values_list("module_id", "weekday", "start_minute", "end_minute", "module__start_date", "module__end_date"):
+            offset = weekday * MINUTES_PER_DAY
+            self.slots.setdefault(module_id, []).append((offset + start, offset + end, start_date, end_date))
+        self.booked = {}
+        if self.slots:
+            for user_id, *booking in BookedSlot.objects.filter(user_id__in=user_ids).values_list(
+                "user_id", "module_id", "start", "end", "start_date", "end_date"
+            ):
+                self.booked.setdefault(user_id, []).append(booking)
+
+    def clash(self, user_id, module_id):
+        """The id of a module ``user_id`` has booked that meets with ``module_id``, or ``None``."""
+        for start, end, start_date, end_date in self.slots.get(module_id, ()):
+            for other, other_start, other_end, other_start_date, other_end_date in self.booked.get(user_id, ()):
+                if (
+                    other != module_id
+                    and other_start < end and other_end > start
+                    and other_start_date <= end_date and other_end_date >= start_date
+                ):
+                    return other
+        return None
+
+    def book(self, user_id, module_id):
+        self.booked.setdefault(user_id, []).extend(
+            (module_id, *slot) for slot in self.slots.get(module_id, ())
+        )
+
+
+def _clock(minutes):
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def weekly_grid(user_id):
+    """``{"Mon": [slot, ...], ...}`` for everything ``user_id`` is enrolled in, in one query."""
+    grid = {day: [] for day in DAYS}
+    rows = (
+        BookedSlot.objects.filter(user_id=user_id)
+        .order_by("start", "module_id")
+        .values_list(
+            "start", "end", "module_id", "module__code", "module__title", "module__location",
+            "start_date", "end_date",
+        )
+    )
+    for start, end, module_id, code, title, location, start_date, end_date in rows:
+        day, start = divmod(start, MINUTES_PER_DAY)
+        grid[DAYS[day]].append({
+            "moduleId": module_id,
+            "code": code,
+            "title": title,
+            "location": location,
+            "start": _clock(start),
+            "end": _clock(end - day * MINUTES_PER_DAY),
+            "startDate": start_date,
+            "endDate": end_date,
+        })
+    return grid
@@ -1,5 +1,6 @@
 from django.urls import path
 from .views import *
+from . import async_views
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -14,8 +15,22 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('courses/', get_courses, name='get-courses'),
     path('courses/<str:course_id>/', get_course_details, name="course-details"),
+    path('modules/', get_modules, name='get-modules'),
     path('modules/<str:module_id>/', get_module_details, name='module-details'),
     path('modules/<str:module_id>/register/', register_module, name ='register-module'),
+    path('modules/<str:module_id>/unregister/', unregister_module, name='unregister-module'),
+    path('modules/<str:module_id>/waitlist/', module_waitlist, name='module-waitlist'),
+    path('modules/<str:module_id>/roster.<str:file_format>', module_roster, name='module-roster'),
+    path('courses/<str:course_id>/roster.<str:file_format>', course_roster, name='course-roster'),
+    path('rosters.<str:file_format>', term_roster, name='term-roster'),
     path('instructors/', get_instructors, name='get_instructors'),
     path('my_enrollments/', get_enrolls, name='get-enrollments'),
+    path('my_timetable/', get_timetable, name='get-timetable'),
+    path('enrollments/bulk/', bulk_register_modules, name='bulk-register-modules'),
+    path('search/', search_catalog, name='search-catalog'),
+    path('catalog/cache-stats/', get_catalog_cache_stats, name='catalog-cache-stats'),
+    path('async/courses/', async_views.get_courses, name='async-get-courses'),
+    path('async/courses/<str:course_id>/', async_views.get_course_details, name='async-course-details'),
+    path('async/modules/<str:module_id>/', async_views.get_module_details, name='async-module-details'),
+    path('async/instructors/', async_views.get_instructors, name='async-get-instructors'),
 ]
@@ -1,29 +1,69 @@
 from django.core.mail import send_mail
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.models import User
-from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from rest_framework.decorators import api_view, permission_classes, parser_classes
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, parser_classes
 import json
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.decorators import login_required
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
 from .models import *
+from .authentication import ProfileTokenAuthentication, add_profile_claims
+from .cache import cache_stats, cached_json_response
+from .renderers import FastJsonResponse
+from .search import SearchUnavailable, parse_search_request, search
+from .signup import SignupError, create_account
+from .catalog import (
+    COURSE_FIELDS,
+    INSTRUCTOR_FIELDS,
+    CatalogQueryError,
+    enrolled_modules,
+    fetch_courses_page,
+    fetch_instructors_page,
+    get_course,
+    get_module,
+    is_page_request,
+    iter_courses,
+    iter_instructors,
+    list_courses,
+    list_instructors,
+    module_serializer,
+    parse_page_request,
+)
+from .filters import filter_modules, parse_filter_request
+from .timetable import weekly_grid
+from .streaming import STREAM_CHUNK_SIZE, streaming_json_response, wants_stream
+from .rosters import parse_roster_request, roster, roster_response
+from .enrollment import (
+    EnrollmentError,
+    ModuleNotFound,
+    bulk_enroll,
+    get_waitlist_rank,
+    join_waitlist,
+    leave_waitlist,
+    release_seat,
+    reserve_seat,
+)
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.db import transaction
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.views.decorators.http import require_GET, require_POST
 
 def get_tokens_for_user(user):
-    refresh = RefreshToken.for_user(user)
+    # The access token copies these claims from the refresh token
+    refresh = add_profile_claims(RefreshToken.for_user(user), user)
     return {
         "refresh": str(refresh),
         "access": str(refresh.access_token),
     }
 
 @api_view(["GET"])
+@authentication_classes([ProfileTokenAuthentication, SessionAuthentication])
 @permission_classes([IsAuthenticated]) 
 def get_user_details(request):
     print("Получен запрос от:", request.user)  
@@ -38,6 +78,7 @@ def get_user_details(request):
     })
 
 @api_view(["PUT"])
+@authentication_classes([JWTAuthentication, SessionAuthentication])
 @permission_classes([IsAuthenticated])
 def update_user_details(request, username):  
     try:
@@ -45,6 +86,10 @@ def update_user_details(request, username):
     except User.DoesNotExist:
         return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
+    # The response carries new tokens for ``user``
+    if user.id != request.user.id:
+        return Response({"error": "You can only update your own profile"}, status=status.HTTP_403_FORBIDDEN)
+
     if request.method in ["PUT", "PATCH"]:
         data = request.data
         print("Полученные данные:", request.data)
@@ -62,7 +107,9 @@ def update_user_details(request, username):
                 "email": user.email,
                 "first_name": user.first_name,
                 "last_name": user.last_name,
-            }
+            },
+            # Tokens whose claims match the updated profile
+            "tokens": get_tokens_for_user(user),
         }, status=status.HTTP_200_OK)
 
     return Response({"error": "Invalid request method"}, status=status.HTTP_400_BAD_REQUEST)
@@ -75,13 +122,10 @@ def login_view(request):
             email = data.get("email")
             password = data.get("password")
 
-            user = User.objects.filter(email=email).first()
-            if user is None:
-                return JsonResponse({"error": "User not found"}, status=404)
-
-            auth_user = authenticate(username=user.username, password=password)
+            # EmailBackend: one indexed lookup plus the password check
+            auth_user = authenticate(request, email=email, password=password)
             if auth_user is None:
-                return JsonResponse({"error": "Invalid credentials"}, status=400)
+                return FastJsonResponse({"error": "Invalid credentials"}, status=400)
 
             tokens = get_tokens_for_user(auth_user)  
             user_data = {
@@ -93,14 +137,14 @@ def login_view(request):
             }
             print("Отправляем токены:", tokens) 
 
-            return JsonResponse({
+            return FastJsonResponse({
                 "message": "Login successful",
                 "user": user_data,
                 "tokens": tokens
             })
 
         except json.JSONDecodeError:
-            return JsonResponse({"error": "Invalid JSON format"}, status=400)
+            return FastJsonResponse({"error": "Invalid JSON format"}, status=400)
 
 @csrf_exempt
 def signup_view(request):
@@ -111,23 +155,21 @@ def signup_view(request):
             password = data.get("password")
 
             if not email or not password:
-                return JsonResponse({"error": "Email and password are required"}, status=400)
-
-            username = data.get("username") or f"user_{User.objects.count() + 1}"
-
-            if User.objects.filter(email=email).exists():
-                return JsonResponse({"error": "User already exists"}, status=400)
-
-            user = User.objects.create_user(
-                username=username,
-                email=email,
-                password=password,
-                first_name=data.get("first_name", ""),
-                last_name=data.get("last_name", "")
-            )
+                return FastJsonResponse({"error": "Email and password are required"}, status=400)
+
+            try:
+                user = create_account(
+                    email,
+                    password,
+                    username=data.get("username"),
+                    first_name=data.get("first_name", ""),
+                    last_name=data.get("last_name", ""),
+                )
+            except SignupError as e:
+                return FastJsonResponse({"error": e.message}, status=e.status)
 
             # ✅ Логиним пользователя в сессии Django
-            login(request, user)
+            login(request, user, backend="accounts.backends.EmailBackend")
 
             # ✅ Генерируем JWT токены
             tokens = get_tokens_for_user(user)
@@ -142,243 +184,275 @@ def signup_view(request):
                 # "profile_image": user.profile.image.url if hasattr(user, 'profile') and user.profile.image else None
             }
             # ✅ Возвращаем всю инфу о пользователе
-            return JsonResponse({
+            return FastJsonResponse({
                 "message": "User created successfully",
                 "user": user_data ,
                 "tokens": tokens
             })
 
         except json.JSONDecodeError:
-            return JsonResponse({"error": "Invalid JSON format"}, status=400)
+            return FastJsonResponse({"error": "Invalid JSON format"}, status=400)
         except KeyError as e:
-            return JsonResponse({"error": f"Missing field: {str(e)}"}, status=400)
+            return FastJsonResponse({"error": f"Missing field: {str(e)}"}, status=400)
 
 @api_view(["GET"])
-def get_courses(request): 
-    courses = Course.objects.all()
-
-    # Создаем список продуктов с первой картинкой
-    courses_data = []
-    for course in courses:
-        # Получаем первое изображение для каждого продукта
-        first_image = course.image  # Берем первое изображение, если оно существует
-        image_url = first_image.image.url if first_image else None  # Получаем URL изображения или None
-
-        # Get modules for this course
-        modules_data = []
-        for module in course.modules.all():
-            modules_data.append({
-                "id": module.id,
-                "courseId": module.course.id,
-                "code": module.code,
-                "title": module.title,
-                "description": module.description,
-                "instructor": {
-                    "id": module.instructor.id,
-                    "first_name": module.instructor.first_name,
-                    "last_name": module.instructor.last_name,
-                    "department": module.instructor.department
-                },
-                "startDate": module.start_date.isoformat(),
-                "endDate": module.end_date.isoformat(),
-                "capacity": module.capacity,
-                "enrolled": module.enrolled,
-                "schedule": module.schedule,
-                "location": module.location,
-            })
-
+def get_courses(request):
+    if not is_page_request(request):
+        if wants_stream(request):
+            return streaming_json_response(iter_courses(STREAM_CHUNK_SIZE))
+        return cached_json_response("courses", list_courses)
 
-        # Добавляем информацию о продукте с изображением
-        courses_data.append({
-            "id": course.id,
-            "code":course.code,
-            "title": course.title,
-            "description": course.description,
-            "department": course.department,
-            "credits": course.credits,
-            "image": image_url,
-            "module_count": course.module_count,
-            "modules": modules_data
-        })
-
-    return JsonResponse(courses_data, safe=False)
+    try:
+        page = parse_page_request(request.GET, COURSE_FIELDS)
+    except CatalogQueryError as e:
+        return FastJsonResponse({"error": str(e)}, status=400)
+    return cached_json_response("courses", lambda: fetch_courses_page(page), page)
 
 @api_view(["GET"])
 def get_instructors(request):
-    instructors = Instructor.objects.all()
-
-    # Создаем список продуктов с первой картинкой
-    instructors_data = []
-    for instruct in instructors:    
-        # Get modules for this instructor
-        modules_data = []
-        for module in instruct.modules.all():
-            modules_data.append({
-                "id": module.id,
-                "courseId": module.course.id,
-                "code": module.code,
-                "title": module.title,
-                "description": module.description,
-                "instructor": {
-                    "id": module.instructor.id,
-                    "first_name": module.instructor.first_name,
-                    "last_name": module.instructor.last_name,
-                    "department": module.instructor.department
-                },
-                "startDate": module.start_date.isoformat(),
-                "endDate": module.end_date.isoformat(),
-                "capacity": module.capacity,
-                "enrolled": module.enrolled,
-                "schedule": module.schedule,
-                "location": module.location,
-            })
+    if not is_page_request(request):
+        if wants_stream(request):
+            return streaming_json_response(iter_instructors(STREAM_CHUNK_SIZE))
+        return cached_json_response("instructors", list_instructors)
+
+    try:
+        page = parse_page_request(request.GET, INSTRUCTOR_FIELDS)
+    except CatalogQueryError as e:
+        return FastJsonResponse({"error": str(e)}, status=400)
+    return cached_json_response("instructors", lambda: fetch_instructors_page(page), page)
 
-        # Добавляем информацию о продукте с изображением
-        instructors_data.append({
-            "id": instruct.id,
-            "first_name":instruct.first_name,
-            "last_name": instruct.last_name,
-            "about": instruct.about,
-            "department": instruct.department,
-            "modules": modules_data
-        })
+@api_view(["GET"])
+def search_catalog(request):
+    try:
+        query = parse_search_request(request.GET)
+    except CatalogQueryError as e:
+        return FastJsonResponse({"error": str(e)}, status=400)
+    try:
+        return FastJsonResponse(search(query))
+    except SearchUnavailable:
+        return FastJsonResponse({"error": "Search is not available on this database"}, status=501)
 
-    return JsonResponse(instructors_data, safe=False)
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def get_catalog_cache_stats(request):
+    return Response(cache_stats())
 
 @api_view(["GET"])
 @csrf_exempt
 def get_course_details(request, course_id):
-    course = get_object_or_404(Course, id=course_id)
-
- 
-    course_data = {
-        "id": course.id,
-        "code": course.code,
-        "title": course.title,
-        "description": course.description,
-        "department": course.department,
-        "credits": course.credits,
-        "module_count": course.module_count,
-        "modules": []
-    }
+    try:
+        course_data = get_course(int(course_id))
+    except ValueError:
+        course_data = None
+    if course_data is None:
+        raise Http404("No Course matches the given query.")
 
-    for module in course.modules.all():
-        module_data = {
-            "id": module.id,
-            "courseId": module.course.id,
-            "code": module.code,
-            "title": module.title,
-            "description": module.description,
-            "instructor": {
-                "id": module.instructor.id,
-                "first_name": module.instructor.first_name,
-                "last_name": module.instructor.last_name,
-                "department": module.instructor.department
-            },
-            "startDate": module.start_date.isoformat(),
-            "endDate": module.end_date.isoformat(),
-            "capacity": module.capacity,
-            "enrolled": module.enrolled,
-            "schedule": module.schedule,
-            "location": module.location,
-        }
-        course_data["modules"].append(module_data)
+    return FastJsonResponse(course_data, safe=False)
 
-    return JsonResponse(course_data, safe=False)
+@api_view(["GET"])
+def get_modules(request):
+    try:
+        query = parse_filter_request(request.GET)
+    except CatalogQueryError as e:
+        return FastJsonResponse({"error": str(e)}, status=400)
+    return FastJsonResponse(filter_modules(query))
 
 @api_view(["GET"])
 @csrf_exempt
 def get_module_details(request, module_id):
-        module = get_object_or_404(Module, id=module_id)
-        
-        module_data = {
-            "id": module.id,
-            "courseId": module.course.id,
-            "code": module.code,
-            "title": module.title,
-            "description": module.description,
-            "course":{
-                "id": module.course.id,
-            },
-            "instructor": {
-                "id": module.instructor.id,
-                "first_name": module.instructor.first_name,
-                "last_name": module.instructor.last_name,
-            },
-            "startDate": module.start_date.isoformat(),
-            "endDate": module.end_date.isoformat(),
-            "capacity": module.capacity,
-            "enrolled": module.enrolled,
-            "schedule": module.schedule,
-            "location": module.location,
-        }
-        
-        return JsonResponse(module_data)
+    try:
+        module_data = get_module(int(module_id))
+    except ValueError:
+        module_data = None
+    if module_data is None:
+        raise Http404("No Module matches the given query.")
 
+    return FastJsonResponse(module_data)
 
 @api_view(["POST"])
 def get_enrolls(request):
     data = json.loads(request.body)
     user_id = data.get("userId")
-    enrollments = Enrollment.objects.filter(user=user_id).select_related('module', 'module__course', 'module__instructor')
-
-    modules_data = []
-    for enrollment in enrollments:
-        module = enrollment.module
-        modules_data.append({
-            "id": module.id,
-            "courseId": module.course.id,
-            "code": module.code,
-            "title": module.title,
-            "description": module.description,
-            "instructor": {
-                "id": module.instructor.id,
-                "first_name": module.instructor.first_name,
-                "last_name": module.instructor.last_name,
-            },
-            "startDate": module.start_date.isoformat(),
-            "endDate": module.end_date.isoformat(),
-            "capacity": module.capacity,
-            "enrolled": module.enrolled,
-            "schedule": module.schedule,
-            "location": module.location,
-        })
+    modules = enrolled_modules(user_id)
+    if wants_stream(request):
+        rows = module_serializer.rows(modules).iterator(chunk_size=STREAM_CHUNK_SIZE)
+        return streaming_json_response(
+            map(module_serializer.to_dict, rows), prefix='{"success": true, "modules": ', suffix='}'
+        )
+
+    modules_data = module_serializer.serialize(modules)
+    return FastJsonResponse({"success": True, "modules": modules_data})
 
-    return JsonResponse({"success": True, "modules": modules_data})
+@api_view(["POST"])
+def get_timetable(request):
+    try:
+        user_id = int(json.loads(request.body).get("userId"))
+    except (json.JSONDecodeError, TypeError, ValueError):
+        return FastJsonResponse({'success': False, 'message': 'Missing or invalid userId.'}, status=400)
+    return FastJsonResponse({"success": True, "timetable": weekly_grid(user_id)})
 
 @api_view(["POST"])
 def register_module(request, module_id):
     try:
         data = json.loads(request.body)
     except json.JSONDecodeError:
-        return JsonResponse({'success': False, 'message': 'Invalid JSON'}, status=400)
+        return FastJsonResponse({'success': False, 'message': 'Invalid JSON'}, status=400)
 
     user_id = data.get("userId")
     if not user_id:
-        return JsonResponse({'success': False, 'message': 'Missing userId.'}, status=400)
+        return FastJsonResponse({'success': False, 'message': 'Missing userId.'}, status=400)
 
     # Convert to int safely
     try:
         user_id = int(user_id)
     except ValueError:
-        return JsonResponse({'success': False, 'message': 'Invalid userId format.'}, status=400)
+        return FastJsonResponse({'success': False, 'message': 'Invalid userId format.'}, status=400)
 
-    module = get_object_or_404(Module, id=module_id)
-    user = get_object_or_404(User, id=user_id)
+    try:
+        module_id = int(module_id)
+    except ValueError:
+        return FastJsonResponse({'success': False, 'message': ModuleNotFound.message}, status=404)
 
-    # Check module capacity
-    if module.enrolled >= module.capacity:
-        return JsonResponse({'success': False, 'message': 'Module is full. Cannot enroll.'}, status=400)
+    try:
+        module = reserve_seat(user_id, module_id)
+    except EnrollmentError as e:
+        return FastJsonResponse({'success': False, 'message': e.message}, status=e.status)
 
-    # Check for duplicate enrollment
-    if Enrollment.objects.filter(user=user, module=module).exists():
-        return JsonResponse({'success': False, 'message': 'You are already enrolled in this module.'}, status=400)
+    return FastJsonResponse({'success': True, 'message': f'Enrolled in module {module["title"]} successfully.'}, status=201)
 
-    # Create enrollment and update module capacity
-    Enrollment.objects.create(user=user, module=module)
-    module.enrolled += 1
-    module.save()
-    print(user_id, module_id)
-    return JsonResponse({'success': True, 'message': f'Enrolled in module {module.title} successfully.'}, status=201)
+def _parse_user_and_module(user_id, module_id):
+    """Return ``(user_id, module_id)`` as ints, or an error response."""
+    if not user_id:
+        return None, FastJsonResponse({'success': False, 'message': 'Missing userId.'}, status=400)
+    try:
+        user_id = int(user_id)
+    except ValueError:
+        return None, FastJsonResponse({'success': False, 'message': 'Invalid userId format.'}, status=400)
+    try:
+        module_id = int(module_id)
+    except ValueError:
+        return None, FastJsonResponse({'success': False, 'message': ModuleNotFound.message}, status=404)
+    return (user_id, module_id), None
 
+@api_view(["POST"])
+@authentication_classes([JWTAuthentication, SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def unregister_module(request, module_id):
+    # Only the signed-in student can give up their own seat
+    ids, error = _parse_user_and_module(request.user.id, module_id)
+    if error:
+        return error
 
+    try:
+        promoted = release_seat(*ids)
+    except EnrollmentError as e:
+        return FastJsonResponse({'success': False, 'message': e.message}, status=e.status)
+
+    return FastJsonResponse({'success': True, 'message': 'Unenrolled successfully.', 'promoted': promoted})
+
+@api_view(["GET", "POST", "DELETE"])
+@authentication_classes([JWTAuthentication, SessionAuthentication])
+def module_waitlist(request, module_id):
+    """GET: your place in the queue (?userId=), POST: join it, DELETE: leave it (signed in)."""
+    if request.method == "GET":
+        user_id = request.GET.get("userId")
+    elif request.method == "DELETE":
+        # Only the signed-in student can give up their own place
+        if not request.user.is_authenticated:
+            return FastJsonResponse({'success': False, 'message': 'Authentication required.'}, status=401)
+        user_id = request.user.id
+    else:
+        try:
+            user_id = json.loads(request.body).get("userId")
+        except json.JSONDecodeError:
+            return FastJsonResponse({'success': False, 'message': 'Invalid JSON'}, status=400)
+
+    ids, error = _parse_user_and_module(user_id, module_id)
+    if error:
+        return error
+
+    try:
+        if request.method == "GET":
+            position, lower_bound = get_waitlist_rank(*ids)
+            return FastJsonResponse({'success': True, 'position': position, 'positionIsLowerBound': lower_bound})
+        if request.method == "POST":
+            position, lower_bound = join_waitlist(*ids)
+            return FastJsonResponse({
+                'success': True,
+                'message': 'Added to the waitlist.',
+                'position': position,
+                'positionIsLowerBound': lower_bound,
+            }, status=201)
+        leave_waitlist(*ids)
+        return FastJsonResponse({'success': True, 'message': 'Removed from the waitlist.'})
+    except EnrollmentError as e:
+        return FastJsonResponse({'success': False, 'message': e.message}, status=e.status)
+
+MAX_BULK_ENROLLMENTS = 10000
+
+@api_view(["POST"])
+@permission_classes([IsAdminUser])
+def bulk_register_modules(request):
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return FastJsonResponse({'success': False, 'message': 'Invalid JSON'}, status=400)
+    if not isinstance(data, dict):
+        return FastJsonResponse({'success': False, 'message': 'Expected a JSON object.'}, status=400)
+
+    items = data.get("enrollments")
+    if not isinstance(items, list) or not items:
+        return FastJsonResponse({'success': False, 'message': 'Missing enrollments.'}, status=400)
+    if len(items) > MAX_BULK_ENROLLMENTS:
+        return FastJsonResponse({'success': False, 'message': f'At most {MAX_BULK_ENROLLMENTS} enrollments per request.'}, status=400)
+
+    pairs = []
+    for index, item in enumerate(items):
+        try:
+            pairs.append((int(item["userId"]), int(item["moduleId"])))
+        except (KeyError, TypeError, ValueError):
+            return FastJsonResponse({'success': False, 'message': f'Invalid enrollment at index {index}.'}, status=400)
+
+    try:
+        results = bulk_enroll(pairs)
+    except EnrollmentError as e:
+        return FastJsonResponse({'success': False, 'message': e.message}, status=e.status)
+
+    enrolled = sum(1 for result in results if result["status"] == "enrolled")
+    return FastJsonResponse({'success': True, 'enrolled': enrolled, 'results': results})
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def module_roster(request, module_id, file_format):
+    try:
+        parse_roster_request(file_format, {})
+    except CatalogQueryError as e:
+        return FastJsonResponse({"error": str(e)}, status=400)
+    code = Module.objects.filter(pk=module_id).values_list("code", flat=True).first() if module_id.isdigit() else None
+    if code is None:
+        raise Http404("No Module matches the given query.")
+    return roster_response(roster(module_id=int(module_id)), file_format, f"roster-{code}")
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def course_roster(request, course_id, file_format):
+    try:
+        terms = parse_roster_request(file_format, request.GET)
+    except CatalogQueryError as e:
+        return FastJsonResponse({"error": str(e)}, status=400)
+    code = Course.objects.filter(pk=course_id).values_list("code", flat=True).first() if course_id.isdigit() else None
+    if code is None:
+        raise Http404("No Course matches the given query.")
+    return roster_response(roster(course_id=int(course_id), **terms), file_format, f"roster-{code}")
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def term_roster(request, file_format):
+    try:
+        terms = parse_roster_request(file_format, request.GET)
+    except CatalogQueryError as e:
+        return FastJsonResponse({"error": str(e)}, status=400)
+    if terms["date_from"] is None and terms["date_to"] is None:
+        return FastJsonResponse({"error": "Give date_from, date_to or both"}, status=400)
+    name = "-".join(str(terms[key]) for key in ("date_from", "date_to") if terms[key])
+    return roster_response(roster(**terms), file_format, f"roster-{name}")
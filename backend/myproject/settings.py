@@ -54,6 +54,14 @@ CSRF_TRUSTED_ORIGINS = ["http://localhost:3000"]
 #     ),
 # }
 
+REST_FRAMEWORK = {
+    # orjson-backed when installed, see accounts/renderers.py
+    'DEFAULT_RENDERER_CLASSES': (
+        'accounts.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+}
+
 from datetime import timedelta
 
 SIMPLE_JWT = {
@@ -67,6 +75,8 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MIDDLEWARE = [
     
     'corsheaders.middleware.CorsMiddleware',
+    'accounts.middleware.QueryStatsMiddleware',
+    'accounts.routers.ReplicaPinningMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -108,6 +118,103 @@ DATABASES = {
     }
 }
 
+# Opt-in SQLite profile (SQLITE_TUNED=1), applied to every new connection.
+# WAL lets readers carry on while a registration commits, and IMMEDIATE
+# transactions take the write lock when they begin, so a contended writer
+# waits up to busy_timeout instead of failing with "database is locked"
+# when it tries to upgrade a read lock. Connections are kept for
+# CONN_MAX_AGE seconds, so the pragmas and the page cache outlive a request.
+# Compare against the defaults with `manage.py bench_sqlite`.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',  # WAL stays consistent; a power cut may lose the last commits
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # negative means KiB: 64 MiB per connection
+    'busy_timeout': 5000,  # ms
+    'temp_store': 'MEMORY',
+}
+SQLITE_TUNED_OPTIONS = {
+    'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+    'transaction_mode': 'IMMEDIATE',
+}
+
+if os.environ.get('SQLITE_TUNED', '').lower() in ('1', 'true', 'yes'):
+    DATABASES['default'].update({
+        'OPTIONS': SQLITE_TUNED_OPTIONS,
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        # The in-memory test database uses shared-cache table locks, which
+        # fail at once instead of honouring busy_timeout
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+    })
+
+# Read replicas for the catalog (accounts.routers): Course, Module and
+# Instructor reads go to an alias in DATABASE_REPLICAS, writes and the
+# reads of a client that has just written go to 'default'. SQLITE_REPLICAS
+# is a comma-separated list of SQLite files kept in sync with the primary
+# by an external tool; tests mirror them to the test database.
+DATABASE_ROUTERS = ['accounts.routers.CatalogReplicaRouter']
+DATABASE_REPLICAS = []
+for number, path in enumerate(filter(None, os.environ.get('SQLITE_REPLICAS', '').split(',')), start=1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': path.strip(),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+# Seconds a client reads from the primary after a request that wrote
+REPLICA_PIN_SECONDS = 5
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# cache (e.g. Redis) in production so every worker sees the same entries.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'university-portal'),
+    }
+}
+
+# Seconds a cached /api/courses/ or /api/instructors/ response is kept
+CATALOG_CACHE_TIMEOUT = 60 * 15
+# Seconds the per-bucket seat counts laid over cached responses, and the
+# cached /api/modules/ facet counts, are kept; bounds how stale a seat
+# count can be
+CATALOG_SEATS_TIMEOUT = 30
+
+# Per-request query instrumentation (accounts.middleware). A request
+# running more than its budget of queries, or the same query
+# QUERY_REPEAT_THRESHOLD times, is logged as a warning; QUERY_BUDGETS
+# overrides the budget per URL name.
+QUERY_BUDGET = int(os.environ.get('QUERY_BUDGET', 20))
+QUERY_BUDGETS = {}
+QUERY_REPEAT_THRESHOLD = 5
+SERVER_TIMING_HEADER = True
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        # INFO logs one line per request, WARNING only the ones over budget
+        'accounts.queries': {
+            'handlers': ['console'],
+            'level': os.environ.get('QUERY_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+# The API logs in by email; ModelBackend keeps username logins for the admin
+AUTHENTICATION_BACKENDS = [
+    'accounts.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -16,13 +16,15 @@ type Course = {
   department: string
   credits: number
   image: string
-  moduleCount: number
+  module_count: number
 }
 
 export default function CoursesPage() {
   const [courses, setCourses] = useState<Course[]>([])
   const [isLoading, setIsLoading] = useState(true)
   const [error, setError] = useState("")
+  const [nextCursor, setNextCursor] = useState<string | null>(null)
+  const [isLoadingMore, setIsLoadingMore] = useState(false)
 
   // Fetch courses on initial load
   useEffect(() => {
@@ -31,11 +33,12 @@ export default function CoursesPage() {
       setError("")
 
       try {
-        const { success, courses, message } = await getCourses()
+        const { success, courses, nextCursor, message } = await getCourses()
         console.log('Fetched courses:', courses)
 
         if (success) {
           setCourses(courses)
+          setNextCursor(nextCursor)
         } else {
           setError(message || "Failed to fetch courses")
         }
@@ -49,6 +52,19 @@ export default function CoursesPage() {
     fetchCourses()
   }, [])
 
+  const loadMore = async () => {
+    if (!nextCursor) return
+    setIsLoadingMore(true)
+    const { success, courses: page, nextCursor: cursor, message } = await getCourses(nextCursor)
+    if (success) {
+      setCourses((current) => [...current, ...page])
+      setNextCursor(cursor)
+    } else {
+      setError(message || "Failed to fetch courses")
+    }
+    setIsLoadingMore(false)
+  }
+
   return (
     <div className="container mx-auto px-4 py-8">
       <div className="flex flex-col md:flex-row justify-between items-start md:items-center mb-8 gap-4">
@@ -113,7 +129,7 @@ export default function CoursesPage() {
                   </div>
                   <div className="flex justify-between">
                     <span className="text-muted-foreground">Modules:</span>
-                    <span>{course.moduleCount}</span>
+                    <span>{course.module_count}</span>
                   </div>
                 </div>
               </CardContent>
@@ -124,6 +140,13 @@ export default function CoursesPage() {
               </CardFooter>
             </Card>
           ))}
+          {nextCursor && (
+            <div className="md:col-span-2 lg:col-span-3 flex justify-center">
+              <Button variant="outline" onClick={loadMore} disabled={isLoadingMore}>
+                {isLoadingMore ? "Loading..." : "Load more courses"}
+              </Button>
+            </div>
+          )}
         </div>
       ) : (
         <Card>
@@ -87,21 +87,70 @@ export async function getUserProfile() {
 }
 
 // Courses API
-export async function getCourses() {
+// Columns the course list renders; modules are fetched on the course page
+const COURSE_LIST_FIELDS = "id,code,title,description,department,credits,image,module_count"
+
+export async function getCourses(cursor?: string | null, limit = 24) {
   try {
-    const url = "http://127.0.0.1:8000/api/courses/"
+    const params = new URLSearchParams({ fields: COURSE_LIST_FIELDS, limit: String(limit) })
+    if (cursor) params.set("cursor", cursor)
+    const url = `http://127.0.0.1:8000/api/courses/?${params}`
     const response = await fetch(url)
     const data = await response.json()
 
-    // Ensure it always returns a consistent structure
+    if (!response.ok) {
+      return { success: false, courses: [], nextCursor: null, message: data.error ?? "Request failed" }
+    }
+
     return {
-      success: data.success ?? true,            // fallback to true if backend doesn't provide
-      courses: data.courses ?? data,            // fallback to whole data if backend returns just an array
-      message: data.message ?? "",              // fallback to empty message
+      success: true,
+      courses: data.results ?? [],
+      nextCursor: data.next_cursor ?? null,   // null once the last page has been loaded
+      message: "",
     }
   } catch (error) {
     console.error("Get courses error:", error)
-    return { success: false, courses: [], message: "Network error occurred" }
+    return { success: false, courses: [], nextCursor: null, message: "Network error occurred" }
+  }
+}
+
+// Filtered module list plus facet counts for the filter sidebar, e.g.
+// { department: "math,computer_science", has_seats: "true", date_from: "2025-09-01" }
+export async function filterModules(filters: Record<string, string>, cursor?: string | null, limit = 24) {
+  try {
+    const params = new URLSearchParams({ ...filters, limit: String(limit) })
+    if (cursor) params.set("cursor", cursor)
+    const response = await fetch(`http://127.0.0.1:8000/api/modules/?${params}`)
+    const data = await response.json()
+
+    if (!response.ok) {
+      return { success: false, modules: [], facets: null, nextCursor: null, message: data.error ?? "Request failed" }
+    }
+
+    return { success: true, modules: data.results ?? [], facets: data.facets, nextCursor: data.next_cursor ?? null, message: "" }
+  } catch (error) {
+    console.error("Filter modules error:", error)
+    return { success: false, modules: [], facets: null, nextCursor: null, message: "Network error occurred" }
+  }
+}
+
+// Server-side, ranked search over course and module titles, codes and descriptions
+export async function searchCatalog(query: string, type?: "course" | "module", cursor?: string | null, limit = 20) {
+  try {
+    const params = new URLSearchParams({ q: query, limit: String(limit) })
+    if (type) params.set("type", type)
+    if (cursor) params.set("cursor", cursor)
+    const response = await fetch(`http://127.0.0.1:8000/api/search/?${params}`)
+    const data = await response.json()
+
+    if (!response.ok) {
+      return { success: false, results: [], nextCursor: null, message: data.error ?? "Request failed" }
+    }
+
+    return { success: true, results: data.results ?? [], nextCursor: data.next_cursor ?? null, message: "" }
+  } catch (error) {
+    console.error("Search error:", error)
+    return { success: false, results: [], nextCursor: null, message: "Network error occurred" }
   }
 }
 
@@ -149,6 +198,45 @@ export async function registerForModule(moduleId: string, userId: string) {
   }
 }
 
+// Waitlist API: join a full module once, then look up the place in the
+// queue instead of re-fetching the module until a seat frees up
+export async function joinWaitlist(moduleId: string, userId: string) {
+  try {
+    const response = await fetch(`http://127.0.0.1:8000/api/modules/${moduleId}/waitlist/`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+      },
+      body: JSON.stringify({ userId })
+    });
+
+    const data = await response.json();
+    if (!response.ok) {
+      return { success: false, message: data.message || "Request failed" };
+    }
+    return { success: true, position: data.position };
+  } catch (error) {
+    console.error("Join waitlist error:", error);
+    return { success: false, message: "Network error occurred" };
+  }
+}
+
+export async function getWaitlistPosition(moduleId: string, userId: string) {
+  try {
+    const params = new URLSearchParams({ userId })
+    const response = await fetch(`http://127.0.0.1:8000/api/modules/${moduleId}/waitlist/?${params}`)
+
+    const data = await response.json();
+    if (!response.ok) {
+      return { success: false, message: data.message || "Request failed" };
+    }
+    return { success: true, position: data.position };
+  } catch (error) {
+    console.error("Get waitlist position error:", error);
+    return { success: false, message: "Network error occurred" };
+  }
+}
+
 
 // User enrollments API
 export async function getUserEnrollments(userId : string) {
@@ -174,6 +262,28 @@ export async function getUserEnrollments(userId : string) {
   }
 }
 
+// Weekly grid of the user's enrolled modules: { Mon: [{ moduleId, code, title, location, start, end }], ... }
+export async function getUserTimetable(userId: string) {
+  try {
+    const response = await fetch(`http://127.0.0.1:8000/api/my_timetable/`, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({ userId })
+    });
+
+    const data = await response.json();
+    if (!response.ok) {
+      return { success: false, message: data.message || 'Request failed' };
+    }
+    return { success: true, timetable: data.timetable };
+  } catch (error) {
+    console.error("Get timetable error:", error);
+    return { success: false, message: "Network error occurred" };
+  }
+}
+
 
 
 
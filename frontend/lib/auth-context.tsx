@@ -166,6 +166,8 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
       //profileData.username=username
       const data = await res.json();
       if (!res.ok) throw new Error(data.error || "Ошибка обновления профиля");
+      // The profile is read from token claims, so keep the refreshed tokens
+      if (data.tokens) localStorage.setItem("tokens", JSON.stringify(data.tokens));
       await getUserProfile();
     } catch (err) {
       if (err instanceof Error) {